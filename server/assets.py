@@ -6,6 +6,7 @@ from pydantic import BaseModel
 from datetime import datetime
 
 from database import get_db
+from pagination import Page, page_params, keyset, split_page
 from models import Asset, AssetMovement, School, User
 from auth import get_current_school, get_current_user
 
@@ -45,16 +46,29 @@ class MovementResponse(BaseModel):
 
 # --- Routes ---
 
-@router.get("/", response_model=List[AssetResponse])
+def assets_page(school_id: int, cursor: Optional[str], limit: int):
+    return keyset(select(Asset).where(Asset.school_id == school_id), [Asset.id], cursor, limit)
+
+def asset_movements_page(asset_id: int, cursor: Optional[str], limit: int):
+    """Newest first"""
+    return keyset(
+        select(AssetMovement).where(AssetMovement.asset_id == asset_id),
+        [AssetMovement.created_at, AssetMovement.id], cursor, limit, descending=True
+    )
+
+@router.get("/", response_model=Page[AssetResponse])
 async def get_assets(
+    page: tuple = Depends(page_params),
     db: AsyncSession = Depends(get_db),
     current_school: School = Depends(get_current_school)
 ):
-    """List all assets belonging to the school"""
+    """List all assets belonging to the school (keyset-paginated by id)"""
+    cursor, limit = page
     result = await db.execute(
-        select(Asset).where(Asset.school_id == current_school.id)
+        assets_page(current_school.id, cursor, limit)
     )
-    return result.scalars().all()
+    assets, next_cursor = split_page(result.scalars().all(), limit, lambda a: [a.id])
+    return {"data": assets, "next_cursor": next_cursor}
 
 @router.post("/", response_model=AssetResponse)
 async def create_asset(
@@ -111,13 +125,15 @@ async def record_movement(
     await db.refresh(new_movement)
     return new_movement
 
-@router.get("/{asset_id}/history", response_model=List[MovementResponse])
+@router.get("/{asset_id}/history", response_model=Page[MovementResponse])
 async def get_asset_history(
     asset_id: int,
+    page: tuple = Depends(page_params),
     db: AsyncSession = Depends(get_db),
     current_school: School = Depends(get_current_school)
 ):
-    """View movement history for a specific asset"""
+    """View movement history for a specific asset, newest first"""
+    cursor, limit = page
     # Verify ownership
     asset_result = await db.execute(
         select(Asset).where(Asset.id == asset_id, Asset.school_id == current_school.id)
@@ -125,7 +141,6 @@ async def get_asset_history(
     if not asset_result.scalar_one_or_none():
         raise HTTPException(status_code=404, detail="Asset not found")
 
-    result = await db.execute(
-        select(AssetMovement).where(AssetMovement.asset_id == asset_id).order_by(AssetMovement.created_at.desc())
-    )
-    return result.scalars().all()
+    result = await db.execute(asset_movements_page(asset_id, cursor, limit))
+    movements, next_cursor = split_page(result.scalars().all(), limit, lambda m: [m.created_at, m.id])
+    return {"data": movements, "next_cursor": next_cursor}
@@ -1,13 +1,15 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, and_
 from typing import List, Optional
 from pydantic import BaseModel
-from datetime import date, datetime
+from datetime import date, datetime, date as DateType # DateType: field names below shadow `date`
 
-from database import get_db
+from database import get_db, dialect_insert
+from pagination import Page, page_params, keyset, split_page
 from models import Attendance, Student, School
 from auth import get_current_school
+from attendance_store import sync_term_bitmaps
 
 router = APIRouter(prefix="/attendance", tags=["Attendance"])
 
@@ -16,7 +18,7 @@ class AttendanceCreate(BaseModel):
     student_id: int
     status: str # PRESENT, ABSENT, LATE, EXCUSED
     notes: Optional[str] = None
-    date: Optional[date] = None
+    date: Optional[DateType] = None
 
 class AttendanceResponse(BaseModel):
     id: int
@@ -27,6 +29,40 @@ class AttendanceResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class RegisterMark(BaseModel):
+    student_id: int
+    status: str # PRESENT, ABSENT, LATE, EXCUSED
+    notes: Optional[str] = None # None keeps the existing note
+
+class RegisterSave(BaseModel):
+    grade: str
+    date: Optional[DateType] = None
+    marks: List[RegisterMark]
+
+# --- Helpers ---
+
+async def _upsert_marks(db: AsyncSession, school_id: int, rows: dict) -> None:
+    """Upsert {(student_id, day): row} on the (student_id, date) key and update the term bitmaps (caller commits)"""
+    stmt = dialect_insert(Attendance)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Attendance.student_id, Attendance.date],
+        set_={"status": stmt.excluded.status, "notes": stmt.excluded.notes}
+    )
+    await db.execute(stmt, list(rows.values()))
+    await sync_term_bitmaps(db, school_id, {key: row["status"] for key, row in rows.items()})
+
+def register_query(school_id: int, grade: str, day: date):
+    """Every student in the grade with that day's mark (if any): one LEFT JOIN"""
+    return select(
+        Student.id, Student.first_name, Student.last_name, Student.admission_number,
+        Attendance.id.label("attendance_id"), Attendance.status, Attendance.notes
+    ).outerjoin(Attendance, and_(Attendance.student_id == Student.id, Attendance.date == day)).where(
+        Student.school_id == school_id, Student.grade == grade
+    ).order_by(Student.last_name, Student.first_name, Student.id)
+
+async def _register_rows(db: AsyncSession, school_id: int, grade: str, day: date) -> list:
+    return (await db.execute(register_query(school_id, grade, day))).all()
+
 # --- Routes ---
 
 @router.post("/")
@@ -35,40 +71,153 @@ async def record_attendance(
     db: AsyncSession = Depends(get_db),
     current_school: School = Depends(get_current_school)
 ):
-    """Batch record student attendance"""
+    """Batch record student attendance (idempotent per student per day)"""
     today = datetime.utcnow().date()
-    
+
+    # 1. Validate every student in one IN query
+    submitted_ids = {entry.student_id for entry in records}
+    valid_result = await db.execute(
+        select(Student.id).where(Student.school_id == current_school.id, Student.id.in_(submitted_ids))
+    )
+    valid_ids = set(valid_result.scalars().all())
+
+    # 2. Collapse the batch to one row per (student, day); the last mark submitted wins
+    rows = {}
+    rejected = 0
     for entry in records:
-        # Verify student belongs to school
-        stud_result = await db.execute(select(Student).where(Student.id == entry.student_id, Student.school_id == current_school.id))
-        if not stud_result.scalar_one_or_none():
+        if entry.student_id not in valid_ids:
+            rejected += 1
             continue
-            
-        new_record = Attendance(
-            school_id=current_school.id,
-            student_id=entry.student_id,
-            status=entry.status,
-            notes=entry.notes,
-            date=entry.date or today
+        day = entry.date or today
+        rows[(entry.student_id, day)] = {
+            "school_id": current_school.id,
+            "student_id": entry.student_id,
+            "date": day,
+            "status": entry.status,
+            "notes": entry.notes
+        }
+
+    if not rows:
+        return {"message": "No valid attendance entries", "accepted": 0, "rejected": rejected, "updated": 0}
+
+    # 3. Which of these marks already exist (for the updated count)
+    existing_result = await db.execute(
+        select(Attendance.student_id, Attendance.date).where(
+            Attendance.student_id.in_({key[0] for key in rows}),
+            Attendance.date.in_({key[1] for key in rows})
         )
-        db.add(new_record)
-        
+    )
+    updated = sum(1 for key in existing_result.all() if tuple(key) in rows)
+
+    # 4. One bulk upsert on the (student_id, date) key
+    await _upsert_marks(db, current_school.id, rows)
     await db.commit()
-    return {"message": f"Recorded {len(records)} attendance entries"}
 
-@router.get("/student/{student_id}", response_model=List[AttendanceResponse])
+    return {
+        "message": f"Recorded {len(rows)} attendance entries",
+        "accepted": len(rows),
+        "rejected": rejected,
+        "updated": updated
+    }
+
+@router.get("/register")
+async def get_register(
+    grade: str,
+    date: Optional[DateType] = None,
+    db: AsyncSession = Depends(get_db),
+    current_school: School = Depends(get_current_school)
+):
+    """Roll call for one grade and day: every student with their existing mark (status is null if unmarked)"""
+    day = date or datetime.utcnow().date()
+    rows = await _register_rows(db, current_school.id, grade, day)
+    marked = sum(1 for row in rows if row.attendance_id is not None)
+    return {
+        "success": True,
+        "grade": grade,
+        "date": day,
+        "marked": marked,
+        "unmarked": len(rows) - marked,
+        "data": [{
+            "student_id": row.id,
+            "name": f"{row.first_name} {row.last_name}",
+            "admission_number": row.admission_number,
+            "status": row.status,
+            "notes": row.notes,
+        } for row in rows]
+    }
+
+@router.put("/register")
+async def save_register(
+    data: RegisterSave,
+    db: AsyncSession = Depends(get_db),
+    current_school: School = Depends(get_current_school)
+):
+    """Save a roll call for one grade and day, writing only the marks that differ from what is stored"""
+    day = data.date or datetime.utcnow().date()
+    current = {row.id: row for row in await _register_rows(db, current_school.id, data.grade, day)}
+
+    # A student marked twice in one payload keeps the last mark, as in record_attendance
+    latest = {mark.student_id: mark for mark in data.marks}
+
+    changes, errors = {}, []
+    created = unchanged = 0
+    for mark in latest.values():
+        existing = current.get(mark.student_id)
+        if existing is None:
+            errors.append({"student_id": mark.student_id, "reason": f"Student not found in {data.grade}"})
+            continue
+        status = mark.status.strip().upper()
+        if not status:
+            errors.append({"student_id": mark.student_id, "reason": "Status is required"})
+            continue
+        notes = existing.notes if mark.notes is None else mark.notes
+        if existing.attendance_id is not None and existing.status == status and existing.notes == notes:
+            unchanged += 1
+            continue
+        if existing.attendance_id is None:
+            created += 1
+        changes[(mark.student_id, day)] = {
+            "school_id": current_school.id,
+            "student_id": mark.student_id,
+            "date": day,
+            "status": status,
+            "notes": notes
+        }
+
+    if changes:
+        await _upsert_marks(db, current_school.id, changes)
+        await db.commit()
+
+    return {
+        "success": True,
+        "grade": data.grade,
+        "date": day,
+        "written": len(changes),
+        "created": created,
+        "updated": len(changes) - created,
+        "unchanged": unchanged,
+        "rejected": len(errors),
+        "errors": errors
+    }
+
+def student_attendance_page(student_id: int, cursor: Optional[str], limit: int):
+    """Most recent day first; (student_id, date) is unique, so the day alone is a stable cursor"""
+    return keyset(select(Attendance).where(Attendance.student_id == student_id), [Attendance.date], cursor, limit, descending=True)
+
+@router.get("/student/{student_id}", response_model=Page[AttendanceResponse])
 async def get_student_attendance(
     student_id: int,
+    page: tuple = Depends(page_params),
     db: AsyncSession = Depends(get_db),
     current_school: School = Depends(get_current_school)
 ):
-    """View attendance history for a specific student"""
+    """View attendance history for a specific student, most recent day first"""
+    cursor, limit = page
     # Verify student
     stud_result = await db.execute(select(Student).where(Student.id == student_id, Student.school_id == current_school.id))
     if not stud_result.scalar_one_or_none():
         raise HTTPException(status_code=404, detail="Student not found")
 
-    result = await db.execute(
-        select(Attendance).where(Attendance.student_id == student_id).order_by(Attendance.date.desc())
-    )
-    return result.scalars().all()
+    result = await db.execute(student_attendance_page(student_id, cursor, limit))
+    records, next_cursor = split_page(result.scalars().all(), limit, lambda a: [a.date])
+    return {"data": records, "next_cursor": next_cursor}
@@ -0,0 +1,252 @@
+"""
+Term attendance analytics over the per-student bitmaps.
+
+A term's bitmaps load in one query as a students x days uint8 matrix; rates,
+streaks, chronic-absence flags and grade heatmaps are then whole-matrix NumPy
+operations, so a school-wide report never touches the attendance rows.
+Days on which nobody in the loaded set has a mark (weekends, holidays, days
+not yet reached) are dropped before anything is counted.
+"""
+import os
+from datetime import date, timedelta
+from typing import Optional
+import numpy as np
+from fastapi import APIRouter, Depends, HTTPException
+from pydantic import BaseModel
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import get_db
+from models import AcademicTerm, AttendanceTermBitmap, Student, School
+from auth import get_current_school
+from attendance_store import STATUS_CODES, MAX_TERM_DAYS, rebuild_term_bitmaps
+
+router = APIRouter(prefix="/attendance", tags=["Attendance"])
+
+# Missing at least this share of recorded school days (excused or not) flags chronic absence
+CHRONIC_ABSENCE_THRESHOLD = float(os.getenv("CHRONIC_ABSENCE_THRESHOLD", "0.10"))
+# ...once a student has at least this many recorded days
+CHRONIC_ABSENCE_MIN_DAYS = int(os.getenv("CHRONIC_ABSENCE_MIN_DAYS", "10"))
+
+PRESENT, ABSENT, LATE, EXCUSED = (STATUS_CODES[s] for s in ("PRESENT", "ABSENT", "LATE", "EXCUSED"))
+
+# --- Schemas ---
+class AcademicTermCreate(BaseModel):
+    name: str
+    start_date: date
+    end_date: date
+
+class AcademicTermResponse(BaseModel):
+    id: int
+    name: str
+    start_date: date
+    end_date: date
+    class Config:
+        from_attributes = True
+
+# --- Matrix helpers ---
+
+def _rate(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(denominator > 0, numerator / np.maximum(denominator, 1) * 100.0, np.nan)
+
+def _runs(flags: np.ndarray) -> tuple:
+    """(longest, current) run of True per row; `current` is the run ending on the last column"""
+    if flags.shape[1] == 0:
+        zeros = np.zeros(flags.shape[0], dtype=np.int64)
+        return zeros, zeros
+    position = np.arange(1, flags.shape[1] + 1)
+    last_break = np.maximum.accumulate(np.where(flags, 0, position), axis=1)
+    run = position - last_break
+    return run.max(axis=1), run[:, -1]
+
+def _value(x) -> Optional[float]:
+    return None if x is None or not np.isfinite(x) else round(float(x), 2)
+
+def term_bitmaps(term_id: int, grade: Optional[str] = None):
+    """The term's bitmaps with their students, ordered by grade"""
+    query = select(
+        AttendanceTermBitmap.student_id, AttendanceTermBitmap.days,
+        Student.first_name, Student.last_name, Student.grade
+    ).join(Student, AttendanceTermBitmap.student_id == Student.id).where(AttendanceTermBitmap.term_id == term_id)
+    if grade:
+        query = query.where(Student.grade == grade)
+    return query.order_by(Student.grade, AttendanceTermBitmap.student_id)
+
+async def _load_term(db: AsyncSession, school_id: int, term_id: int, grade: Optional[str]) -> tuple:
+    term = await db.get(AcademicTerm, term_id)
+    if not term or term.school_id != school_id:
+        raise HTTPException(status_code=404, detail="Term not found")
+
+    rows = (await db.execute(term_bitmaps(term_id, grade))).all()
+
+    length = (term.end_date - term.start_date).days + 1
+    matrix = np.frombuffer(b"".join(row.days for row in rows), dtype=np.uint8).reshape(len(rows), length)
+    school_days = np.flatnonzero((matrix > 0).any(axis=0))
+    return term, rows, matrix[:, school_days], [term.start_date + timedelta(days=int(d)) for d in school_days]
+
+def _student_stats(matrix: np.ndarray) -> dict:
+    recorded = matrix > 0
+    attended = (matrix == PRESENT) | (matrix == LATE)
+    missed = (matrix == ABSENT) | (matrix == EXCUSED)
+    recorded_days = recorded.sum(axis=1)
+    missed_days = missed.sum(axis=1)
+    longest_absence, current_absence = _runs(missed)
+    longest_presence, _ = _runs(attended)
+    return {
+        "recorded": recorded_days,
+        "attended": attended.sum(axis=1),
+        "missed": missed_days,
+        "counts": {name.lower(): (matrix == code).sum(axis=1) for name, code in STATUS_CODES.items()},
+        "rate": _rate(attended.sum(axis=1), recorded_days),
+        "chronic": (recorded_days >= CHRONIC_ABSENCE_MIN_DAYS) & (missed_days >= CHRONIC_ABSENCE_THRESHOLD * recorded_days),
+        "longest_absence": longest_absence,
+        "current_absence": current_absence,
+        "longest_presence": longest_presence,
+        "attended_matrix": attended,
+        "recorded_matrix": recorded,
+    }
+
+def _by_grade(grades: np.ndarray, per_row: np.ndarray) -> tuple:
+    """Sum rows per grade (rows are already sorted by grade); returns (grade names, sums)"""
+    names, starts = np.unique(grades, return_index=True)
+    order = np.argsort(starts)
+    names, starts = names[order], starts[order]
+    if len(grades) == 0:
+        return names, np.zeros((0,) + per_row.shape[1:], dtype=np.int64)
+    return names, np.add.reduceat(per_row.astype(np.int64), starts, axis=0)
+
+# --- Routes ---
+
+@router.post("/terms", response_model=AcademicTermResponse)
+async def create_term(
+    data: AcademicTermCreate,
+    db: AsyncSession = Depends(get_db),
+    current_school: School = Depends(get_current_school)
+):
+    """Define a term's dates; bitmaps are built from any attendance already recorded in it"""
+    name = data.name.strip()
+    if not name:
+        raise HTTPException(status_code=400, detail="Term name is required")
+    if data.end_date < data.start_date:
+        raise HTTPException(status_code=400, detail="end_date must not be before start_date")
+    if (data.end_date - data.start_date).days + 1 > MAX_TERM_DAYS:
+        raise HTTPException(status_code=400, detail=f"A term may span at most {MAX_TERM_DAYS} days")
+
+    clash = (await db.execute(
+        select(AcademicTerm.name).where(
+            AcademicTerm.school_id == current_school.id,
+            (AcademicTerm.name == name)
+            | ((AcademicTerm.start_date <= data.end_date) & (AcademicTerm.end_date >= data.start_date))
+        ).limit(1)
+    )).scalar_one_or_none()
+    if clash:
+        raise HTTPException(status_code=400, detail=f"Term clashes with existing term '{clash}' (same name or overlapping dates)")
+
+    term = AcademicTerm(school_id=current_school.id, name=name, start_date=data.start_date, end_date=data.end_date)
+    db.add(term)
+    await db.flush()
+    await rebuild_term_bitmaps(db, term)
+    await db.commit()
+    await db.refresh(term)
+    return term
+
+@router.get("/terms", response_model=list[AcademicTermResponse])
+async def list_terms(
+    db: AsyncSession = Depends(get_db),
+    current_school: School = Depends(get_current_school)
+):
+    result = await db.execute(
+        select(AcademicTerm).where(AcademicTerm.school_id == current_school.id).order_by(AcademicTerm.start_date)
+    )
+    return result.scalars().all()
+
+@router.get("/terms/{term_id}/report")
+async def get_term_report(
+    term_id: int,
+    grade: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+    current_school: School = Depends(get_current_school)
+):
+    """School-wide (or one grade's) attendance summary for a term, with the chronically absent students"""
+    term, rows, matrix, days = await _load_term(db, current_school.id, term_id, grade)
+    stats = _student_stats(matrix)
+    grades = np.array([row.grade or "" for row in rows], dtype=object)
+
+    names, per_grade = _by_grade(grades, np.column_stack([
+        stats["attended"], stats["recorded"], stats["chronic"], np.ones(len(rows), dtype=np.int64)
+    ]) if len(rows) else np.zeros((0, 4)))
+    chronic = np.flatnonzero(stats["chronic"])
+    chronic = chronic[np.argsort(stats["rate"][chronic], kind="stable")]
+
+    return {
+        "success": True,
+        "term": {"id": term.id, "name": term.name, "start_date": term.start_date, "end_date": term.end_date},
+        "grade": grade,
+        "school_days": len(days),
+        "students": len(rows),
+        "attendance_rate": _value(_rate(stats["attended"].sum(), stats["recorded"].sum())),
+        "chronic_absentees": int(stats["chronic"].sum()),
+        "chronic_threshold": CHRONIC_ABSENCE_THRESHOLD,
+        "by_grade": [
+            {"grade": name, "students": int(g[3]), "attendance_rate": _value(_rate(g[0], g[1])), "chronic_absentees": int(g[2])}
+            for name, g in zip(names, per_grade)
+        ],
+        "chronic": [{
+            "student_id": rows[i].student_id,
+            "name": f"{rows[i].first_name} {rows[i].last_name}",
+            "grade": rows[i].grade,
+            "attendance_rate": _value(stats["rate"][i]),
+            "missed_days": int(stats["missed"][i]),
+            "current_absence_streak": int(stats["current_absence"][i]),
+        } for i in chronic],
+    }
+
+@router.get("/terms/{term_id}/students")
+async def get_term_students(
+    term_id: int,
+    grade: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+    current_school: School = Depends(get_current_school)
+):
+    """Per-student counts, rate, streaks and chronic-absence flag for a term"""
+    term, rows, matrix, days = await _load_term(db, current_school.id, term_id, grade)
+    stats = _student_stats(matrix)
+    return {
+        "success": True,
+        "term_id": term.id,
+        "school_days": len(days),
+        "data": [{
+            "student_id": row.student_id,
+            "name": f"{row.first_name} {row.last_name}",
+            "grade": row.grade,
+            "recorded_days": int(stats["recorded"][i]),
+            **{status: int(counts[i]) for status, counts in stats["counts"].items()},
+            "attendance_rate": _value(stats["rate"][i]),
+            "longest_absence_streak": int(stats["longest_absence"][i]),
+            "current_absence_streak": int(stats["current_absence"][i]),
+            "longest_attendance_streak": int(stats["longest_presence"][i]),
+            "chronic_absence": bool(stats["chronic"][i]),
+        } for i, row in enumerate(rows)],
+    }
+
+@router.get("/terms/{term_id}/heatmap")
+async def get_term_heatmap(
+    term_id: int,
+    grade: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+    current_school: School = Depends(get_current_school)
+):
+    """Attendance rate per grade per school day (grades x days)"""
+    term, rows, matrix, days = await _load_term(db, current_school.id, term_id, grade)
+    stats = _student_stats(matrix)
+    grades = np.array([row.grade or "" for row in rows], dtype=object)
+    names, attended = _by_grade(grades, stats["attended_matrix"])
+    _, recorded = _by_grade(grades, stats["recorded_matrix"])
+    rates = _rate(attended, recorded)
+    return {
+        "success": True,
+        "term_id": term.id,
+        "days": days,
+        "grades": [{"grade": name, "rates": [_value(x) for x in rates[i]]} for i, name in enumerate(names)],
+    }
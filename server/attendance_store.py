@@ -0,0 +1,114 @@
+"""
+Compact per-student, per-term attendance (see models.AttendanceTermBitmap).
+
+Each bitmap is one status byte per calendar day of the term, so a whole
+school's term loads as a students x days uint8 matrix for the analytics in
+attendance_analytics.py. record_attendance calls sync_term_bitmaps() after
+its upsert, in the same transaction; rebuild_term_bitmaps() recomputes a
+term from the attendance table (new terms, backfills, repairs).
+"""
+from datetime import date
+from typing import Optional
+from sqlalchemy import select, delete, insert, update, bindparam
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import dialect_insert
+from models import AcademicTerm, AttendanceTermBitmap, Attendance
+
+NO_MARK = 0
+STATUS_CODES = {"PRESENT": 1, "ABSENT": 2, "LATE": 3, "EXCUSED": 4}
+OTHER = 5 # any other recorded status
+MAX_TERM_DAYS = 366
+
+def status_code(status: Optional[str]) -> int:
+    return STATUS_CODES.get((status or "").strip().upper(), OTHER)
+
+def term_length(term) -> int:
+    return (term.end_date - term.start_date).days + 1
+
+def terms_overlapping(school_id: int, first_day: date, last_day: date):
+    return select(AcademicTerm.id, AcademicTerm.start_date, AcademicTerm.end_date).where(
+        AcademicTerm.school_id == school_id,
+        AcademicTerm.start_date <= last_day,
+        AcademicTerm.end_date >= first_day
+    )
+
+def attendance_between(school_id: int, first_day: date, last_day: date):
+    return select(Attendance.student_id, Attendance.date, Attendance.status).where(
+        Attendance.school_id == school_id,
+        Attendance.date >= first_day,
+        Attendance.date <= last_day
+    )
+
+async def sync_term_bitmaps(db: AsyncSession, school_id: int, marks: dict) -> int:
+    """Apply {(student_id, day): status} to the bitmaps of every term containing those days (caller commits)"""
+    if not marks:
+        return 0
+    days = [day for _, day in marks]
+    terms = (await db.execute(terms_overlapping(school_id, min(days), max(days)))).all()
+
+    written = 0
+    for term in terms:
+        in_term = {key: status for key, status in marks.items() if term.start_date <= key[1] <= term.end_date}
+        if not in_term:
+            continue
+        student_ids = {student_id for student_id, _ in in_term}
+        length = term_length(term)
+        # Create missing rows first so the locking read below covers every student; two
+        # writers then serialise on the row locks instead of both upserting a fresh bitmap.
+        # On SQLite the caller's attendance upsert already holds the write lock.
+        await db.execute(dialect_insert(AttendanceTermBitmap).on_conflict_do_nothing(
+            index_elements=[AttendanceTermBitmap.term_id, AttendanceTermBitmap.student_id]
+        ), [{
+            "term_id": term.id, "student_id": student_id, "school_id": school_id, "days": bytes(length),
+        } for student_id in student_ids])
+        bitmaps = {student_id: bytearray(days) for student_id, days in (await db.execute(
+            select(AttendanceTermBitmap.student_id, AttendanceTermBitmap.days).where(
+                AttendanceTermBitmap.term_id == term.id,
+                AttendanceTermBitmap.student_id.in_(student_ids)
+            ).with_for_update()
+        )).all()}
+
+        for (student_id, day), status in in_term.items():
+            bitmaps[student_id][(day - term.start_date).days] = status_code(status)
+
+        table = AttendanceTermBitmap.__table__
+        await db.execute(
+            update(table)
+            .where(table.c.term_id == term.id, table.c.student_id == bindparam("b_student_id"))
+            .values(days=bindparam("b_days")),
+            [{"b_student_id": student_id, "b_days": bytes(bitmap)} for student_id, bitmap in bitmaps.items()]
+        )
+        written += len(bitmaps)
+    return written
+
+async def rebuild_term_bitmaps(db: AsyncSession, term: AcademicTerm) -> int:
+    """Recompute every bitmap of one term from the attendance table (caller commits)"""
+    await db.execute(delete(AttendanceTermBitmap).where(AttendanceTermBitmap.term_id == term.id))
+
+    length = term_length(term)
+    bitmaps = {}
+    result = await db.stream(attendance_between(term.school_id, term.start_date, term.end_date))
+    async for student_id, day, status in result:
+        bitmap = bitmaps.get(student_id)
+        if bitmap is None:
+            bitmap = bitmaps[student_id] = bytearray(length)
+        bitmap[(day - term.start_date).days] = status_code(status)
+
+    if bitmaps:
+        await db.execute(insert(AttendanceTermBitmap), [{
+            "term_id": term.id, "student_id": student_id, "school_id": term.school_id, "days": bytes(bitmap),
+        } for student_id, bitmap in bitmaps.items()])
+    return len(bitmaps)
+
+async def rebuild_bitmaps(db: AsyncSession, school_id: Optional[int] = None, term_id: Optional[int] = None) -> int:
+    """Rebuild the bitmaps of every matching term (caller commits)"""
+    query = select(AcademicTerm)
+    if school_id is not None:
+        query = query.where(AcademicTerm.school_id == school_id)
+    if term_id is not None:
+        query = query.where(AcademicTerm.id == term_id)
+    rebuilt = 0
+    for term in (await db.execute(query)).scalars().all():
+        rebuilt += await rebuild_term_bitmaps(db, term)
+    return rebuilt
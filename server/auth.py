@@ -3,12 +3,16 @@ from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 import os
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional, Any
+from typing import Optional, Any, Tuple, NamedTuple
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 
 from database import get_db
+from cache import TTLCache
 # Note: we import models inside the functions to avoid circular imports if models.py also imports auth
 # But here we can import them at top level if models.py doesn't import auth.
 # Checking models.py... it doesn't import auth.
@@ -18,9 +22,50 @@ SECRET_KEY = os.getenv("JWT_SECRET", "your-super-secret-jwt-key-change-this-in-p
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 1440  # 24 hours for development convenience
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Changing BCRYPT_SALT_ROUNDS makes existing hashes "deprecated"; they are
+# transparently rehashed with the new cost on the user's next successful login.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_SALT_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "64"))
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
+# Resolved principals, keyed by ("user", username) and ("school", username, school_id).
+# Entries are immutable snapshots (UserPrincipal / SchoolPrincipal) shared by every request;
+# handlers that need the ORM row load it by id. Each worker process has its own cache, so
+# invalidate_principals() only clears this process: other workers keep serving an entry
+# for at most PRINCIPAL_CACHE_TTL seconds.
+PRINCIPAL_CACHE_TTL = float(os.getenv("PRINCIPAL_CACHE_TTL", "60"))
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "4096"))
+principal_cache = TTLCache(maxsize=PRINCIPAL_CACHE_SIZE, ttl=PRINCIPAL_CACHE_TTL, name="principals")
+
+class UserPrincipal(NamedTuple):
+    """Read-only snapshot of the authenticated user"""
+    id: int
+    username: str
+    email: str
+    full_name: str
+    is_super_admin: bool
+
+class SchoolPrincipal(NamedTuple):
+    """Read-only snapshot of the school a token is scoped to"""
+    id: int
+    name: str
+    slug: str
+    status: str
+
+def invalidate_principals(school_id: Optional[int] = None, username: Optional[str] = None) -> int:
+    """Drop cached principals for a school and/or a user (call after blocking, deleting or re-linking).
+
+    Only this process's cache is cleared; other workers expire theirs within PRINCIPAL_CACHE_TTL.
+    """
+    def matches(key) -> bool:
+        if username is not None and key[1] == username:
+            return True
+        return school_id is not None and key[0] == "school" and key[2] == school_id
+    return principal_cache.invalidate_where(matches)
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a plain password against its hashed version"""
     return pwd_context.verify(plain_password, hashed_password)
@@ -29,6 +74,79 @@ def get_password_hash(password: str) -> str:
     """Hash a password using bcrypt"""
     return pwd_context.hash(password)
 
+class PasswordHasher:
+    """Runs bcrypt on a dedicated, bounded thread pool so logins never block the event loop.
+
+    At most `workers` hashes run at once; callers beyond that wait on a semaphore,
+    and once `max_queue` callers are waiting new requests are rejected with a 503
+    instead of piling up behind the pool.
+    """
+
+    def __init__(self, workers: int, max_queue: int):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self._slots = asyncio.Semaphore(workers)
+        self.waiting = 0
+        self.running = 0
+        self.peak_waiting = 0
+        self.completed = 0
+        self.rejected = 0
+        self.total_wait_seconds = 0.0
+        self.total_run_seconds = 0.0
+
+    async def run(self, fn, *args):
+        if self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Authentication is busy, please retry shortly"
+            )
+
+        queued_at = time.perf_counter()
+        self.waiting += 1
+        self.peak_waiting = max(self.peak_waiting, self.waiting)
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+
+        started_at = time.perf_counter()
+        self.total_wait_seconds += started_at - queued_at
+        self.running += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            self.running -= 1
+            self.completed += 1
+            self.total_run_seconds += time.perf_counter() - started_at
+            self._slots.release()
+
+    def stats(self) -> dict:
+        done = self.completed or 1
+        return {
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "running": self.running,
+            "queue_depth": self.waiting,
+            "peak_queue_depth": self.peak_waiting,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "avg_wait_ms": round(self.total_wait_seconds / done * 1000, 2),
+            "avg_hash_ms": round(self.total_run_seconds / done * 1000, 2),
+            "bcrypt_rounds": BCRYPT_ROUNDS,
+        }
+
+password_hasher = PasswordHasher(PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_QUEUE)
+
+async def hash_password(password: str) -> str:
+    """Non-blocking bcrypt hash for use inside request handlers"""
+    return await password_hasher.run(pwd_context.hash, password)
+
+async def verify_password_and_rehash(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Non-blocking verify; also returns a fresh hash when the stored one uses outdated cost parameters"""
+    return await password_hasher.run(pwd_context.verify_and_update, plain_password, hashed_password)
+
 def create_access_token(data: dict, school_id: Optional[int] = None, expires_delta: Optional[timedelta] = None) -> str:
     """Create a JWT access token with optional school_id scoping"""
     to_encode = data.copy()
@@ -63,10 +181,14 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession
     except JWTError:
         raise credentials_exception
     
-    result = await db.execute(select(User).where(User.username == username))
-    user = result.scalar_one_or_none()
+    user = principal_cache.get(("user", username))
     if user is None:
-        raise credentials_exception
+        result = await db.execute(user_by_username(username))
+        row = result.first()
+        if row is None:
+            raise credentials_exception
+        user = UserPrincipal(row.id, row.username, row.email, row.full_name, bool(row.is_super_admin))
+        principal_cache.set(("user", username), user)
     return user, payload
 
 async def get_current_super_admin(token_data: tuple = Depends(get_current_user)):
@@ -79,7 +201,27 @@ async def get_current_super_admin(token_data: tuple = Depends(get_current_user))
         )
     return user
 
-from models import school_users, School, UserRole, Permission
+from models import school_users, School, User, UserRole, Permission
+
+def user_by_username(username: str):
+    return select(User.id, User.username, User.email, User.full_name, User.is_super_admin).where(User.username == username)
+
+def school_by_id(school_id: int):
+    return select(School.id, School.name, School.slug, School.status).where(School.id == school_id)
+
+def active_membership(user_id: int, school_id: int):
+    return select(school_users).where(
+        school_users.c.user_id == user_id,
+        school_users.c.school_id == school_id,
+        school_users.c.is_active == True
+    )
+
+def login_membership(user_id: int):
+    """The user's active school and role, used to scope the login token"""
+    return select(school_users.c.school_id, school_users.c.role).where(
+        school_users.c.user_id == user_id,
+        school_users.c.is_active == True
+    )
 
 # ... existing code ...
 
@@ -95,10 +237,15 @@ async def get_current_school(token_data: tuple = Depends(get_current_user), db:
             status_code=status.HTTP_403_FORBIDDEN, 
             detail="Access token is not scoped to a specific school"
         )
+
+    cache_key = ("school", user.username, school_id)
+    school = principal_cache.get(cache_key)
+    if school is not None:
+        return school
     
     # 1. Verify school exists and is active
-    school_result = await db.execute(select(School).where(School.id == school_id))
-    school = school_result.scalar_one_or_none()
+    school_result = await db.execute(school_by_id(school_id))
+    school = school_result.first()
     if not school or school.status != 'active':
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -106,12 +253,7 @@ async def get_current_school(token_data: tuple = Depends(get_current_user), db:
         )
 
     # 2. SmartBiz logic: Verify user-school membership
-    membership_query = select(school_users).where(
-        school_users.c.user_id == user.id,
-        school_users.c.school_id == school_id,
-        school_users.c.is_active == True
-    )
-    result = await db.execute(membership_query)
+    result = await db.execute(active_membership(user.id, school_id))
     membership = result.first()
     
     if not membership:
@@ -119,7 +261,9 @@ async def get_current_school(token_data: tuple = Depends(get_current_user), db:
             status_code=status.HTTP_403_FORBIDDEN, 
             detail="User is not authorized for this school"
         )
-    
+
+    school = SchoolPrincipal(school.id, school.name, school.slug, school.status)
+    principal_cache.set(cache_key, school)
     return school
 
 def check_permissions(required_role: Optional[UserRole] = None, required_permission: Optional[Permission] = None):
@@ -0,0 +1,36 @@
+"""
+Rebuild the per-term attendance bitmaps from the attendance table.
+
+Terms created through POST /attendance/terms are built on creation and kept in
+step by record_attendance; run this after restoring or bulk-loading attendance
+rows, or whenever the bitmaps need to be recomputed:
+
+    python backfill_attendance.py                # every term of every school
+    python backfill_attendance.py --school-id 7  # one school
+    python backfill_attendance.py --term-id 12   # one term
+"""
+import sys
+import asyncio
+import argparse
+
+from database import async_session_maker, init_db
+from attendance_store import rebuild_bitmaps
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Rebuild attendance_term_bitmaps from attendance")
+    parser.add_argument("--school-id", type=int, default=None)
+    parser.add_argument("--term-id", type=int, default=None)
+    return parser.parse_args()
+
+async def main(school_id, term_id) -> int:
+    await init_db()
+    async with async_session_maker() as db:
+        rows = await rebuild_bitmaps(db, school_id, term_id)
+        await db.commit()
+    scope = f"term {term_id}" if term_id is not None else (f"school {school_id}" if school_id is not None else "all schools")
+    print(f"Rebuilt {rows} student attendance bitmaps for {scope}")
+    return 0
+
+if __name__ == "__main__":
+    args = parse_args()
+    sys.exit(asyncio.run(main(args.school_id, args.term_id)))
@@ -0,0 +1,32 @@
+"""
+Rebuild the daily fee-collection rollups from the payments table.
+
+Run once after deploying the rollups (payments recorded earlier are not in
+them yet), or any time the rollups need to be recomputed:
+
+    python backfill_collections.py               # every school
+    python backfill_collections.py --school-id 7 # one school
+"""
+import sys
+import asyncio
+import argparse
+
+from database import async_session_maker, init_db
+from collection_rollups import rebuild_collections
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Backfill payment_daily_rollups from payments")
+    parser.add_argument("--school-id", type=int, default=None)
+    return parser.parse_args()
+
+async def main(school_id) -> int:
+    await init_db()
+    async with async_session_maker() as db:
+        rows = await rebuild_collections(db, school_id)
+        await db.commit()
+    scope = f"school {school_id}" if school_id is not None else "all schools"
+    print(f"Rebuilt {rows} daily collection rows for {scope}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(parse_args().school_id)))
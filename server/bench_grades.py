@@ -0,0 +1,64 @@
+"""
+Benchmark for bulk mark-sheet uploads through record_grades.
+
+Seeds a throwaway SQLite database with one school, one exam and N students,
+then times a first upload (all inserts) and a corrected re-upload (all updates):
+
+    python bench_grades.py --entries 10000
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark record_grades bulk upserts")
+    parser.add_argument("--entries", type=int, default=10000)
+    parser.add_argument("--database-url", default=None, help="defaults to a temporary SQLite file")
+    return parser.parse_args()
+
+async def run(entries: int):
+    from sqlalchemy import insert, select, func
+    from database import async_session_maker, init_db
+    from models import School, Subject, Exam, Student, GradeEntry
+    from exams import record_grades, GradeCreate
+
+    await init_db()
+    async with async_session_maker() as db:
+        school = School(name="Bench School", slug=f"bench-{time.time_ns()}")
+        db.add(school)
+        await db.flush()
+        subject = Subject(school_id=school.id, name="Mathematics")
+        db.add(subject)
+        await db.flush()
+        exam = Exam(school_id=school.id, subject_id=subject.id, title="Bench Exam", max_score=100.0)
+        db.add(exam)
+        await db.flush()
+        await db.execute(insert(Student), [
+            {"school_id": school.id, "first_name": "Student", "last_name": str(i), "grade": "Form 1"}
+            for i in range(entries)
+        ])
+        await db.commit()
+        student_ids = (await db.execute(select(Student.id).where(Student.school_id == school.id))).scalars().all()
+
+    for label in ("insert", "re-upload"):
+        sheet = [GradeCreate(student_id=sid, score=round(random.uniform(0, 100), 1)) for sid in student_ids]
+        async with async_session_maker() as db:
+            started = time.perf_counter()
+            result = await record_grades(exam_id=exam.id, grades=sheet, enforce_max_score=True, db=db, current_school=school)
+            elapsed = time.perf_counter() - started
+        print(f"{label:>10}: {len(sheet)} entries in {elapsed * 1000:.1f} ms "
+              f"({len(sheet) / elapsed:,.0f} rows/s) accepted={result['accepted']} updated={result['updated']}")
+
+    async with async_session_maker() as db:
+        stored = (await db.execute(select(func.count(GradeEntry.id)).where(GradeEntry.exam_id == exam.id))).scalar()
+    print(f"{'stored':>10}: {stored} grade rows (expected {len(student_ids)})")
+
+if __name__ == "__main__":
+    args = parse_args()
+    # Never fall back to the configured DATABASE_URL: the benchmark writes thousands of rows
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite+aiosqlite:///{tempfile.mkdtemp()}/bench.db"
+    sys.exit(asyncio.run(run(args.entries)))
@@ -0,0 +1,143 @@
+"""
+Fee collection time series served from PaymentDailyRollup.
+
+Payment writers call add_collections() inside their own transaction, so a
+rollup row moves together with the payments it counts. Endpoints read the
+rollups only (a few rows per day), never the payments table.
+"""
+from datetime import date, timedelta
+from typing import Literal, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import select, delete, insert, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import get_db, dialect_insert
+from models import PaymentDailyRollup, Payment, Student, School
+from auth import get_current_school
+from money import from_cents
+
+router = APIRouter(prefix="/collections", tags=["Payments & Fees"])
+
+UNKNOWN_METHOD = "Other"
+
+def method_key(payment_method: Optional[str]) -> str:
+    return (payment_method or "").strip() or UNKNOWN_METHOD
+
+async def add_collections(db: AsyncSession, school_id: int, rows: list) -> None:
+    """Add (day, payment_method, grade, payments, amount_cents) tuples to the rollups (caller commits)"""
+    totals = {}
+    for day, payment_method, grade, payments, amount_cents in rows:
+        key = (day, method_key(payment_method), grade)
+        count, cents = totals.get(key, (0, 0))
+        totals[key] = (count + payments, cents + amount_cents)
+    if not totals:
+        return
+
+    stmt = dialect_insert(PaymentDailyRollup)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[
+            PaymentDailyRollup.school_id, PaymentDailyRollup.day,
+            PaymentDailyRollup.payment_method, PaymentDailyRollup.grade
+        ],
+        set_={
+            "payments": PaymentDailyRollup.payments + stmt.excluded.payments,
+            "amount_cents": PaymentDailyRollup.amount_cents + stmt.excluded.amount_cents,
+        }
+    )
+    await db.execute(stmt, [{
+        "school_id": school_id, "day": day, "payment_method": payment_method, "grade": grade,
+        "payments": count, "amount_cents": cents,
+    } for (day, payment_method, grade), (count, cents) in totals.items()])
+
+async def rebuild_collections(db: AsyncSession, school_id: Optional[int] = None) -> int:
+    """Recompute the rollups from the payments table with one grouped INSERT ... SELECT (caller commits)"""
+    clear = delete(PaymentDailyRollup)
+    # Same bucket as method_key(): trimmed, blank -> UNKNOWN_METHOD
+    method = func.coalesce(func.nullif(func.trim(Payment.payment_method), ""), UNKNOWN_METHOD)
+    grouped = select(
+        Payment.school_id,
+        func.date(Payment.created_at),
+        method,
+        Student.grade,
+        func.count(Payment.id),
+        func.sum(Payment.amount_cents),
+    ).join(Student, Payment.student_id == Student.id)
+    if school_id is not None:
+        clear = clear.where(PaymentDailyRollup.school_id == school_id)
+        grouped = grouped.where(Payment.school_id == school_id)
+    grouped = grouped.group_by(
+        Payment.school_id,
+        func.date(Payment.created_at),
+        method,
+        Student.grade
+    )
+
+    await db.execute(clear)
+    result = await db.execute(insert(PaymentDailyRollup).from_select(
+        ["school_id", "day", "payment_method", "grade", "payments", "amount_cents"], grouped
+    ))
+    return result.rowcount
+
+def _period_start(day: date, interval: str) -> date:
+    return day - timedelta(days=day.weekday()) if interval == "week" else day
+
+SERIES_KEYS = {
+    "total": None,
+    "method": PaymentDailyRollup.payment_method,
+    "grade": PaymentDailyRollup.grade,
+}
+
+def daily_collections(school_id: int, from_date: date, to_date: date, key_column=None):
+    """(day[, key], payments, amount_cents) rollup sums for the school between two days"""
+    columns = [PaymentDailyRollup.day]
+    if key_column is not None:
+        columns.append(key_column)
+    return (
+        select(*columns, func.sum(PaymentDailyRollup.payments), func.sum(PaymentDailyRollup.amount_cents))
+        .where(
+            PaymentDailyRollup.school_id == school_id,
+            PaymentDailyRollup.day >= from_date,
+            PaymentDailyRollup.day <= to_date
+        )
+        .group_by(*columns)
+        .order_by(PaymentDailyRollup.day)
+    )
+
+@router.get("/series")
+async def get_collection_series(
+    from_date: date = Query(..., alias="from", description="Usually the first day of term"),
+    to_date: Optional[date] = Query(None, alias="to"),
+    interval: Literal["day", "week"] = "day",
+    by: Literal["total", "method", "grade"] = "total",
+    db: AsyncSession = Depends(get_db),
+    current_school: School = Depends(get_current_school)
+):
+    """Collections per day or week (weeks start on Monday) with a running term-to-date total per series"""
+    to_date = to_date or date.today()
+    if to_date < from_date:
+        raise HTTPException(status_code=400, detail="'to' must not be before 'from'")
+
+    key_column = SERIES_KEYS[by]
+    result = await db.execute(daily_collections(current_school.id, from_date, to_date, key_column))
+
+    periods = {}
+    for row in result.all():
+        key = row[1] if key_column is not None else "total"
+        period = (_period_start(row[0], interval), key)
+        count, cents = periods.get(period, (0, 0))
+        periods[period] = (count + row[-2], cents + row[-1])
+
+    series, running = {}, {}
+    for (period, key), (count, cents) in sorted(periods.items()):
+        running[key] = running.get(key, 0) + cents
+        series.setdefault(key, []).append({
+            "period": period, "payments": count, "amount": from_cents(cents), "to_date": from_cents(running[key])
+        })
+
+    return {
+        "success": True,
+        "from": from_date,
+        "to": to_date,
+        "interval": interval,
+        "data": [{"key": key, "points": points, "total": from_cents(running[key])} for key, points in series.items()]
+    }
@@ -0,0 +1,131 @@
+"""
+Incrementally maintained per-school counters (see models.SchoolCounters).
+
+Writers call bump_counters() inside their own transaction, so a counter change
+commits or rolls back together with the row that caused it. Timetable grids embed
+subject and teacher names, so renaming either also bumps the timetable version
+(see the listeners at the bottom).
+"""
+import logging
+from datetime import datetime
+from sqlalchemy import select, update, func, event, inspect
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import async_session_maker, dialect_insert
+from models import SchoolCounters, School, Student, Subject, Exam, FeeInvoice, User, school_users, UserRole
+
+logger = logging.getLogger(__name__)
+
+STAFF_ROLES = (UserRole.TEACHER, UserRole.STAFF)
+
+def counter_queries(school_id: int) -> dict:
+    """One aggregate statement per SchoolCounters column"""
+    return {
+        "students": select(func.count(Student.id)).where(Student.school_id == school_id),
+        "staff": select(func.count(school_users.c.user_id)).where(
+            school_users.c.school_id == school_id,
+            school_users.c.role.in_(STAFF_ROLES)
+        ),
+        "subjects": select(func.count(Subject.id)).where(Subject.school_id == school_id),
+        "exams": select(func.count(Exam.id)).where(Exam.school_id == school_id),
+        "outstanding_fees_cents": select(func.sum(FeeInvoice.total_cents - FeeInvoice.paid_cents)).where(
+            FeeInvoice.school_id == school_id,
+            FeeInvoice.status != 'paid'
+        ),
+    }
+
+async def compute_counters(db: AsyncSession, school_id: int) -> dict:
+    """Recount everything from the source tables"""
+    return {
+        name: (await db.execute(query)).scalar() or 0
+        for name, query in counter_queries(school_id).items()
+    }
+
+async def reconcile_school(db: AsyncSession, school_id: int) -> dict:
+    """Overwrite the school's counters row with freshly computed values (caller commits)"""
+    values = await compute_counters(db, school_id)
+    now = datetime.utcnow()
+    stmt = dialect_insert(SchoolCounters).values(school_id=school_id, reconciled_at=now, updated_at=now, **values)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[SchoolCounters.school_id],
+        set_={**values, "reconciled_at": now, "updated_at": now}
+    )
+    await db.execute(stmt)
+    return values
+
+async def bump_counters(db: AsyncSession, school_id: int, **deltas: int) -> None:
+    """Atomically add `deltas` (e.g. students=1) to the school's counters in the caller's transaction.
+
+    Schools that predate the counters table have no row yet; for those the pending
+    write is flushed and the row is built from a full recount instead.
+    """
+    deltas = {name: delta for name, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    result = await db.execute(
+        update(SchoolCounters)
+        .where(SchoolCounters.school_id == school_id)
+        .values(
+            updated_at=datetime.utcnow(),
+            **{name: getattr(SchoolCounters, name) + delta for name, delta in deltas.items()}
+        )
+    )
+    if result.rowcount == 0:
+        await db.flush()
+        await reconcile_school(db, school_id)
+
+async def touch_timetable(db: AsyncSession, school_id: int) -> None:
+    """Mark the school's timetable as changed, in the caller's transaction"""
+    now = datetime.utcnow()
+    values = {"timetable_version": SchoolCounters.timetable_version + 1, "timetable_updated_at": now}
+    result = await db.execute(update(SchoolCounters).where(SchoolCounters.school_id == school_id).values(**values))
+    if result.rowcount == 0:
+        await db.flush()
+        await reconcile_school(db, school_id)
+        await db.execute(update(SchoolCounters).where(SchoolCounters.school_id == school_id).values(**values))
+
+async def lock_timetable(db: AsyncSession, school_id: int) -> None:
+    """Serialise timetable writers for one school: locks its counters row until the caller commits"""
+    locked = select(SchoolCounters.school_id).where(SchoolCounters.school_id == school_id).with_for_update()
+    if (await db.execute(locked)).scalar_one_or_none() is None:
+        await reconcile_school(db, school_id)
+        await db.execute(locked)
+
+async def reconcile_all_counters() -> int:
+    """Periodic job: rebuild every school's counters, one short transaction per school"""
+    async with async_session_maker() as db:
+        school_ids = (await db.execute(select(School.id))).scalars().all()
+
+    drifted = 0
+    for school_id in school_ids:
+        async with async_session_maker() as db:
+            before = await db.get(SchoolCounters, school_id)
+            snapshot = None if before is None else {
+                "students": before.students, "staff": before.staff, "subjects": before.subjects,
+                "exams": before.exams, "outstanding_fees_cents": before.outstanding_fees_cents,
+            }
+            values = await reconcile_school(db, school_id)
+            await db.commit()
+            if snapshot is not None and snapshot != values:
+                drifted += 1
+                logger.warning(f"Counter drift corrected for school {school_id}: {snapshot} -> {values}")
+    return drifted
+
+# --- Timetable versions follow the names the grids show ---
+
+def _timetable_changed(connection, school_filter) -> None:
+    connection.execute(update(SchoolCounters).where(school_filter).values(
+        timetable_version=SchoolCounters.timetable_version + 1, timetable_updated_at=datetime.utcnow()
+    ))
+
+@event.listens_for(Subject, "after_update")
+def _subject_renamed(mapper, connection, target):
+    if inspect(target).attrs.name.history.has_changes():
+        _timetable_changed(connection, SchoolCounters.school_id == target.school_id)
+
+@event.listens_for(User, "after_update")
+def _teacher_renamed(mapper, connection, target):
+    if inspect(target).attrs.full_name.history.has_changes():
+        _timetable_changed(connection, SchoolCounters.school_id.in_(
+            select(school_users.c.school_id).where(school_users.c.user_id == target.id)
+        ))
@@ -2,7 +2,9 @@ from fastapi import APIRouter, Depends
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func
 from database import get_db
-from models import Student, User, school_users, UserRole, Subject, FeeInvoice, School
+from models import Student, User, School, SchoolCounters
+from counters import reconcile_school
+from money import from_cents
 from auth import get_current_school, get_current_user
 
 router = APIRouter(prefix="/dashboard", tags=["Dashboard"])
@@ -37,43 +39,26 @@ async def get_dashboard_stats(
         from fastapi import HTTPException
         raise HTTPException(status_code=403, detail="School ID missing in token")
 
-    # Fetch school-specific metrics (Existing logic)
-    school_result = await db.execute(select(School).where(School.id == school_id))
-    school = school_result.scalar_one_or_none()
-    
-    if not school:
-        from fastapi import HTTPException
-        raise HTTPException(status_code=404, detail="School not found")
-    
-    # 1. Total Students
-    students_query = select(func.count(Student.id)).where(Student.school_id == school.id)
-    total_students = (await db.execute(students_query)).scalar()
-    
-    # 2. Total Staff (Users with TEACHER or STAFF role in this school)
-    staff_query = select(func.count(school_users.c.user_id)).where(
-        school_users.c.school_id == school.id,
-        school_users.c.role.in_([UserRole.TEACHER, UserRole.STAFF])
-    )
-    total_staff = (await db.execute(staff_query)).scalar()
-    
-    # 3. Unique Courses (Subject grades)
-    subjects_query = select(func.count(Subject.id)).where(Subject.school_id == school.id)
-    unique_courses = (await db.execute(subjects_query)).scalar()
-    
-    # 4. Outstanding Fees
-    fees_query = select(func.sum(FeeInvoice.total_amount - FeeInvoice.paid_amount)).where(
-        FeeInvoice.school_id == school.id,
-        FeeInvoice.status != 'paid'
-    )
-    outstanding_fees = (await db.execute(fees_query)).scalar() or 0
+    # School-specific metrics: a single primary-key read of the maintained counters
+    counters = await db.get(SchoolCounters, school_id)
+    if counters is None:
+        school = await db.get(School, school_id)
+        if not school:
+            from fastapi import HTTPException
+            raise HTTPException(status_code=404, detail="School not found")
+        # School predates the counters table; build its row once
+        await reconcile_school(db, school.id)
+        await db.commit()
+        counters = await db.get(SchoolCounters, school_id)
     
     return {
         "success": True,
         "data": {
-            "totalStudents": total_students,
-            "activeStudents": total_students, # Placeholder
-            "totalStaff": total_staff,
-            "uniqueCourses": unique_courses,
-            "outstandingFees": float(outstanding_fees)
+            "totalStudents": counters.students,
+            "activeStudents": counters.students, # Placeholder
+            "totalStaff": counters.staff,
+            "uniqueCourses": counters.subjects,
+            "totalExams": counters.exams,
+            "outstandingFees": from_cents(counters.outstanding_fees_cents)
         }
     }
@@ -1,19 +1,144 @@
 import os
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
+import time
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker, AsyncEngine
 from sqlalchemy.orm import declarative_base
-from sqlalchemy import text
+from sqlalchemy.pool import AsyncAdaptedQueuePool, StaticPool
+from sqlalchemy.engine import make_url
+from sqlalchemy import text, event, exc
+from sqlalchemy.schema import CreateIndex
 from tenacity import retry, stop_after_attempt, wait_fixed
 import logging
 
 logger = logging.getLogger(__name__)
 
-# Force SQLite for local Windows development
-DATABASE_URL = "sqlite+aiosqlite:///./eduke.db"
+# ==================== SETTINGS ====================
 
-engine = create_async_engine(
-    DATABASE_URL, 
-    connect_args={"check_same_thread": False}
-)
+def _env_int(name: str, default: int) -> int:
+    return int(os.getenv(name, str(default)))
+
+def _env_bool(name: str, default: bool) -> bool:
+    return os.getenv(name, str(default)).strip().lower() in ("1", "true", "yes", "on")
+
+# SQLite stays the default for local development; set DATABASE_URL for Postgres
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///./eduke.db")
+
+# Postgres pool sizing
+DB_POOL_SIZE = _env_int("DB_POOL_SIZE", 10)
+DB_MAX_OVERFLOW = _env_int("DB_MAX_OVERFLOW", 20)
+DB_POOL_TIMEOUT = _env_int("DB_POOL_TIMEOUT", 30)
+DB_POOL_RECYCLE = _env_int("DB_POOL_RECYCLE", 1800)
+DB_POOL_PRE_PING = _env_bool("DB_POOL_PRE_PING", True)
+DB_ECHO = _env_bool("DB_ECHO", False)
+
+# SQLite production pragmas (applied to every new connection)
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_MMAP_SIZE = _env_int("SQLITE_MMAP_SIZE", 268435456)      # 256 MiB
+SQLITE_CACHE_SIZE = _env_int("SQLITE_CACHE_SIZE", -65536)       # negative = KiB, i.e. 64 MiB
+SQLITE_BUSY_TIMEOUT_MS = _env_int("SQLITE_BUSY_TIMEOUT_MS", 5000)
+
+def normalize_database_url(url: str) -> str:
+    """Map the postgres:// URLs handed out by Render/Heroku onto the asyncpg driver"""
+    for prefix in ("postgres://", "postgresql://"):
+        if url.startswith(prefix):
+            return "postgresql+asyncpg://" + url[len(prefix):]
+    return url
+
+# ==================== POOL METRICS ====================
+
+class PoolMetrics:
+    """Checkout latency and saturation counters for the connection pool"""
+
+    def __init__(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.peak_checked_out = 0
+
+    def record(self, wait_seconds: float, checked_out: int) -> None:
+        self.checkouts += 1
+        self.total_wait_seconds += wait_seconds
+        self.max_wait_seconds = max(self.max_wait_seconds, wait_seconds)
+        self.peak_checked_out = max(self.peak_checked_out, checked_out)
+
+pool_metrics = PoolMetrics()
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """AsyncAdaptedQueuePool that times how long each checkout waits for a connection"""
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            pool_metrics.timeouts += 1
+            raise
+        pool_metrics.record(time.perf_counter() - started, self.checkedout())
+        return connection
+
+def get_pool_stats() -> dict:
+    pool = engine.pool
+    stats = {
+        "dialect": engine.dialect.name,
+        "pool_class": type(pool).__name__,
+        "checkouts": pool_metrics.checkouts,
+        "timeouts": pool_metrics.timeouts,
+        "avg_checkout_ms": round(pool_metrics.total_wait_seconds / (pool_metrics.checkouts or 1) * 1000, 3),
+        "max_checkout_ms": round(pool_metrics.max_wait_seconds * 1000, 3),
+        "peak_checked_out": pool_metrics.peak_checked_out,
+    }
+    if isinstance(pool, AsyncAdaptedQueuePool):
+        capacity = pool.size() + max(pool._max_overflow, 0)
+        stats.update({
+            "pool_size": pool.size(),
+            "max_overflow": pool._max_overflow,
+            "checked_out": pool.checkedout(),
+            "idle": pool.checkedin(),
+            "overflow": pool.overflow(),
+            "saturation": round(pool.checkedout() / capacity, 4) if capacity else 0.0,
+        })
+    return stats
+
+# ==================== ENGINE FACTORY ====================
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    cursor.execute(f"PRAGMA cache_size={SQLITE_CACHE_SIZE}")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.close()
+
+def build_engine(url: str = DATABASE_URL) -> AsyncEngine:
+    """Create the async engine with pooling/pragmas tuned for the target backend"""
+    url = normalize_database_url(url)
+    backend = make_url(url).get_backend_name()
+
+    if backend == "sqlite":
+        in_memory = make_url(url).database in (None, "", ":memory:")
+        new_engine = create_async_engine(
+            url,
+            echo=DB_ECHO,
+            connect_args={"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000},
+            poolclass=StaticPool if in_memory else InstrumentedQueuePool,
+        )
+        if not in_memory:
+            event.listen(new_engine.sync_engine, "connect", _apply_sqlite_pragmas)
+        return new_engine
+
+    return create_async_engine(
+        url,
+        echo=DB_ECHO,
+        poolclass=InstrumentedQueuePool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+    )
+
+engine = build_engine()
 async_session_maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 Base = declarative_base()
 
@@ -24,6 +149,21 @@ async def get_db():
         finally:
             await session.close()
 
+def dialect_insert(table):
+    """INSERT construct for the active backend, exposing on_conflict_do_update/do_nothing"""
+    if engine.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(table)
+
+def ensure_indexes(sync_conn, metadata) -> None:
+    """Create any index declared in the models that an existing database is missing"""
+    for table in metadata.sorted_tables:
+        for index in table.indexes:
+            # IF NOT EXISTS rather than checkfirst: reflection cannot see expression indexes
+            sync_conn.execute(CreateIndex(index, if_not_exists=True))
+
 @retry(stop=stop_after_attempt(5), wait=wait_fixed(2))
 async def init_db():
     """Initialize database tables with retry logic - SmartBiz pattern"""
@@ -32,7 +172,11 @@ async def init_db():
             # This creates all tables defined in your models.py
             from models import Base as ModelBase
             await conn.run_sync(ModelBase.metadata.create_all)
-        logger.info("✅ Database initialized successfully: eduke.db")
+            from migrations import run_migrations
+            await conn.run_sync(run_migrations)
+            # create_all skips indexes on tables that already exist
+            await conn.run_sync(ensure_indexes, ModelBase.metadata)
+        logger.info(f"✅ Database initialized successfully: {engine.url.render_as_string(hide_password=True)}")
     except Exception as e:
         logger.error(f"❌ Database initialization failed: {e}")
         raise e
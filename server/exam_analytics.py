@@ -0,0 +1,186 @@
+"""
+Exam and subject score analytics.
+
+Scores are loaded as a single column and summarised with NumPy in one pass:
+moments (mean, standard deviation, skewness, kurtosis) are computed from one
+array of deviations, and percentiles, grade bands and the pass rate from the
+same array. Results are cached per exam / subject and dropped by record_grades
+as soon as marks for that exam change; the TTL only bounds staleness across
+worker processes.
+"""
+import os
+from typing import Optional
+import numpy as np
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from cache import TTLCache, Generations
+from database import get_db
+from models import Exam, GradeEntry, Subject, School
+from auth import get_current_school
+
+router = APIRouter(prefix="/academic", tags=["Exams & Grading"])
+
+ANALYTICS_CACHE_TTL = float(os.getenv("ANALYTICS_CACHE_TTL", "3600"))
+ANALYTICS_CACHE_SIZE = int(os.getenv("ANALYTICS_CACHE_SIZE", "2048"))
+EXAM_PASS_MARK = float(os.getenv("EXAM_PASS_MARK", "50")) # percent of max_score
+
+analytics_cache = TTLCache(maxsize=ANALYTICS_CACHE_SIZE, ttl=ANALYTICS_CACHE_TTL, name="exam_analytics")
+# Bumped per ("exam", exam_id) / ("subject", subject_id) on invalidation
+analytics_generations = Generations()
+
+PERCENTILES = (10, 25, 50, 75, 90)
+# Lower bound (percent of max_score) of each band, best first
+GRADE_BANDS = (("A", 80), ("B", 70), ("C", 60), ("D", 50), ("E", 0))
+DISTRIBUTION_BINS = 10
+
+def invalidate_exam_analytics(exam_id: int, subject_id: int) -> int:
+    """Drop cached analytics that include this exam's marks"""
+    analytics_generations.bump(("exam", exam_id))
+    analytics_generations.bump(("subject", subject_id))
+    def stale(key):
+        return (key[0] == "exam" and key[2] == exam_id) or (key[0] == "subject" and key[2] == subject_id)
+    return analytics_cache.invalidate_where(stale)
+
+def _round(value) -> Optional[float]:
+    return None if value is None or not np.isfinite(value) else round(float(value), 4)
+
+def score_statistics(percent: np.ndarray) -> dict:
+    """Summary statistics for scores expressed as a percentage of the exam's max score.
+
+    Standard deviation, skewness and kurtosis use the sample (bias-corrected)
+    formulas, matching STDEV.S, SKEW and KURT in spreadsheets.
+    """
+    n = int(percent.size)
+    if n == 0:
+        return {"count": 0}
+
+    mean = percent.mean()
+    deviations = percent - mean
+    m2 = np.dot(deviations, deviations)
+    std = np.sqrt(m2 / (n - 1)) if n > 1 else None
+    skewness = kurtosis = None
+    if std:
+        z = deviations / std
+        z2 = z * z
+        if n > 2:
+            skewness = n / ((n - 1) * (n - 2)) * np.dot(z2, z)
+        if n > 3:
+            kurtosis = (n * (n + 1) / ((n - 1) * (n - 2) * (n - 3)) * np.dot(z2, z2)
+                        - 3 * (n - 1) ** 2 / ((n - 2) * (n - 3)))
+
+    band_edges = [bound for _, bound in reversed(GRADE_BANDS)] + [np.inf]
+    band_counts, _ = np.histogram(np.clip(percent, 0, None), bins=band_edges)
+    distribution, edges = np.histogram(np.clip(percent, 0, 100), bins=DISTRIBUTION_BINS, range=(0, 100))
+    percentiles = np.percentile(percent, PERCENTILES)
+
+    return {
+        "count": n,
+        "mean": _round(mean),
+        "median": _round(percentiles[PERCENTILES.index(50)]),
+        "std_dev": _round(std),
+        "skewness": _round(skewness),
+        "kurtosis": _round(kurtosis),
+        "min": _round(percent.min()),
+        "max": _round(percent.max()),
+        "percentiles": {f"p{p}": _round(v) for p, v in zip(PERCENTILES, percentiles)},
+        "grade_bands": {name: int(count) for (name, _), count in zip(GRADE_BANDS, band_counts[::-1])},
+        "distribution": [
+            {"from": _round(lo), "to": _round(hi), "count": int(count)}
+            for lo, hi, count in zip(edges[:-1], edges[1:], distribution)
+        ],
+        "pass_mark": EXAM_PASS_MARK,
+        "pass_rate": _round((percent >= EXAM_PASS_MARK).mean() * 100),
+    }
+
+def exam_scores(exam_id: int):
+    return select(GradeEntry.score).where(GradeEntry.exam_id == exam_id)
+
+@router.get("/exams/{exam_id}/analytics")
+async def get_exam_analytics(
+    exam_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_school: School = Depends(get_current_school)
+):
+    """Score statistics for one exam (scores reported as a percentage of max_score)"""
+    cache_key = ("exam", current_school.id, exam_id)
+    cached = analytics_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    generation = analytics_generations.current(("exam", exam_id))
+
+    exam_result = await db.execute(select(Exam).where(Exam.id == exam_id, Exam.school_id == current_school.id))
+    exam = exam_result.scalar_one_or_none()
+    if not exam:
+        raise HTTPException(status_code=404, detail="Exam not found")
+
+    scores = (await db.execute(exam_scores(exam_id))).scalars().all()
+    percent = np.fromiter(scores, dtype=np.float64, count=len(scores)) * (100.0 / (exam.max_score or 100.0))
+
+    result = {
+        "success": True,
+        "exam_id": exam.id,
+        "subject_id": exam.subject_id,
+        "title": exam.title,
+        "term": exam.term,
+        "max_score": exam.max_score,
+        "data": score_statistics(percent)
+    }
+    if analytics_generations.current(("exam", exam_id)) == generation:
+        analytics_cache.set(cache_key, result)
+    return result
+
+@router.get("/subjects/{subject_id}/analytics")
+async def get_subject_analytics(
+    subject_id: int,
+    term: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+    current_school: School = Depends(get_current_school)
+):
+    """Score statistics across every exam of a subject (optionally one term), plus a per-exam breakdown"""
+    cache_key = ("subject", current_school.id, subject_id, term)
+    cached = analytics_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    generation = analytics_generations.current(("subject", subject_id))
+
+    subject_result = await db.execute(
+        select(Subject).where(Subject.id == subject_id, Subject.school_id == current_school.id)
+    )
+    subject = subject_result.scalar_one_or_none()
+    if not subject:
+        raise HTTPException(status_code=404, detail="Subject not found")
+
+    query = select(GradeEntry.exam_id, GradeEntry.score, Exam.max_score).join(
+        Exam, GradeEntry.exam_id == Exam.id
+    ).where(Exam.subject_id == subject_id, Exam.school_id == current_school.id)
+    if term:
+        query = query.where(Exam.term == term)
+    rows = (await db.execute(query.order_by(GradeEntry.exam_id))).all()
+
+    # Columnar: one array per field, percentages computed vectorised
+    exam_ids = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+    scores = np.fromiter((r[1] for r in rows), dtype=np.float64, count=len(rows))
+    max_scores = np.fromiter((r[2] or 100.0 for r in rows), dtype=np.float64, count=len(rows))
+    percent = scores * 100.0 / max_scores
+
+    # Rows are sorted by exam, so each exam is one contiguous slice
+    unique_ids, starts = np.unique(exam_ids, return_index=True)
+    bounds = list(starts[1:]) + [len(rows)]
+    per_exam = [
+        {"exam_id": int(eid), **score_statistics(percent[start:end])}
+        for eid, start, end in zip(unique_ids, starts, bounds)
+    ]
+
+    result = {
+        "success": True,
+        "subject_id": subject.id,
+        "subject": subject.name,
+        "term": term,
+        "data": score_statistics(percent),
+        "exams": per_exam
+    }
+    if analytics_generations.current(("subject", subject_id)) == generation:
+        analytics_cache.set(cache_key, result)
+    return result
@@ -5,9 +5,12 @@ from typing import List, Optional
 from pydantic import BaseModel
 from datetime import datetime, date
 
-from database import get_db
+from database import get_db, dialect_insert
 from models import Subject, Exam, GradeEntry, School, Student
 from auth import get_current_school
+from counters import bump_counters
+from exam_analytics import invalidate_exam_analytics
+from rankings import invalidate_rankings
 
 router = APIRouter(prefix="/academic", tags=["Exams & Grading"])
 
@@ -55,16 +58,23 @@ async def create_subject(
 ):
     new_subject = Subject(**data.dict(), school_id=current_school.id)
     db.add(new_subject)
+    await bump_counters(db, current_school.id, subjects=1)
     await db.commit()
     await db.refresh(new_subject)
     return new_subject
 
+def school_subjects(school_id: int):
+    return select(Subject).where(Subject.school_id == school_id)
+
+def school_exams(school_id: int):
+    return select(Exam).where(Exam.school_id == school_id)
+
 @router.get("/subjects", response_model=List[SubjectResponse])
 async def get_subjects(
     db: AsyncSession = Depends(get_db),
     current_school: School = Depends(get_current_school)
 ):
-    result = await db.execute(select(Subject).where(Subject.school_id == current_school.id))
+    result = await db.execute(school_subjects(current_school.id))
     return result.scalars().all()
 
 # Exams
@@ -81,6 +91,7 @@ async def create_exam(
 
     new_exam = Exam(**data.dict(), school_id=current_school.id)
     db.add(new_exam)
+    await bump_counters(db, current_school.id, exams=1)
     await db.commit()
     await db.refresh(new_exam)
     return new_exam
@@ -90,7 +101,7 @@ async def get_exams(
     db: AsyncSession = Depends(get_db),
     current_school: School = Depends(get_current_school)
 ):
-    result = await db.execute(select(Exam).where(Exam.school_id == current_school.id))
+    result = await db.execute(school_exams(current_school.id))
     return result.scalars().all()
 
 # Grading
@@ -98,28 +109,62 @@ async def get_exams(
 async def record_grades(
     exam_id: int,
     grades: List[GradeCreate],
+    enforce_max_score: bool = True,
     db: AsyncSession = Depends(get_db),
     current_school: School = Depends(get_current_school)
 ):
-    """Batch record marks for an exam"""
+    """Batch record marks for an exam (idempotent per student; re-uploads overwrite)"""
     # 1. Verify exam belongs to school
     exam_result = await db.execute(select(Exam).where(Exam.id == exam_id, Exam.school_id == current_school.id))
-    if not exam_result.scalar_one_or_none():
+    exam = exam_result.scalar_one_or_none()
+    if not exam:
         raise HTTPException(status_code=404, detail="Exam not found")
 
+    # 2. Validate every student in one IN query
+    submitted_ids = {entry.student_id for entry in grades}
+    valid_result = await db.execute(
+        select(Student.id).where(Student.school_id == current_school.id, Student.id.in_(submitted_ids))
+    )
+    valid_ids = set(valid_result.scalars().all())
+
+    # 3. Bounds check in the same pass; the last mark submitted for a student wins
+    rows = {}
+    errors = []
     for entry in grades:
-        # Verify student belongs to school
-        stud_result = await db.execute(select(Student).where(Student.id == entry.student_id, Student.school_id == current_school.id))
-        if not stud_result.scalar_one_or_none():
-            continue # Skip invalid student IDs
-        
-        new_grade = GradeEntry(
-            exam_id=exam_id,
-            student_id=entry.student_id,
-            score=entry.score,
-            remarks=entry.remarks
-        )
-        db.add(new_grade)
-    
+        if entry.student_id not in valid_ids:
+            errors.append({"student_id": entry.student_id, "reason": "Student not found"})
+            continue
+        if enforce_max_score and not (0 <= entry.score <= exam.max_score):
+            errors.append({"student_id": entry.student_id, "reason": f"Score must be between 0 and {exam.max_score}"})
+            continue
+        rows[entry.student_id] = {
+            "exam_id": exam_id,
+            "student_id": entry.student_id,
+            "score": entry.score,
+            "remarks": entry.remarks
+        }
+
+    if not rows:
+        return {"message": "No valid grades", "accepted": 0, "rejected": len(errors), "updated": 0, "errors": errors}
+
+    existing_result = await db.execute(select(GradeEntry.student_id).where(GradeEntry.exam_id == exam_id))
+    updated = sum(1 for student_id in existing_result.scalars().all() if student_id in rows)
+
+    # 4. One bulk upsert on the (exam_id, student_id) key
+    stmt = dialect_insert(GradeEntry)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[GradeEntry.exam_id, GradeEntry.student_id],
+        set_={"score": stmt.excluded.score, "remarks": stmt.excluded.remarks}
+    )
+    await db.execute(stmt, list(rows.values()))
     await db.commit()
-    return {"message": f"Recorded {len(grades)} grades successfully"}
+    invalidate_exam_analytics(exam_id, exam.subject_id)
+    invalidate_rankings(current_school.id, exam.term)
+
+    return {
+        "message": f"Recorded {len(rows)} grades successfully",
+        "accepted": len(rows),
+        "rejected": len(errors),
+        "updated": updated,
+        "errors": errors
+    }
@@ -0,0 +1,173 @@
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from typing import Optional, Literal
+from datetime import date, datetime, timedelta
+import csv
+import io
+import json
+
+from database import async_session_maker
+from models import Student, CreditTransaction, Payment, Attendance, GradeEntry, Exam, Subject, School
+from auth import get_current_school
+
+router = APIRouter(prefix="/exports", tags=["Exports"])
+
+# Rows fetched per round trip from the server-side cursor
+EXPORT_BATCH_SIZE = 1000
+
+ExportFormat = Literal["csv", "ndjson"]
+
+def _day_start(day: date) -> datetime:
+    return datetime.combine(day, datetime.min.time())
+
+def _cell(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if hasattr(value, "value"):  # enums
+        return value.value
+    return value
+
+# Spreadsheets evaluate cells starting with these as formulas
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+def _csv_cell(value):
+    """_cell() for CSV output: text that a spreadsheet would run as a formula is quoted with a leading '"""
+    value = _cell(value)
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+async def _stream_rows(stmt, fmt: str):
+    """Yield the statement's rows as CSV or NDJSON, one cursor batch at a time.
+
+    The request's own session is closed before a streaming body starts, so the
+    export opens a dedicated session and keeps only one batch in memory.
+    """
+    async with async_session_maker() as session:
+        result = await session.stream(stmt.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        columns = list(result.keys())
+
+        if fmt == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(columns)
+            yield buffer.getvalue()
+
+        async for batch in result.partitions(EXPORT_BATCH_SIZE):
+            buffer = io.StringIO()
+            if fmt == "csv":
+                writer = csv.writer(buffer)
+                writer.writerows([_csv_cell(v) for v in row] for row in batch)
+            else:
+                for row in batch:
+                    buffer.write(json.dumps({k: _cell(v) for k, v in zip(columns, row)}))
+                    buffer.write("\n")
+            yield buffer.getvalue()
+
+def _export_response(stmt, fmt: str, name: str) -> StreamingResponse:
+    media_type = "text/csv" if fmt == "csv" else "application/x-ndjson"
+    filename = f"{name}-{datetime.utcnow().strftime('%Y%m%d')}.{fmt}"
+    return StreamingResponse(
+        _stream_rows(stmt, fmt),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+# --- Routes ---
+
+@router.get("/students")
+async def export_students(
+    fmt: ExportFormat = Query("csv", alias="format"),
+    grade: Optional[str] = None,
+    current_school: School = Depends(get_current_school)
+):
+    """Stream the school's student list"""
+    stmt = select(
+        Student.id, Student.first_name, Student.last_name, Student.grade,
+        Student.current_balance, Student.created_at
+    ).where(Student.school_id == current_school.id)
+    if grade:
+        stmt = stmt.where(Student.grade == grade)
+    return _export_response(stmt.order_by(Student.id), fmt, "students")
+
+@router.get("/credit-transactions")
+async def export_credit_transactions(
+    fmt: ExportFormat = Query("csv", alias="format"),
+    from_date: Optional[date] = Query(None, alias="from"),
+    to_date: Optional[date] = Query(None, alias="to"),
+    current_school: School = Depends(get_current_school)
+):
+    """Stream the school's fee ledger (fees and payments against student balances)"""
+    stmt = select(
+        CreditTransaction.id, CreditTransaction.student_id, Student.first_name, Student.last_name,
+        Student.grade, CreditTransaction.transaction_type, CreditTransaction.amount,
+        CreditTransaction.description, CreditTransaction.created_at
+    ).join(Student, CreditTransaction.student_id == Student.id).where(
+        CreditTransaction.school_id == current_school.id
+    )
+    if from_date:
+        stmt = stmt.where(CreditTransaction.created_at >= _day_start(from_date))
+    if to_date:
+        stmt = stmt.where(CreditTransaction.created_at < _day_start(to_date + timedelta(days=1)))
+    return _export_response(stmt.order_by(CreditTransaction.created_at, CreditTransaction.id), fmt, "credit-transactions")
+
+@router.get("/payments")
+async def export_payments(
+    fmt: ExportFormat = Query("csv", alias="format"),
+    from_date: Optional[date] = Query(None, alias="from"),
+    to_date: Optional[date] = Query(None, alias="to"),
+    current_school: School = Depends(get_current_school)
+):
+    """Stream the school's payments"""
+    stmt = select(
+        Payment.id, Payment.student_id, Student.first_name, Student.last_name, Student.grade,
+        Payment.invoice_id, Payment.amount, Payment.payment_method, Payment.reference, Payment.created_at
+    ).join(Student, Payment.student_id == Student.id).where(Payment.school_id == current_school.id)
+    if from_date:
+        stmt = stmt.where(Payment.created_at >= _day_start(from_date))
+    if to_date:
+        stmt = stmt.where(Payment.created_at < _day_start(to_date + timedelta(days=1)))
+    return _export_response(stmt.order_by(Payment.created_at, Payment.id), fmt, "payments")
+
+@router.get("/attendance")
+async def export_attendance(
+    fmt: ExportFormat = Query("csv", alias="format"),
+    from_date: Optional[date] = Query(None, alias="from"),
+    to_date: Optional[date] = Query(None, alias="to"),
+    grade: Optional[str] = None,
+    current_school: School = Depends(get_current_school)
+):
+    """Stream attendance marks, e.g. for a whole term"""
+    stmt = select(
+        Attendance.date, Attendance.student_id, Student.first_name, Student.last_name, Student.grade,
+        Attendance.status, Attendance.notes
+    ).join(Student, Attendance.student_id == Student.id).where(Attendance.school_id == current_school.id)
+    if from_date:
+        stmt = stmt.where(Attendance.date >= from_date)
+    if to_date:
+        stmt = stmt.where(Attendance.date <= to_date)
+    if grade:
+        stmt = stmt.where(Student.grade == grade)
+    return _export_response(stmt.order_by(Attendance.date, Attendance.student_id), fmt, "attendance")
+
+@router.get("/grades")
+async def export_grades(
+    fmt: ExportFormat = Query("csv", alias="format"),
+    exam_id: Optional[int] = None,
+    term: Optional[str] = None,
+    current_school: School = Depends(get_current_school)
+):
+    """Stream exam marks with exam and subject details"""
+    stmt = select(
+        Exam.id.label("exam_id"), Exam.title.label("exam_title"), Exam.term, Subject.name.label("subject"),
+        GradeEntry.student_id, Student.first_name, Student.last_name, Student.grade,
+        GradeEntry.score, Exam.max_score, GradeEntry.remarks
+    ).join(Exam, GradeEntry.exam_id == Exam.id).join(
+        Subject, Exam.subject_id == Subject.id
+    ).join(Student, GradeEntry.student_id == Student.id).where(Exam.school_id == current_school.id)
+    if exam_id:
+        stmt = stmt.where(Exam.id == exam_id)
+    if term:
+        stmt = stmt.where(Exam.term == term)
+    return _export_response(stmt.order_by(Exam.id, GradeEntry.student_id), fmt, "grades")
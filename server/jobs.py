@@ -0,0 +1,31 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+_tasks: Dict[str, asyncio.Task] = {}
+
+async def _run_periodically(name: str, interval_seconds: float, job: Callable[[], Awaitable]):
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            await job()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # A failed run must not kill the schedule; the next tick retries
+            logger.error(f"Periodic job {name} failed: {e}")
+
+def start_periodic(name: str, interval_seconds: float, job: Callable[[], Awaitable]) -> None:
+    """Run `job` every `interval_seconds` on the event loop (disabled when the interval is <= 0)"""
+    if interval_seconds <= 0 or name in _tasks:
+        return
+    _tasks[name] = asyncio.create_task(_run_periodically(name, interval_seconds, job), name=name)
+    logger.info(f"Scheduled {name} every {interval_seconds}s")
+
+async def stop_all() -> None:
+    for task in _tasks.values():
+        task.cancel()
+    await asyncio.gather(*_tasks.values(), return_exceptions=True)
+    _tasks.clear()
@@ -1,24 +1,31 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
+from typing import Optional
 from database import get_db
+from pagination import page_params, keyset, split_page
 from models import LeaveRequest, User
 from auth import get_current_school
 
 router = APIRouter(prefix="/leave-requests", tags=["Leave Management"])
 
+def leave_requests_page(school_id: int, cursor: Optional[str], limit: int):
+    """The school's leave requests with the staff member's name, newest first"""
+    query = select(LeaveRequest, User.full_name).join(User, LeaveRequest.user_id == User.id).where(
+        LeaveRequest.school_id == school_id
+    )
+    return keyset(query, [LeaveRequest.created_at, LeaveRequest.id], cursor, limit, descending=True)
+
 @router.get("/")
 async def get_leave_requests(
+    page: tuple = Depends(page_params),
     school = Depends(get_current_school),
     db: AsyncSession = Depends(get_db)
 ):
-    """Fetch leave requests for the current school"""
-    query = select(LeaveRequest, User.full_name).join(User, LeaveRequest.user_id == User.id).where(
-        LeaveRequest.school_id == school.id
-    ).order_by(LeaveRequest.created_at.desc())
-    
-    result = await db.execute(query)
-    rows = result.all()
+    """Fetch leave requests for the current school, newest first"""
+    cursor, limit = page
+    result = await db.execute(leave_requests_page(school.id, cursor, limit))
+    rows, next_cursor = split_page(result.all(), limit, lambda row: [row[0].created_at, row[0].id])
     
     data = []
     for leave, full_name in rows:
@@ -33,4 +40,4 @@ async def get_leave_requests(
             "created_at": leave.created_at.isoformat()
         })
     
-    return {"success": True, "data": data}
+    return {"success": True, "data": data, "next_cursor": next_cursor}
@@ -0,0 +1,189 @@
+"""
+Append-only fee ledger in integer cents.
+
+Every balance change is a CreditTransaction row posted through post_entries(),
+which also moves Student.balance_cents (and its float mirror) in the same
+transaction. Rows are never edited; a correction is a new reversing entry.
+
+Balances at a past moment come from the latest BalanceCheckpoint at or before
+that moment plus the ledger rows after it. checkpoint_job() writes a new
+checkpoint once a student has accumulated LEDGER_CHECKPOINT_EVERY entries, so
+the tail read per lookup stays bounded.
+"""
+import os
+import logging
+from datetime import datetime, timedelta
+from typing import Optional
+from sqlalchemy import select, insert, update, func, and_, or_, bindparam, BigInteger
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import async_session_maker
+from models import CreditTransaction, Student, BalanceCheckpoint
+from money import from_cents
+
+logger = logging.getLogger(__name__)
+
+LEDGER_CHECKPOINT_EVERY = int(os.getenv("LEDGER_CHECKPOINT_EVERY", "50"))
+# Entries younger than this are left for the next run, so a transaction that
+# committed late with a lower id can never end up behind a checkpoint
+LEDGER_CHECKPOINT_SETTLE_SECONDS = int(os.getenv("LEDGER_CHECKPOINT_SETTLE_SECONDS", "300"))
+CHECKPOINT_BATCH = 500
+POST_BATCH = 1000
+
+students_table = Student.__table__
+
+async def post_entries(db: AsyncSession, entries: list) -> None:
+    """Append ledger rows and move the affected student balances (caller commits).
+
+    Each entry is a dict with school_id, student_id, amount_cents,
+    transaction_type and description.
+    """
+    if not entries:
+        return
+    await db.execute(insert(CreditTransaction), [
+        {**entry, "amount": from_cents(entry["amount_cents"])} for entry in entries
+    ])
+
+    deltas = {}
+    for entry in entries:
+        deltas[entry["student_id"]] = deltas.get(entry["student_id"], 0) + entry["amount_cents"]
+    new_balance = students_table.c.balance_cents + bindparam("delta", type_=BigInteger)
+    await db.execute(
+        update(students_table)
+        .where(students_table.c.id == bindparam("sid"))
+        .values(balance_cents=new_balance, current_balance=new_balance / 100.0),
+        [{"sid": student_id, "delta": delta} for student_id, delta in deltas.items()]
+    )
+
+async def post_entry(
+    db: AsyncSession, school_id: int, student_id: int, amount_cents: int, transaction_type: str, description: str
+) -> None:
+    await post_entries(db, [{
+        "school_id": school_id,
+        "student_id": student_id,
+        "amount_cents": amount_cents,
+        "transaction_type": transaction_type,
+        "description": description,
+    }])
+
+async def post_to_students(
+    db: AsyncSession, school_id: int, student_ids: list, amount_cents: int, transaction_type: str, description: str
+) -> None:
+    """Post the same amount to many students with one multi-row insert and chunked IN updates (caller commits)"""
+    if not student_ids:
+        return
+    await db.execute(insert(CreditTransaction), [{
+        "school_id": school_id,
+        "student_id": student_id,
+        "amount_cents": amount_cents,
+        "amount": from_cents(amount_cents),
+        "transaction_type": transaction_type,
+        "description": description,
+    } for student_id in student_ids])
+
+    new_balance = students_table.c.balance_cents + amount_cents
+    for start in range(0, len(student_ids), POST_BATCH):
+        await db.execute(
+            update(students_table)
+            .where(students_table.c.id.in_(student_ids[start:start + POST_BATCH]))
+            .values(balance_cents=new_balance, current_balance=new_balance / 100.0)
+        )
+
+def _at_or_before(created_at, row_id, at: datetime, through_id: Optional[int]):
+    """(created_at, id) <= (at, through_id); through_id=None takes every row at `at`"""
+    if through_id is None:
+        return created_at <= at
+    return or_(created_at < at, and_(created_at == at, row_id <= through_id))
+
+def latest_checkpoint(student_id: int, at: datetime, through_id: Optional[int] = None):
+    """The student's latest checkpoint at or before position (at, through_id)"""
+    return select(BalanceCheckpoint).where(
+        BalanceCheckpoint.student_id == student_id,
+        _at_or_before(BalanceCheckpoint.as_of, BalanceCheckpoint.last_transaction_id, at, through_id)
+    ).order_by(BalanceCheckpoint.as_of.desc(), BalanceCheckpoint.last_transaction_id.desc()).limit(1)
+
+def ledger_tail(student_id: int, at: datetime, through_id: Optional[int] = None,
+                checkpoint: Optional[BalanceCheckpoint] = None):
+    """Sum of the student's entries up to (at, through_id), after `checkpoint` when given"""
+    tail = select(func.sum(CreditTransaction.amount_cents)).where(
+        CreditTransaction.student_id == student_id,
+        _at_or_before(CreditTransaction.created_at, CreditTransaction.id, at, through_id)
+    )
+    if checkpoint is not None:
+        tail = tail.where(
+            CreditTransaction.created_at >= checkpoint.as_of,
+            CreditTransaction.id > checkpoint.last_transaction_id
+        )
+    return tail
+
+async def balance_through(db: AsyncSession, student_id: int, at: datetime, through_id: Optional[int] = None) -> int:
+    """Student balance in cents over the ledger up to position (at, through_id) in (created_at, id) order.
+
+    through_id=None includes every entry created at `at`, through_id=0 none of them.
+    Reads the latest checkpoint at or before the position plus the entries after it.
+    """
+    checkpoint = (await db.execute(latest_checkpoint(student_id, at, through_id))).scalar_one_or_none()
+    opening = checkpoint.balance_cents if checkpoint else 0
+    return opening + ((await db.execute(ledger_tail(student_id, at, through_id, checkpoint))).scalar() or 0)
+
+async def balance_as_of(db: AsyncSession, student_id: int, as_of: Optional[datetime] = None) -> int:
+    """Student balance in cents including every entry created at or before `as_of`"""
+    if as_of is None:
+        return (await db.execute(select(Student.balance_cents).where(Student.id == student_id))).scalar() or 0
+    return await balance_through(db, student_id, as_of)
+
+async def checkpoint_students(db: AsyncSession, every: int = LEDGER_CHECKPOINT_EVERY) -> int:
+    """Checkpoint every student with at least `every` settled entries since their last checkpoint (caller commits)"""
+    latest = (
+        select(BalanceCheckpoint.student_id, func.max(BalanceCheckpoint.last_transaction_id).label("last_id"))
+        .group_by(BalanceCheckpoint.student_id)
+        .subquery()
+    )
+    cutoff = datetime.utcnow() - timedelta(seconds=LEDGER_CHECKPOINT_SETTLE_SECONDS)
+    due = (await db.execute(
+        select(
+            CreditTransaction.student_id,
+            CreditTransaction.school_id,
+            func.max(CreditTransaction.id),
+            func.sum(CreditTransaction.amount_cents),
+        )
+        .outerjoin(latest, latest.c.student_id == CreditTransaction.student_id)
+        .where(
+            CreditTransaction.id > func.coalesce(latest.c.last_id, 0),
+            CreditTransaction.created_at < cutoff
+        )
+        .group_by(CreditTransaction.student_id, CreditTransaction.school_id)
+        .having(func.count(CreditTransaction.id) >= every)
+    )).all()
+
+    for start in range(0, len(due), CHECKPOINT_BATCH):
+        batch = due[start:start + CHECKPOINT_BATCH]
+        student_ids = [row[0] for row in batch]
+        previous = dict((await db.execute(
+            select(BalanceCheckpoint.student_id, BalanceCheckpoint.balance_cents)
+            .join(latest, and_(
+                latest.c.student_id == BalanceCheckpoint.student_id,
+                latest.c.last_id == BalanceCheckpoint.last_transaction_id
+            ))
+            .where(BalanceCheckpoint.student_id.in_(student_ids))
+        )).all())
+        stamps = dict((await db.execute(
+            select(CreditTransaction.id, CreditTransaction.created_at)
+            .where(CreditTransaction.id.in_([row[2] for row in batch]))
+        )).all())
+        await db.execute(insert(BalanceCheckpoint), [{
+            "school_id": school_id,
+            "student_id": student_id,
+            "last_transaction_id": last_id,
+            "as_of": stamps[last_id],
+            "balance_cents": previous.get(student_id, 0) + (tail or 0),
+        } for student_id, school_id, last_id, tail in batch])
+    return len(due)
+
+async def checkpoint_job() -> None:
+    """Periodic job entry point"""
+    async with async_session_maker() as db:
+        written = await checkpoint_students(db)
+        await db.commit()
+    if written:
+        logger.info(f"Wrote {written} ledger balance checkpoints")
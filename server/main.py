@@ -5,16 +5,24 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, insert
 from datetime import timedelta
 import logging
+import os
 
 from database import get_db, init_db
-from models import User, School, school_users, UserRole
+from models import User, School, school_users, UserRole, SchoolRollup
+from counters import reconcile_all_counters, reconcile_school
+from rollups import get_platform_rollup, refresh_rollups_job
+from ledger import checkpoint_job
+from money import from_cents
+import jobs
 from auth import (
-    get_password_hash, 
-    verify_password, 
+    hash_password,
+    verify_password_and_rehash,
     create_access_token, 
     get_current_user,
     get_current_school,
     get_current_super_admin,
+    invalidate_principals,
+    login_membership,
     ACCESS_TOKEN_EXPIRE_MINUTES,
     SECRET_KEY,
     ALGORITHM
@@ -26,16 +34,33 @@ from payments import router as payments_router
 from assets import router as assets_router
 from users import router as users_router
 from exams import router as exams_router
-from timetables import router as timetables_router
+from timetables import router as timetables_router, shutdown_generator_pool
 from attendance import router as attendance_router
 from platform_admin import router as platform_router
 from dashboard import router as dashboard_router
 from leave_requests import router as leave_router
 from notifications import router as notifications_router
+from exports import router as exports_router
+from reconciliation import router as reconciliation_router
+from receivables import router as receivables_router, overdue_sweep_job
+from collection_rollups import router as collections_router
+from exam_analytics import router as exam_analytics_router
+from rankings import router as rankings_router
+from attendance_analytics import router as attendance_analytics_router
+from report_cards import router as report_cards_router, fail_interrupted_jobs, shutdown_render_pool
 
 # Setup logging
 logger = logging.getLogger(__name__)
 
+# Periodic drift correction for the dashboard counters (0 disables)
+COUNTERS_RECONCILE_SECONDS = float(os.getenv("COUNTERS_RECONCILE_SECONDS", "3600"))
+# How often the super-admin platform rollups are rebuilt (0 disables)
+ROLLUP_REFRESH_SECONDS = float(os.getenv("ROLLUP_REFRESH_SECONDS", "300"))
+# How often students with a long ledger tail get a new balance checkpoint (0 disables)
+LEDGER_CHECKPOINT_SECONDS = float(os.getenv("LEDGER_CHECKPOINT_SECONDS", "3600"))
+# How often past-due invoices are flipped to overdue (0 disables)
+OVERDUE_SWEEP_SECONDS = float(os.getenv("OVERDUE_SWEEP_SECONDS", "3600"))
+
 app = FastAPI(title="EduKE API", version="1.0.0")
 
 app.include_router(students_router)
@@ -49,6 +74,14 @@ app.include_router(platform_router)
 app.include_router(dashboard_router)
 app.include_router(leave_router)
 app.include_router(notifications_router)
+app.include_router(exports_router)
+app.include_router(reconciliation_router)
+app.include_router(receivables_router)
+app.include_router(collections_router)
+app.include_router(exam_analytics_router)
+app.include_router(rankings_router)
+app.include_router(attendance_analytics_router)
+app.include_router(report_cards_router)
 
 # CORS configuration - Borrowed from SmartBiz main.py
 app.add_middleware(
@@ -80,8 +113,21 @@ async def generic_exception_handler(request: Request, exc: Exception):
 async def startup_event():
     """Initialize database on startup - SmartBiz pattern"""
     await init_db()
+    jobs.start_periodic("reconcile_counters", COUNTERS_RECONCILE_SECONDS, reconcile_all_counters)
+    jobs.start_periodic("refresh_rollups", ROLLUP_REFRESH_SECONDS, refresh_rollups_job)
+    jobs.start_periodic("ledger_checkpoints", LEDGER_CHECKPOINT_SECONDS, checkpoint_job)
+    jobs.start_periodic("overdue_sweep", OVERDUE_SWEEP_SECONDS, overdue_sweep_job)
+    interrupted = await fail_interrupted_jobs()
+    if interrupted:
+        logger.warning(f"Marked {interrupted} interrupted report card job(s) as failed")
     logger.info("EduKE Backend Started Successfully")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    await jobs.stop_all()
+    shutdown_render_pool()
+    shutdown_generator_pool()
+
 # ============= SCHEMAS (Aligned with Frontend) =============
 class SchoolRegister(BaseModel):
     schoolName: str
@@ -122,7 +168,7 @@ async def register_school(data: SchoolRegister, db: AsyncSession = Depends(get_d
     await db.flush() # Get school ID
 
     # 3. Create the Admin User
-    hashed_password = get_password_hash(data.password)
+    hashed_password = await hash_password(data.password)
     new_user = User(
         username=data.email, # Using email as username for simplicity
         email=data.email,
@@ -141,8 +187,10 @@ async def register_school(data: SchoolRegister, db: AsyncSession = Depends(get_d
             is_active=True
         )
     )
+    await reconcile_school(db, new_school.id)
     
     await db.commit()
+    invalidate_principals(username=new_user.username)
     return {"message": f"School {data.schoolName} registered successfully", "school_id": new_school.id}
 
 @app.post("/auth/login")
@@ -154,15 +202,19 @@ async def login(data: LoginRequest, db: AsyncSession = Depends(get_db)):
     result = await db.execute(select(User).where(User.email == data.email))
     user = result.scalar_one_or_none()
 
-    if not user or not verify_password(data.password, user.hashed_password):
+    verified, new_hash = False, None
+    if user:
+        verified, new_hash = await verify_password_and_rehash(data.password, user.hashed_password)
+    if not verified:
         raise HTTPException(status_code=401, detail="Incorrect email or password")
 
+    if new_hash:
+        # Cost parameters changed since this hash was created - upgrade it transparently
+        user.hashed_password = new_hash
+        await db.commit()
+
     # 2. Get user's school assignment (SmartBiz Multi-tenancy)
-    membership_query = select(school_users.c.school_id, school_users.c.role).where(
-        school_users.c.user_id == user.id,
-        school_users.c.is_active == True
-    )
-    membership_result = await db.execute(membership_query)
+    membership_result = await db.execute(login_membership(user.id))
     membership = membership_result.first()
 
     if not membership and not user.is_super_admin:
@@ -252,17 +304,20 @@ async def list_schools_compatibility(
     db: AsyncSession = Depends(get_db), 
     _ = Depends(get_current_super_admin)
 ):
-    """Compatibility for Dashboard.tsx which calls /api/schools"""
-    result = await db.execute(select(School))
-    schools = result.scalars().all()
+    """Compatibility for Dashboard.tsx which calls /api/schools (figures come from the rollup snapshot)"""
+    platform = await get_platform_rollup(db)
+    result = await db.execute(
+        select(School, SchoolRollup).outerjoin(SchoolRollup, SchoolRollup.school_id == School.id)
+    )
     return [{
         "id": str(s.id),
         "name": s.name,
-        "students": 0,
-        "staff": 0,
-        "revenue": "0",
-        "status": s.status
-    } for s in schools]
+        "students": r.students if r else 0,
+        "staff": r.staff if r else 0,
+        "revenue": str(from_cents(r.revenue_cents)) if r else "0",
+        "status": s.status,
+        "refreshed_at": r.refreshed_at if r else platform.refreshed_at
+    } for s, r in result.all()]
 
 @app.get("/notifications")
 async def get_notifications_stub():
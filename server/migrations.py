@@ -0,0 +1,166 @@
+"""
+Lightweight, idempotent data migrations run by init_db.
+
+create_all only creates missing tables and ensure_indexes only adds missing
+indexes; anything that has to reshape existing rows first (deduplicating before
+a unique index, backfilling a new column) lives here. Each step runs once and is
+recorded in the schema_migrations table.
+"""
+import logging
+from datetime import datetime
+from sqlalchemy import text, inspect
+
+from timetable_index import DAYS, normalize_day, parse_time
+
+logger = logging.getLogger(__name__)
+
+def dedupe_attendance(sync_conn):
+    """Keep only the latest mark per (student_id, date) so the unique key can be built"""
+    sync_conn.execute(text(
+        "DELETE FROM attendance WHERE id NOT IN "
+        "(SELECT MAX(id) FROM attendance GROUP BY student_id, date)"
+    ))
+    # Superseded by uq_attendance_student_date
+    sync_conn.execute(text("DROP INDEX IF EXISTS ix_attendance_student_date"))
+
+def dedupe_grade_entries(sync_conn):
+    """Keep only the latest mark per (exam_id, student_id) so the unique key can be built"""
+    sync_conn.execute(text(
+        "DELETE FROM grade_entries WHERE id NOT IN "
+        "(SELECT MAX(id) FROM grade_entries GROUP BY exam_id, student_id)"
+    ))
+    # Superseded by uq_grade_entries_exam_student
+    sync_conn.execute(text("DROP INDEX IF EXISTS ix_grade_entries_exam_student"))
+
+def replace_keyset_indexes(sync_conn):
+    """Drop indexes superseded by the (parent, created_at, id) keyset-pagination indexes"""
+    for name in (
+        "ix_assets_school_id",
+        "ix_asset_movements_asset_created",
+        "ix_credit_transactions_student_created",
+        "ix_leave_requests_school_created",
+    ):
+        sync_conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+
+def _add_column(sync_conn, table: str, column: str, ddl: str):
+    """ALTER TABLE ... ADD COLUMN unless create_all already built it"""
+    existing = {c["name"] for c in inspect(sync_conn).get_columns(table)}
+    if column not in existing:
+        sync_conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+
+def _cents(column: str) -> str:
+    return f"CAST(ROUND(COALESCE({column}, 0) * 100) AS BIGINT)"
+
+def ledger_cents(sync_conn):
+    """Add the integer-cent columns and backfill them from the float amounts.
+
+    Student balances are rebuilt from the ledger itself rather than copied from
+    current_balance, which may have drifted.
+    """
+    for table, column in (
+        ("credit_transactions", "amount_cents"),
+        ("payments", "amount_cents"),
+        ("fee_invoices", "total_cents"),
+        ("fee_invoices", "paid_cents"),
+        ("students", "balance_cents"),
+    ):
+        _add_column(sync_conn, table, column, "BIGINT NOT NULL DEFAULT 0")
+
+    sync_conn.execute(text(f"UPDATE credit_transactions SET amount_cents = {_cents('amount')}"))
+    sync_conn.execute(text(f"UPDATE payments SET amount_cents = {_cents('amount')}"))
+    sync_conn.execute(text(
+        f"UPDATE fee_invoices SET total_cents = {_cents('total_amount')}, paid_cents = {_cents('paid_amount')}"
+    ))
+    sync_conn.execute(text(
+        "UPDATE students SET balance_cents = COALESCE((SELECT SUM(amount_cents) FROM credit_transactions "
+        "WHERE credit_transactions.student_id = students.id), 0)"
+    ))
+    sync_conn.execute(text("UPDATE students SET current_balance = balance_cents / 100.0"))
+
+def fee_invoice_term(sync_conn):
+    """Column needed by uq_fee_invoices_student_title_term (existing invoices keep a NULL term)"""
+    _add_column(sync_conn, "fee_invoices", "term", "VARCHAR(20)")
+
+def dedupe_payment_references(sync_conn):
+    """Make repeated references unique so uq_payments_school_reference can be built.
+
+    Payments are money and are never deleted here; later duplicates keep their
+    row and get their id appended to the reference.
+    """
+    sync_conn.execute(text("UPDATE payments SET reference = NULL WHERE TRIM(reference) = ''"))
+    sync_conn.execute(text(
+        "UPDATE payments SET reference = SUBSTR(reference, 1, 80) || '#' || CAST(id AS VARCHAR(20)) "
+        "WHERE reference IS NOT NULL AND id NOT IN "
+        "(SELECT MIN(id) FROM payments WHERE reference IS NOT NULL GROUP BY school_id, reference)"
+    ))
+
+def student_payer_details(sync_conn):
+    """Columns used to match bank / M-Pesa statement lines to students"""
+    _add_column(sync_conn, "students", "admission_number", "VARCHAR(50)")
+    _add_column(sync_conn, "students", "phone", "VARCHAR(20)")
+
+def replace_invoice_status_index(sync_conn):
+    """Superseded by ix_fee_invoices_school_status_due (same leading columns)"""
+    sync_conn.execute(text("DROP INDEX IF EXISTS ix_fee_invoices_school_status"))
+
+def timetable_ordinals(sync_conn):
+    """Day ordinal / minute columns for timetable slots, backfilled from the HH:MM strings"""
+    _add_column(sync_conn, "timetable_slots", "day_index", "INTEGER")
+    _add_column(sync_conn, "timetable_slots", "start_minute", "INTEGER")
+    _add_column(sync_conn, "timetable_slots", "end_minute", "INTEGER")
+    _add_column(sync_conn, "school_counters", "timetable_version", "INTEGER NOT NULL DEFAULT 0")
+    _add_column(sync_conn, "school_counters", "timetable_updated_at", "TIMESTAMP")
+
+    updates = []
+    for slot_id, day, start, end in sync_conn.execute(text(
+        "SELECT id, day_of_week, start_time, end_time FROM timetable_slots"
+    )):
+        try:
+            updates.append({
+                "id": slot_id, "day_index": DAYS.index(normalize_day(day)),
+                "start_minute": parse_time(start), "end_minute": parse_time(end),
+            })
+        except ValueError:
+            logger.warning(f"Timetable slot {slot_id} has an unreadable day/time; left without ordinals")
+    if updates:
+        sync_conn.execute(text(
+            "UPDATE timetable_slots SET day_index = :day_index, start_minute = :start_minute, "
+            "end_minute = :end_minute WHERE id = :id"
+        ), updates)
+    # Superseded by ix_timetable_slots_school_day_start
+    sync_conn.execute(text("DROP INDEX IF EXISTS ix_timetable_slots_school_day"))
+
+def replace_timetable_room_index(sync_conn):
+    """Superseded by ix_timetable_slots_school_room_key (lower(trim(room)))"""
+    sync_conn.execute(text("DROP INDEX IF EXISTS ix_timetable_slots_school_room"))
+
+# Ordered list of (name, step); never rename or reorder released steps
+MIGRATIONS = [
+    ("0001_dedupe_attendance", dedupe_attendance),
+    ("0002_dedupe_grade_entries", dedupe_grade_entries),
+    ("0003_replace_keyset_indexes", replace_keyset_indexes),
+    ("0004_ledger_cents", ledger_cents),
+    ("0005_fee_invoice_term", fee_invoice_term),
+    ("0006_dedupe_payment_references", dedupe_payment_references),
+    ("0007_student_payer_details", student_payer_details),
+    ("0008_replace_invoice_status_index", replace_invoice_status_index),
+    ("0009_timetable_ordinals", timetable_ordinals),
+    ("0010_replace_timetable_room_index", replace_timetable_room_index),
+]
+
+def run_migrations(sync_conn) -> None:
+    sync_conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        "name VARCHAR(100) PRIMARY KEY, applied_at TIMESTAMP NOT NULL)"
+    ))
+    applied = {row[0] for row in sync_conn.execute(text("SELECT name FROM schema_migrations"))}
+
+    for name, step in MIGRATIONS:
+        if name in applied:
+            continue
+        step(sync_conn)
+        sync_conn.execute(
+            text("INSERT INTO schema_migrations (name, applied_at) VALUES (:name, :applied_at)"),
+            {"name": name, "applied_at": datetime.utcnow()}
+        )
+        logger.info(f"Applied migration {name}")
@@ -1,6 +1,6 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Boolean, Text, Enum as SQLEnum, Table, UniqueConstraint, Index, Date, JSON
+from sqlalchemy import func, Column, Integer, BigInteger, String, Float, DateTime, ForeignKey, Boolean, Text, Enum as SQLEnum, Table, UniqueConstraint, Index, Date, JSON, LargeBinary, event
 from sqlalchemy.orm import relationship, backref
-from datetime import datetime
+from datetime import datetime, timedelta
 import enum
 from database import Base
 
@@ -38,7 +38,9 @@ school_users = Table(
     Column('role', SQLEnum(UserRole), default=UserRole.STUDENT, nullable=False),
     Column('is_active', Boolean, default=True),
     Column('joined_at', DateTime, default=datetime.utcnow),
-    UniqueConstraint('school_id', 'user_id', name='uq_school_user')
+    UniqueConstraint('school_id', 'user_id', name='uq_school_user'),
+    Index('ix_school_users_user_active', 'user_id', 'is_active'),
+    Index('ix_school_users_school_role', 'school_id', 'role')
 )
 
 # ==================== CORE MODELS ====================
@@ -92,6 +94,12 @@ class User(Base):
 class Student(Base):
     """Student specific data linked to School tenant"""
     __tablename__ = "students"
+    __table_args__ = (
+        Index("ix_students_school_grade", "school_id", "grade"),
+        Index("ix_students_school_page", "school_id", "id"),
+        Index("uq_students_school_admission", "school_id", "admission_number", unique=True),
+        Index("ix_students_school_phone", "school_id", "phone"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     school_id = Column(Integer, ForeignKey("schools.id", ondelete='CASCADE'), nullable=False)
@@ -100,7 +108,10 @@ class Student(Base):
     first_name = Column(String(100), nullable=False)
     last_name = Column(String(100), nullable=False)
     grade = Column(String(20), nullable=False)
-    current_balance = Column(Float, default=0.0) # Borrowed from SmartBiz Customer logic
+    admission_number = Column(String(50))
+    phone = Column(String(20)) # fee payer's number, stored as 2547XXXXXXXX
+    current_balance = Column(Float, default=0.0) # Borrowed from SmartBiz Customer logic; mirror of balance_cents
+    balance_cents = Column(BigInteger, default=0, nullable=False) # running sum of the ledger
     
     created_at = Column(DateTime, default=datetime.utcnow)
 
@@ -110,11 +121,59 @@ class Student(Base):
     payments = relationship("Payment", back_populates="student")
     credit_transactions = relationship("CreditTransaction", back_populates="student")
 
+class SchoolCounters(Base):
+    """Per-school totals maintained in the same transaction as the writes that change them.
+
+    Served directly by /dashboard/stats; counters.reconcile_all_counters() rebuilds
+    them periodically to correct any drift.
+    """
+    __tablename__ = "school_counters"
+
+    school_id = Column(Integer, ForeignKey("schools.id", ondelete='CASCADE'), primary_key=True)
+    students = Column(Integer, default=0, nullable=False)
+    staff = Column(Integer, default=0, nullable=False) # TEACHER + STAFF memberships
+    subjects = Column(Integer, default=0, nullable=False)
+    exams = Column(Integer, default=0, nullable=False)
+    outstanding_fees_cents = Column(BigInteger, default=0, nullable=False) # unpaid invoice balances
+    # Bumped by every timetable write; drives the ETag / Last-Modified of the timetable grids
+    timetable_version = Column(Integer, default=0, nullable=False)
+    timetable_updated_at = Column(DateTime)
+    reconciled_at = Column(DateTime)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class SchoolRollup(Base):
+    """Per-school platform metrics snapshot, rebuilt on a schedule by rollups.refresh_rollups()"""
+    __tablename__ = "school_rollups"
+
+    school_id = Column(Integer, ForeignKey("schools.id", ondelete='CASCADE'), primary_key=True)
+    students = Column(Integer, default=0, nullable=False)
+    staff = Column(Integer, default=0, nullable=False) # every role except student/parent
+    revenue_cents = Column(BigInteger, default=0, nullable=False) # all payments received
+    refreshed_at = Column(DateTime, nullable=False)
+
+class PlatformRollup(Base):
+    """Single-row platform-wide totals computed alongside SchoolRollup"""
+    __tablename__ = "platform_rollups"
+
+    id = Column(Integer, primary_key=True) # always 1
+    total_schools = Column(Integer, default=0, nullable=False)
+    active_schools = Column(Integer, default=0, nullable=False)
+    trial_schools = Column(Integer, default=0, nullable=False)
+    blocked_schools = Column(Integer, default=0, nullable=False)
+    total_users = Column(Integer, default=0, nullable=False)
+    total_students = Column(Integer, default=0, nullable=False)
+    total_staff = Column(Integer, default=0, nullable=False)
+    revenue_cents = Column(BigInteger, default=0, nullable=False)
+    refreshed_at = Column(DateTime, nullable=False)
+
 # ==================== ASSET MANAGEMENT (Borrowed from SmartBiz) ====================
 
 class Asset(Base):
     """School assets like textbooks/equipment (Adapted from SmartBiz Product)"""
     __tablename__ = "assets"
+    __table_args__ = (
+        Index("ix_assets_school_page", "school_id", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     school_id = Column(Integer, ForeignKey("schools.id"), nullable=False)
@@ -130,6 +189,9 @@ class Asset(Base):
 class AssetMovement(Base):
     """Tracking assignment of assets (Adapted from SmartBiz StockMovement)"""
     __tablename__ = "asset_movements"
+    __table_args__ = (
+        Index("ix_asset_movements_asset_page", "asset_id", "created_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     asset_id = Column(Integer, ForeignKey("assets.id"))
@@ -148,15 +210,24 @@ class AssetMovement(Base):
 class FeeInvoice(Base):
     """Fee Invoice for a student (Equivalent to SmartBiz Sale/Invoice)"""
     __tablename__ = "fee_invoices"
+    __table_args__ = (
+        Index("ix_fee_invoices_school_status_due", "school_id", "status", "due_date"),
+        Index("ix_fee_invoices_student_id", "student_id"),
+        # Term invoicing runs are idempotent per student; invoices without a term are not constrained
+        Index("uq_fee_invoices_student_title_term", "student_id", "title", "term", unique=True),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     school_id = Column(Integer, ForeignKey("schools.id"), nullable=False)
     student_id = Column(Integer, ForeignKey("students.id"), nullable=False)
     
     title = Column(String(100), nullable=False) # e.g., "Term 1 Tuition"
+    term = Column(String(20)) # e.g., "2026-T1"
     description = Column(Text)
-    total_amount = Column(Float, nullable=False)
-    paid_amount = Column(Float, default=0.0)
+    total_amount = Column(Float, nullable=False) # mirror of total_cents for display
+    paid_amount = Column(Float, default=0.0) # mirror of paid_cents for display
+    total_cents = Column(BigInteger, default=0, nullable=False)
+    paid_cents = Column(BigInteger, default=0, nullable=False)
     due_date = Column(DateTime)
     status = Column(String(20), default="unpaid") # unpaid, partial, paid, voided, overdue
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -169,13 +240,20 @@ class FeeInvoice(Base):
 class Payment(Base):
     """Payment record (Equivalent to SmartBiz Payment)"""
     __tablename__ = "payments"
+    __table_args__ = (
+        Index("ix_payments_school_created", "school_id", "created_at"),
+        Index("ix_payments_student_id", "student_id"),
+        # Idempotency key for payment callbacks; payments without a reference are not constrained
+        Index("uq_payments_school_reference", "school_id", "reference", unique=True),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     school_id = Column(Integer, ForeignKey("schools.id"), nullable=False)
     student_id = Column(Integer, ForeignKey("students.id"), nullable=False)
     invoice_id = Column(Integer, ForeignKey("fee_invoices.id"), nullable=True)
     
-    amount = Column(Float, nullable=False)
+    amount = Column(Float, nullable=False) # mirror of amount_cents for display
+    amount_cents = Column(BigInteger, default=0, nullable=False)
     payment_method = Column(String(50)) # MPESA, Cash, Bank Transfer
     reference = Column(String(100)) # M-Pesa Code / Receipt No
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -185,14 +263,24 @@ class Payment(Base):
     invoice = relationship("FeeInvoice", back_populates="payments")
 
 class CreditTransaction(Base):
-    """Tracking student balance changes (Equivalent to SmartBiz CreditTransaction)"""
+    """Tracking student balance changes (Equivalent to SmartBiz CreditTransaction).
+
+    This is the fee ledger and the source of truth for balances: rows are only
+    ever inserted (see ledger.post_entries), corrections are posted as new
+    reversing entries.
+    """
     __tablename__ = "credit_transactions"
+    __table_args__ = (
+        Index("ix_credit_transactions_student_page", "student_id", "created_at", "id"),
+        Index("ix_credit_transactions_school_created", "school_id", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     school_id = Column(Integer, ForeignKey("schools.id"), nullable=False)
     student_id = Column(Integer, ForeignKey("students.id"), nullable=False)
     
-    amount = Column(Float, nullable=False) # Positive for fees (debt), Negative for payments
+    amount = Column(Float, nullable=False) # mirror of amount_cents for display
+    amount_cents = Column(BigInteger, default=0, nullable=False) # Positive for fees (debt), Negative for payments
     transaction_type = Column(String(20)) # "FEE", "PAYMENT"
     description = Column(Text)
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -200,11 +288,49 @@ class CreditTransaction(Base):
     # Relationships
     student = relationship("Student", back_populates="credit_transactions")
 
+@event.listens_for(CreditTransaction, "before_update")
+@event.listens_for(CreditTransaction, "before_delete")
+def _ledger_is_append_only(mapper, connection, target):
+    raise ValueError("credit_transactions is append-only; post a reversing entry instead")
+
+class BalanceCheckpoint(Base):
+    """A student's ledger balance up to and including one transaction.
+
+    balance as of T = latest checkpoint at or before T + the ledger rows after it,
+    so lookups read a bounded tail instead of the student's whole history.
+    """
+    __tablename__ = "balance_checkpoints"
+    __table_args__ = (
+        Index("ix_balance_checkpoints_student_as_of", "student_id", "as_of", "last_transaction_id"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    school_id = Column(Integer, ForeignKey("schools.id", ondelete='CASCADE'), nullable=False)
+    student_id = Column(Integer, ForeignKey("students.id", ondelete='CASCADE'), nullable=False)
+    last_transaction_id = Column(Integer, nullable=False)
+    as_of = Column(DateTime, nullable=False) # created_at of last_transaction_id
+    balance_cents = Column(BigInteger, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class PaymentDailyRollup(Base):
+    """Payments received per school, day, method and grade, bumped in the same transaction as the payment"""
+    __tablename__ = "payment_daily_rollups"
+
+    school_id = Column(Integer, ForeignKey("schools.id", ondelete='CASCADE'), primary_key=True)
+    day = Column(Date, primary_key=True)
+    payment_method = Column(String(50), primary_key=True)
+    grade = Column(String(20), primary_key=True)
+    payments = Column(Integer, default=0, nullable=False)
+    amount_cents = Column(BigInteger, default=0, nullable=False)
+
 # ==================== ACADEMIC SYSTEM (Exams, Timetables, Attendance) ====================
 
 class Subject(Base):
     """Academic subjects (e.g., Mathematics, English)"""
     __tablename__ = "subjects"
+    __table_args__ = (
+        Index("ix_subjects_school_id", "school_id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     school_id = Column(Integer, ForeignKey("schools.id"), nullable=False)
@@ -219,6 +345,10 @@ class Subject(Base):
 class Exam(Base):
     """Exams and Assessments"""
     __tablename__ = "exams"
+    __table_args__ = (
+        Index("ix_exams_school_term", "school_id", "term"),
+        Index("ix_exams_subject_id", "subject_id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     school_id = Column(Integer, ForeignKey("schools.id"), nullable=False)
@@ -238,6 +368,11 @@ class Exam(Base):
 class GradeEntry(Base):
     """Individual student marks for an exam"""
     __tablename__ = "grade_entries"
+    __table_args__ = (
+        # One mark per student per exam; record_grades upserts on this key
+        Index("uq_grade_entries_exam_student", "exam_id", "student_id", unique=True),
+        Index("ix_grade_entries_student_id", "student_id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     exam_id = Column(Integer, ForeignKey("exams.id"), nullable=False)
@@ -254,6 +389,11 @@ class GradeEntry(Base):
 class TimetableSlot(Base):
     """Weekly schedule slots"""
     __tablename__ = "timetable_slots"
+    __table_args__ = (
+        Index("ix_timetable_slots_school_grade", "school_id", "grade_level"),
+        Index("ix_timetable_slots_school_day_start", "school_id", "day_index", "start_minute"),
+        Index("ix_timetable_slots_teacher_id", "teacher_id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     school_id = Column(Integer, ForeignKey("schools.id"), nullable=False)
@@ -263,6 +403,10 @@ class TimetableSlot(Base):
     day_of_week = Column(String(10)) # Monday, Tuesday, etc.
     start_time = Column(String(5)) # HH:MM (24h)
     end_time = Column(String(5))   # HH:MM (24h)
+    # Source of truth for ordering and range math; the strings above are display copies
+    day_index = Column(Integer) # 0 = Monday ... 6 = Sunday
+    start_minute = Column(Integer) # minutes since midnight
+    end_minute = Column(Integer)
     room = Column(String(50))
     grade_level = Column(String(20)) # e.g., "Grade 1"
 
@@ -271,15 +415,23 @@ class TimetableSlot(Base):
     subject = relationship("Subject", back_populates="timetable_slots")
     teacher = relationship("User")
 
+# Rooms compare case- and whitespace-insensitively (see timetable_index.resource_keys)
+Index("ix_timetable_slots_school_room_key", TimetableSlot.school_id, func.lower(func.trim(TimetableSlot.room)))
+
 class Attendance(Base):
     """Daily or lesson-based attendance"""
     __tablename__ = "attendance"
+    __table_args__ = (
+        # One mark per student per day; record_attendance upserts on this key
+        Index("uq_attendance_student_date", "student_id", "date", unique=True),
+        Index("ix_attendance_school_date", "school_id", "date"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     school_id = Column(Integer, ForeignKey("schools.id"), nullable=False)
     student_id = Column(Integer, ForeignKey("students.id"), nullable=False)
     
-    date = Column(Date, default=datetime.utcnow().date())
+    date = Column(Date, default=lambda: datetime.utcnow().date())
     status = Column(String(20)) # PRESENT, ABSENT, LATE, EXCUSED
     notes = Column(Text)
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -287,9 +439,65 @@ class Attendance(Base):
     # Relationships
     student = relationship("Student")
 
+class AcademicTerm(Base):
+    """A school's term calendar; `name` matches the term strings used on exams and invoices"""
+    __tablename__ = "academic_terms"
+    __table_args__ = (
+        Index("uq_academic_terms_school_name", "school_id", "name", unique=True),
+        Index("ix_academic_terms_school_start", "school_id", "start_date"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    school_id = Column(Integer, ForeignKey("schools.id", ondelete='CASCADE'), nullable=False)
+    name = Column(String(20), nullable=False) # e.g., "Term 1"
+    start_date = Column(Date, nullable=False)
+    end_date = Column(Date, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class AttendanceTermBitmap(Base):
+    """One student's attendance for a term: one status byte per calendar day from the term's start_date.
+
+    Kept in step with the attendance table by record_attendance (same transaction);
+    attendance_store.rebuild_term_bitmaps() recomputes it from the rows.
+    """
+    __tablename__ = "attendance_term_bitmaps"
+    __table_args__ = (
+        Index("ix_attendance_term_bitmaps_school_term", "school_id", "term_id"),
+    )
+
+    term_id = Column(Integer, ForeignKey("academic_terms.id", ondelete='CASCADE'), primary_key=True)
+    student_id = Column(Integer, ForeignKey("students.id", ondelete='CASCADE'), primary_key=True)
+    school_id = Column(Integer, ForeignKey("schools.id", ondelete='CASCADE'), nullable=False)
+    days = Column(LargeBinary, nullable=False) # attendance_store.STATUS_CODES per day; 0 = no mark
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class ReportCardJob(Base):
+    """A background report-card run for a term, with progress and the resulting archive"""
+    __tablename__ = "report_card_jobs"
+    __table_args__ = (
+        Index("ix_report_card_jobs_school_created", "school_id", "created_at"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    school_id = Column(Integer, ForeignKey("schools.id", ondelete='CASCADE'), nullable=False)
+    term = Column(String(20), nullable=False)
+    grade = Column(String(20)) # None = whole school
+    attendance_from = Column(Date)
+    attendance_to = Column(Date)
+    status = Column(String(20), default="queued", nullable=False) # queued, running, completed, failed
+    total = Column(Integer, default=0, nullable=False)
+    completed = Column(Integer, default=0, nullable=False)
+    archive_path = Column(String(500))
+    error = Column(Text)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime)
+
 class LeaveRequest(Base):
     """Staff leave requests (SmartBiz pattern)"""
     __tablename__ = "leave_requests"
+    __table_args__ = (
+        Index("ix_leave_requests_school_page", "school_id", "created_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     school_id = Column(Integer, ForeignKey("schools.id"), nullable=False)
@@ -310,6 +518,9 @@ class LeaveRequest(Base):
 class AuditLog(Base):
     """Activity Log for school operations (Borrowed from SmartBiz)"""
     __tablename__ = "audit_logs"
+    __table_args__ = (
+        Index("ix_audit_logs_school_created", "school_id", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     school_id = Column(Integer, ForeignKey("schools.id"), nullable=False)
@@ -329,6 +540,9 @@ class AuditLog(Base):
 class AdminActivityLog(Base):
     """Platform-wide audit logs for Super Admin actions (SmartBiz pattern)"""
     __tablename__ = "admin_activity_logs"
+    __table_args__ = (
+        Index("ix_admin_activity_logs_created_at", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     admin_id = Column(Integer, ForeignKey("users.id"), nullable=False)
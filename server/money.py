@@ -0,0 +1,11 @@
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Optional
+
+def to_cents(amount: Optional[float]) -> int:
+    """Convert a shilling amount to integer cents, rounding half-up exactly (no float drift)"""
+    if amount is None:
+        return 0
+    return int((Decimal(str(amount)) * 100).quantize(Decimal("1"), rounding=ROUND_HALF_UP))
+
+def from_cents(cents: Optional[int]) -> float:
+    return (cents or 0) / 100
@@ -0,0 +1,79 @@
+import json
+import base64
+from datetime import date, datetime
+from typing import Generic, List, Optional, Sequence, TypeVar
+from fastapi import HTTPException, Query
+from pydantic import BaseModel
+from sqlalchemy import and_, or_
+
+T = TypeVar("T")
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+class Page(BaseModel, Generic[T]):
+    """Envelope for keyset-paginated list endpoints"""
+    success: bool = True
+    data: List[T]
+    next_cursor: Optional[str] = None
+
+def page_params(
+    cursor: Optional[str] = Query(None, description="Opaque cursor from a previous page's next_cursor"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)
+):
+    """Shared query parameters for paginated endpoints"""
+    return cursor, limit
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {"dt": value.isoformat()}
+    if isinstance(value, date):
+        return {"d": value.isoformat()}
+    return value
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        if "dt" in value:
+            return datetime.fromisoformat(value["dt"])
+        if "d" in value:
+            return date.fromisoformat(value["d"])
+    return value
+
+def encode_cursor(values: Sequence) -> str:
+    raw = json.dumps([_encode_value(v) for v in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str, width: int) -> list:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = [_decode_value(v) for v in json.loads(base64.urlsafe_b64decode(padded))]
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+    if len(values) != width:
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+    return values
+
+def keyset(query, columns: Sequence, cursor: Optional[str], limit: int, descending: bool = False):
+    """Order `query` by `columns` and start it strictly after `cursor`.
+
+    Fetches one extra row so the caller can tell whether another page exists.
+    The comparison is written out as (a > x) OR (a = x AND b > y) so every
+    backend can turn it into an index range scan on the matching composite index.
+    """
+    if cursor:
+        values = decode_cursor(cursor, len(columns))
+        clauses = []
+        for i, column in enumerate(columns):
+            after = column < values[i] if descending else column > values[i]
+            clauses.append(and_(*[columns[j] == values[j] for j in range(i)], after))
+        query = query.where(or_(*clauses))
+
+    ordering = [column.desc() if descending else column.asc() for column in columns]
+    return query.order_by(*ordering).limit(limit + 1)
+
+def split_page(rows: list, limit: int, key) -> tuple:
+    """Trim the look-ahead row and build the next cursor from the last row kept"""
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(key(rows[-1]))
@@ -1,13 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update
+from sqlalchemy import select, update, func, case, literal, String, Text, Float, BigInteger, DateTime
 from typing import List, Optional
 from pydantic import BaseModel
-from datetime import datetime
+from datetime import date, datetime, timedelta
 
-from database import get_db
+from database import get_db, dialect_insert
+from pagination import page_params, keyset, split_page, decode_cursor
 from models import Student, FeeInvoice, Payment, CreditTransaction, School
 from auth import get_current_school
+from counters import bump_counters
+from money import to_cents, from_cents
+from collection_rollups import add_collections
+from ledger import post_entry, post_to_students, balance_as_of, balance_through
 
 router = APIRouter(prefix="/payments", tags=["Payments & Fees"])
 
@@ -18,11 +23,21 @@ class FeeInvoiceCreate(BaseModel):
     description: Optional[str] = None
     total_amount: float
     due_date: Optional[datetime] = None
+    term: Optional[str] = None
+
+class BulkInvoiceCreate(BaseModel):
+    title: str
+    term: str
+    total_amount: float
+    description: Optional[str] = None
+    due_date: Optional[datetime] = None
+    grade: Optional[str] = None # None invoices the whole school
 
 class FeeInvoiceResponse(BaseModel):
     id: int
     student_id: int
     title: str
+    term: Optional[str] = None
     total_amount: float
     paid_amount: float
     status: str
@@ -46,6 +61,31 @@ class PaymentResponse(BaseModel):
     class Config:
         from_attributes = True
 
+async def apply_to_invoice(db: AsyncSession, invoice_id: int, amount_cents: int) -> int:
+    """Add a payment to an invoice with one atomic UPDATE ... RETURNING.
+
+    Returns how many cents of it settled outstanding fees (overpayments don't).
+    """
+    paid = FeeInvoice.paid_cents + amount_cents
+    result = await db.execute(
+        update(FeeInvoice)
+        .where(FeeInvoice.id == invoice_id)
+        .values(
+            paid_cents=paid,
+            paid_amount=paid / 100.0,
+            status=case(
+                (paid >= FeeInvoice.total_cents, "paid"),
+                (FeeInvoice.status == "overdue", "overdue"),
+                (paid > 0, "partial"),
+                else_=FeeInvoice.status
+            )
+        )
+        .returning(FeeInvoice.paid_cents, FeeInvoice.total_cents)
+    )
+    paid_cents, total_cents = result.one()
+    remaining_before = total_cents - (paid_cents - amount_cents)
+    return max(0, min(amount_cents, remaining_before))
+
 # --- Routes ---
 
 @router.post("/invoices", response_model=FeeInvoiceResponse)
@@ -63,29 +103,86 @@ async def create_invoice(
     if not student:
         raise HTTPException(status_code=404, detail="Student not found in this school")
 
-    # 2. Create Invoice
-    new_invoice = FeeInvoice(
+    # 2. Create Invoice; the unique (student, title, term) key rejects a duplicate even under a race
+    total_cents = to_cents(data.total_amount)
+    stmt = dialect_insert(FeeInvoice).values(
         **data.dict(),
-        school_id=current_school.id
-    )
-    db.add(new_invoice)
-    
-    # 3. Create Credit Transaction (SmartBiz Pattern: Fee increases balance/debt)
-    new_tx = CreditTransaction(
         school_id=current_school.id,
-        student_id=data.student_id,
-        amount=data.total_amount,
-        transaction_type="FEE",
-        description=f"Invoiced: {data.title}"
-    )
-    db.add(new_tx)
+        total_cents=total_cents,
+        paid_cents=0,
+        paid_amount=0.0
+    ).on_conflict_do_nothing(
+        index_elements=[FeeInvoice.student_id, FeeInvoice.title, FeeInvoice.term]
+    ).returning(FeeInvoice.id)
+    invoice_id = (await db.execute(stmt)).scalar_one_or_none()
+    if invoice_id is None:
+        raise HTTPException(status_code=400, detail="Student already has this invoice for the term")
 
-    # 4. Update Student Balance
-    student.current_balance += data.total_amount
+    # 3. Post to the ledger (SmartBiz Pattern: Fee increases balance/debt)
+    await post_entry(db, current_school.id, data.student_id, total_cents, "FEE", f"Invoiced: {data.title}")
+    await bump_counters(db, current_school.id, outstanding_fees_cents=total_cents)
     
     await db.commit()
-    await db.refresh(new_invoice)
-    return new_invoice
+    return await db.get(FeeInvoice, invoice_id)
+
+@router.post("/invoices/bulk")
+async def create_term_invoices(
+    data: BulkInvoiceCreate,
+    db: AsyncSession = Depends(get_db),
+    current_school: School = Depends(get_current_school)
+):
+    """Invoice every student in a grade (or the whole school) for a term in one transaction.
+
+    Students who already hold this (title, term) invoice are skipped, so a
+    retried run never double-bills.
+    """
+    if data.total_amount <= 0:
+        raise HTTPException(status_code=400, detail="Invoice amount must be positive")
+    total_cents = to_cents(data.total_amount)
+    now = datetime.utcnow()
+
+    # 1. One INSERT ... SELECT over the targeted students; conflicts are earlier runs
+    targets = select(
+        Student.school_id,
+        Student.id,
+        literal(data.title, String),
+        literal(data.term, String),
+        literal(data.description, Text),
+        literal(from_cents(total_cents), Float),
+        literal(total_cents, BigInteger),
+        literal(0.0, Float),
+        literal(0, BigInteger),
+        literal(data.due_date, DateTime),
+        literal("unpaid", String),
+        literal(now, DateTime),
+    ).where(Student.school_id == current_school.id)
+    if data.grade:
+        targets = targets.where(Student.grade == data.grade)
+
+    stmt = dialect_insert(FeeInvoice).from_select([
+        "school_id", "student_id", "title", "term", "description", "total_amount", "total_cents",
+        "paid_amount", "paid_cents", "due_date", "status", "created_at"
+    ], targets).on_conflict_do_nothing(
+        index_elements=[FeeInvoice.student_id, FeeInvoice.title, FeeInvoice.term]
+    ).returning(FeeInvoice.student_id)
+    invoiced = (await db.execute(stmt)).scalars().all()
+
+    # 2. Ledger rows and balances for the newly invoiced students only
+    await post_to_students(db, current_school.id, invoiced, total_cents, "FEE", f"Invoiced: {data.title}")
+    await bump_counters(db, current_school.id, outstanding_fees_cents=total_cents * len(invoiced))
+
+    targeted = select(func.count(Student.id)).where(Student.school_id == current_school.id)
+    if data.grade:
+        targeted = targeted.where(Student.grade == data.grade)
+    targeted_count = (await db.execute(targeted)).scalar() or 0
+
+    await db.commit()
+    return {
+        "success": True,
+        "invoiced": len(invoiced),
+        "skipped": targeted_count - len(invoiced),
+        "total_invoiced": from_cents(total_cents * len(invoiced))
+    }
 
 @router.post("/pay", response_model=PaymentResponse)
 async def record_payment(
@@ -93,59 +190,119 @@ async def record_payment(
     db: AsyncSession = Depends(get_db),
     current_school: School = Depends(get_current_school)
 ):
-    """Record a payment from a student (Borrowing SmartBiz Payment logic)"""
-    # 1. Verify student
+    """Record a payment from a student (Borrowing SmartBiz Payment logic).
+
+    `reference` (M-Pesa code / receipt no.) is the idempotency key: replaying a
+    reference already recorded for this school returns the original payment, and
+    reusing it for a different student, amount or invoice is rejected with a 409.
+    Balances and invoice totals move with in-database increments, so concurrent
+    payments for the same student cannot overwrite each other.
+    """
+    reference = (data.reference or "").strip() or None
+    amount_cents = to_cents(data.amount)
+    if amount_cents <= 0:
+        raise HTTPException(status_code=400, detail="Payment amount must be positive")
+
+    # 1. Verify student (and invoice, when given)
     student_result = await db.execute(
-        select(Student).where(Student.id == data.student_id, Student.school_id == current_school.id)
+        select(Student.grade).where(Student.id == data.student_id, Student.school_id == current_school.id)
     )
-    student = student_result.scalar_one_or_none()
-    if not student:
+    grade = student_result.scalar_one_or_none()
+    if grade is None:
         raise HTTPException(status_code=404, detail="Student not found in this school")
+    if data.invoice_id:
+        invoice_result = await db.execute(
+            select(FeeInvoice.id).where(FeeInvoice.id == data.invoice_id, FeeInvoice.school_id == current_school.id)
+        )
+        if invoice_result.scalar_one_or_none() is None:
+            raise HTTPException(status_code=404, detail="Invoice not found in this school")
 
-    # 2. Create Payment Record
-    new_payment = Payment(
-        **data.dict(),
-        school_id=current_school.id
-    )
-    db.add(new_payment)
-
-    # 3. Create Credit Transaction (SmartBiz Pattern: Payment decreases balance/debt)
-    new_tx = CreditTransaction(
+    # 2. Create Payment Record; a conflicting reference means this is a replay
+    now = datetime.utcnow()
+    stmt = dialect_insert(Payment).values(
         school_id=current_school.id,
         student_id=data.student_id,
-        amount=-data.amount, # Negative because it reduces the debt
-        transaction_type="PAYMENT",
-        description=f"Payment received via {data.payment_method}"
+        invoice_id=data.invoice_id,
+        amount=from_cents(amount_cents),
+        amount_cents=amount_cents,
+        payment_method=data.payment_method,
+        reference=reference,
+        created_at=now
+    ).on_conflict_do_nothing(index_elements=[Payment.school_id, Payment.reference]).returning(Payment.id)
+    payment_id = (await db.execute(stmt)).scalar_one_or_none()
+    if payment_id is None:
+        await db.rollback()
+        original = (await db.execute(
+            select(Payment).where(Payment.school_id == current_school.id, Payment.reference == reference)
+        )).scalar_one()
+        if (original.student_id, original.amount_cents, original.invoice_id) != (
+            data.student_id, amount_cents, data.invoice_id
+        ):
+            raise HTTPException(
+                status_code=409,
+                detail=f"Reference {reference} is already recorded for a different payment"
+            )
+        return original
+
+    # 3. Post to the ledger (SmartBiz Pattern: Payment decreases balance/debt)
+    await post_entry(
+        db, current_school.id, data.student_id, -amount_cents, "PAYMENT",
+        f"Payment received via {data.payment_method}"
     )
-    db.add(new_tx)
+    await add_collections(db, current_school.id, [(now.date(), data.payment_method, grade, 1, amount_cents)])
 
     # 4. Update Invoice Status if provided
     if data.invoice_id:
-        invoice_result = await db.execute(
-            select(FeeInvoice).where(FeeInvoice.id == data.invoice_id, FeeInvoice.school_id == current_school.id)
-        )
-        invoice = invoice_result.scalar_one_or_none()
-        if invoice:
-            invoice.paid_amount += data.amount
-            if invoice.paid_amount >= invoice.total_amount:
-                invoice.status = "paid"
-            elif invoice.paid_amount > 0:
-                invoice.status = "partial"
-
-    # 5. Update Student Balance
-    student.current_balance -= data.amount
-    
+        settled = await apply_to_invoice(db, data.invoice_id, amount_cents)
+        await bump_counters(db, current_school.id, outstanding_fees_cents=-settled)
+
     await db.commit()
-    await db.refresh(new_payment)
-    return new_payment
+    return await db.get(Payment, payment_id)
+
+@router.get("/student/{student_id}/balance")
+async def get_student_balance(
+    student_id: int,
+    as_of: Optional[datetime] = None,
+    db: AsyncSession = Depends(get_db),
+    current_school: School = Depends(get_current_school)
+):
+    """Student balance now, or as of a past moment (latest checkpoint + ledger tail)"""
+    student_result = await db.execute(
+        select(Student.id).where(Student.id == student_id, Student.school_id == current_school.id)
+    )
+    if student_result.scalar_one_or_none() is None:
+        raise HTTPException(status_code=404, detail="Student not found")
+
+    balance = await balance_as_of(db, student_id, as_of)
+    return {"student_id": student_id, "as_of": as_of, "balance": from_cents(balance), "balance_cents": balance}
+
+def statement_page(student_id: int, window_start: Optional[datetime], window_end: Optional[datetime],
+                   cursor: Optional[str], limit: int, page_opening: int = 0):
+    """One keyset page of a student's ledger lines; the running balance is a window SUM over just this page"""
+    lines = select(CreditTransaction).where(CreditTransaction.student_id == student_id)
+    if window_start:
+        lines = lines.where(CreditTransaction.created_at >= window_start)
+    if window_end:
+        lines = lines.where(CreditTransaction.created_at < window_end)
+    page_rows = keyset(lines, [CreditTransaction.created_at, CreditTransaction.id], cursor, limit).subquery()
+    return select(
+        page_rows,
+        (page_opening + func.sum(page_rows.c.amount_cents).over(
+            order_by=(page_rows.c.created_at, page_rows.c.id)
+        )).label("running_cents")
+    ).order_by(page_rows.c.created_at, page_rows.c.id)
 
 @router.get("/student/{student_id}/statement")
 async def get_student_statement(
     student_id: int,
+    from_date: Optional[date] = Query(None, alias="from"),
+    to_date: Optional[date] = Query(None, alias="to"),
+    page: tuple = Depends(page_params),
     db: AsyncSession = Depends(get_db),
     current_school: School = Depends(get_current_school)
 ):
-    """Fetch financial history for a student (SmartBiz Statement logic)"""
+    """Fetch a student's statement for a date range, oldest first, with a running balance per line (SmartBiz Statement logic)"""
+    cursor, limit = page
     # 1. Verify student
     student_result = await db.execute(
         select(Student).where(Student.id == student_id, Student.school_id == current_school.id)
@@ -154,14 +311,35 @@ async def get_student_statement(
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
 
-    # 2. Get Transactions
-    tx_result = await db.execute(
-        select(CreditTransaction).where(CreditTransaction.student_id == student_id).order_by(CreditTransaction.created_at.desc())
-    )
-    transactions = tx_result.scalars().all()
+    window_start = datetime.combine(from_date, datetime.min.time()) if from_date else None
+    window_end = datetime.combine(to_date + timedelta(days=1), datetime.min.time()) if to_date else None
+
+    # 2. Balances at the window edges and at the start of this page (checkpoint + tail each)
+    opening = await balance_through(db, student_id, window_start, 0) if window_start else 0
+    closing = await balance_through(db, student_id, window_end, 0) if window_end else student.balance_cents
+    page_opening = opening
+    if cursor:
+        after_at, after_id = decode_cursor(cursor, 2)
+        page_opening = await balance_through(db, student_id, after_at, after_id)
+
+    # 3. One page of ledger lines with running balances
+    tx_result = await db.execute(statement_page(student_id, window_start, window_end, cursor, limit, page_opening))
+    rows, next_cursor = split_page(tx_result.all(), limit, lambda r: [r.created_at, r.id])
 
     return {
         "student_name": f"{student.first_name} {student.last_name}",
-        "current_balance": student.current_balance,
-        "history": transactions
+        "current_balance": from_cents(student.balance_cents),
+        "from": from_date,
+        "to": to_date,
+        "opening_balance": from_cents(opening),
+        "closing_balance": from_cents(closing),
+        "history": [{
+            "id": r.id,
+            "created_at": r.created_at,
+            "transaction_type": r.transaction_type,
+            "description": r.description,
+            "amount": from_cents(r.amount_cents),
+            "running_balance": from_cents(r.running_cents),
+        } for r in rows],
+        "next_cursor": next_cursor
     }
@@ -1,10 +1,16 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Request
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, delete, func
-from typing import List
-from database import get_db
-from models import School, User, school_users, AdminActivityLog, Student
-from auth import get_current_super_admin, create_access_token, ACCESS_TOKEN_EXPIRE_MINUTES
+from sqlalchemy import select, delete
+from typing import List, Optional
+from database import get_db, get_pool_stats
+from pagination import page_params, keyset, split_page
+from models import School, AdminActivityLog, SchoolCounters, SchoolRollup, PaymentDailyRollup, AcademicTerm, AttendanceTermBitmap
+from rollups import get_platform_rollup
+from money import from_cents
+from exam_analytics import analytics_cache
+from rankings import rankings_cache
+from timetables import grid_cache
+from auth import get_current_super_admin, create_access_token, ACCESS_TOKEN_EXPIRE_MINUTES, invalidate_principals, principal_cache, password_hasher
 from pydantic import BaseModel
 from datetime import datetime, timedelta
 
@@ -39,43 +45,41 @@ class PlanUpdate(BaseModel):
 
 @router.get("/stats")
 async def get_platform_stats(
+    refresh: bool = False,
     db: AsyncSession = Depends(get_db),
     _ = Depends(get_current_super_admin)
 ):
-    """Platform-wide analytics (SmartBiz Pattern)"""
-    total_schools = await db.execute(select(func.count(School.id)))
-    active_schools = await db.execute(select(func.count(School.id)).where(School.status == 'active'))
-    trial_schools = await db.execute(select(func.count(School.id)).where(School.subscription_plan == 'trial'))
-    blocked_schools = await db.execute(select(func.count(School.id)).where(School.is_manually_blocked == True))
-    total_users = await db.execute(select(func.count(User.id)))
-    total_students = await db.execute(select(func.count(Student.id)))
-    
-    # Staff count (where role is teacher, hod, etc. - anything not student/parent)
-    total_staff = await db.execute(
-        select(func.count(school_users.c.user_id))
-        .where(school_users.c.role.notin_(['student', 'parent']))
-    )
+    """Platform-wide analytics served from the rollup snapshot (SmartBiz Pattern)"""
+    rollup = await get_platform_rollup(db, refresh=refresh)
 
     return {
-        "total_schools": total_schools.scalar(),
-        "active_schools": active_schools.scalar(),
-        "trial_schools": trial_schools.scalar(),
-        "blocked_schools": blocked_schools.scalar(),
-        "total_users": total_users.scalar(),
-        "total_students": total_students.scalar(),
-        "total_staff": total_staff.scalar(),
-        "revenue": 0.0, # Placeholder for billing integration
-        "health": "healthy"
+        "total_schools": rollup.total_schools,
+        "active_schools": rollup.active_schools,
+        "trial_schools": rollup.trial_schools,
+        "blocked_schools": rollup.blocked_schools,
+        "total_users": rollup.total_users,
+        "total_students": rollup.total_students,
+        # Staff = every membership that is not student/parent
+        "total_staff": rollup.total_staff,
+        "revenue": from_cents(rollup.revenue_cents), # fee payments received across all schools
+        "health": "healthy",
+        "refreshed_at": rollup.refreshed_at
     }
 
+def schools_page(cursor: Optional[str], limit: int):
+    return keyset(select(School), [School.id], cursor, limit)
+
 @router.get("/schools")
 async def list_all_schools(
+    page: tuple = Depends(page_params),
     db: AsyncSession = Depends(get_db),
     _ = Depends(get_current_super_admin)
 ):
-    """View all registered schools across the platform"""
-    result = await db.execute(select(School))
-    return result.scalars().all()
+    """View all registered schools across the platform (keyset-paginated by id)"""
+    cursor, limit = page
+    result = await db.execute(schools_page(cursor, limit))
+    schools, next_cursor = split_page(result.scalars().all(), limit, lambda s: [s.id])
+    return {"success": True, "data": schools, "next_cursor": next_cursor}
 
 @router.patch("/schools/{school_id}/status")
 async def toggle_school_block(
@@ -103,6 +107,7 @@ async def toggle_school_block(
     db.add(log)
     
     await db.commit()
+    invalidate_principals(school_id=school_id)
     return {"message": f"School status updated", "is_blocked": school.is_manually_blocked}
 
 @router.delete("/schools/{school_id}")
@@ -127,10 +132,28 @@ async def remove_school(
     )
     db.add(log)
     
+    await db.execute(delete(SchoolCounters).where(SchoolCounters.school_id == school_id))
+    await db.execute(delete(SchoolRollup).where(SchoolRollup.school_id == school_id))
+    await db.execute(delete(PaymentDailyRollup).where(PaymentDailyRollup.school_id == school_id))
+    await db.execute(delete(AttendanceTermBitmap).where(AttendanceTermBitmap.school_id == school_id))
+    await db.execute(delete(AcademicTerm).where(AcademicTerm.school_id == school_id))
     await db.delete(school)
     await db.commit()
+    invalidate_principals(school_id=school_id)
     return {"message": f"School {school_id} removed successfully"}
 
+@router.get("/metrics")
+async def get_platform_metrics(_ = Depends(get_current_super_admin)):
+    """In-process runtime metrics for capacity tuning"""
+    return {
+        "principal_cache": principal_cache.stats(),
+        "password_hashing": password_hasher.stats(),
+        "exam_analytics_cache": analytics_cache.stats(),
+        "rankings_cache": rankings_cache.stats(),
+        "timetable_grid_cache": grid_cache.stats(),
+        "db_pool": get_pool_stats()
+    }
+
 @router.get("/audit-logs")
 async def get_admin_audit_logs(
     db: AsyncSession = Depends(get_db),
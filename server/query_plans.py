@@ -0,0 +1,140 @@
+"""
+Query-plan regression check for the multi-tenant hot paths.
+
+Runs EXPLAIN (EXPLAIN QUERY PLAN on SQLite, EXPLAIN (FORMAT JSON) on Postgres)
+for the queries each router issues and exits non-zero if any of them falls
+back to a full table scan. Run it against the configured DATABASE_URL:
+
+    python query_plans.py
+"""
+import sys
+import json
+import asyncio
+from datetime import date, datetime
+
+from database import engine, init_db, Base
+from pagination import encode_cursor
+from models import BalanceCheckpoint, TimetableSlot, UserRole
+from auth import user_by_username, school_by_id, active_membership, login_membership
+from students import students_page
+from assets import assets_page, asset_movements_page
+from payments import statement_page
+from ledger import latest_checkpoint, ledger_tail
+from reconciliation import posted_references, invoice_students, students_by_admission, students_by_phone
+from receivables import overdue_update, aged_receivables
+from collection_rollups import daily_collections, SERIES_KEYS
+from exams import school_subjects, school_exams
+from exam_analytics import exam_scores
+from rankings import subject_averages
+from timetables import grade_timetable, saved_lessons, overlapping_lessons, grid_periods, grid_lessons, same_room
+from attendance import student_attendance_page, register_query
+from attendance_store import terms_overlapping, attendance_between
+from attendance_analytics import term_bitmaps
+from users import school_users_page
+from counters import counter_queries
+from leave_requests import leave_requests_page
+from platform_admin import schools_page
+
+# (router, description, statement, allow_full_scan), built by the same helpers the routers call
+def hot_queries():
+    school_id, student_id, user_id = 1, 1, 1
+    today = date.today()
+    now = datetime.utcnow()
+    by_id, by_time = encode_cursor([10]), encode_cursor([now, 10])
+    checkpoint = BalanceCheckpoint(as_of=now, last_transaction_id=10)
+    clash_keys = [("teacher", user_id), ("room", "lab 1"), ("grade", "Grade 1")]
+    queries = [
+        ("auth", "user by username", user_by_username("someone"), False),
+        ("auth", "school by id", school_by_id(school_id), False),
+        ("auth", "active membership", active_membership(user_id, school_id), False),
+        ("main", "login membership", login_membership(user_id), False),
+        ("students", "list students page", students_page(school_id, by_id, 50), False),
+        ("assets", "list assets page", assets_page(school_id, by_id, 50), False),
+        ("assets", "asset history page", asset_movements_page(1, by_time, 50), False),
+        ("payments", "student statement page", statement_page(student_id, now, now, by_time, 50), False),
+        ("payments", "balance checkpoint", latest_checkpoint(student_id, now, 10), False),
+        ("payments", "balance tail", ledger_tail(student_id, now, 10, checkpoint), False),
+        ("reconciliation", "posted references", posted_references(school_id, ["QX1", "QX2"]), False),
+        ("reconciliation", "invoice students", invoice_students(school_id, [1, 2]), False),
+        ("reconciliation", "students by admission number", students_by_admission(school_id, ["ADM1", "ADM2"]), False),
+        ("reconciliation", "students by phone", students_by_phone(school_id, ["254712345678"]), False),
+        ("receivables", "overdue sweep", overdue_update(school_id, now), False),
+        ("receivables", "aged receivables", aged_receivables(school_id, now), False),
+        ("exams", "list subjects", school_subjects(school_id), False),
+        ("exams", "list exams", school_exams(school_id), False),
+        ("exams", "exam scores", exam_scores(1), False),
+        ("rankings", "term subject averages", subject_averages(school_id, "Term 1"), False),
+        ("timetables", "grade timetable", grade_timetable(school_id, "Grade 1"), False),
+        ("timetables", "day lessons for clash check", saved_lessons(school_id, "Monday"), False),
+        ("timetables", "slot overlap check", overlapping_lessons(school_id, "Monday", 480, 540, clash_keys), False),
+        ("timetables", "grid periods", grid_periods(school_id), False),
+        ("timetables", "teacher grid", grid_lessons(school_id, TimetableSlot.teacher_id == user_id), False),
+        ("timetables", "room grid", grid_lessons(school_id, same_room("lab 1")), False),
+        ("attendance", "student attendance page", student_attendance_page(student_id, encode_cursor([today]), 50), False),
+        ("attendance", "class register", register_query(school_id, "Grade 1", today), False),
+        ("attendance", "terms containing marked days", terms_overlapping(school_id, today, today), False),
+        ("attendance", "term bitmaps for analytics", term_bitmaps(1), False),
+        ("attendance", "term rebuild scan", attendance_between(school_id, today, today), False),
+        ("users", "school users by role page", school_users_page(school_id, UserRole.TEACHER, by_id, 50), False),
+        ("leave_requests", "school leave requests page", leave_requests_page(school_id, by_time, 50), False),
+        ("platform_admin", "all schools page", schools_page(by_id, 50), False),
+    ]
+    queries += [
+        ("collections", f"daily collections by {by}", daily_collections(school_id, today, today, key_column), False)
+        for by, key_column in SERIES_KEYS.items()
+    ]
+    queries += [
+        ("counters", f"{name} recount", stmt, False) for name, stmt in counter_queries(school_id).items()
+    ]
+    return queries
+
+def _sqlite_full_scans(rows) -> list:
+    # detail column looks like "SCAN students" or "SEARCH students USING INDEX ..."; scans of
+    # subqueries (a keyset page wrapped for a window function) are bounded, only tables count
+    details = [row[-1] for row in rows]
+    return [d for d in details if d.startswith("SCAN ") and d.split()[1] in Base.metadata.tables]
+
+def _postgres_full_scans(plan) -> list:
+    found = []
+    def walk(node):
+        if node.get("Node Type") == "Seq Scan":
+            found.append(f"Seq Scan on {node.get('Relation Name')}")
+        for child in node.get("Plans", []):
+            walk(child)
+    walk(plan[0]["Plan"])
+    return found
+
+async def explain_all() -> list:
+    """Return (router, description, scans, allowed) for every hot query"""
+    results = []
+    async with engine.connect() as conn:
+        dialect = conn.dialect
+        if dialect.name == "postgresql":
+            # Tiny test tables make a seq scan "cheaper"; we only care whether an index path exists
+            await conn.exec_driver_sql("SET enable_seqscan = off")
+
+        for router, description, stmt, allowed in hot_queries():
+            sql = str(stmt.compile(dialect=dialect, compile_kwargs={"literal_binds": True}))
+            if dialect.name == "sqlite":
+                rows = (await conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}")).all()
+                scans = _sqlite_full_scans(rows)
+            else:
+                raw = (await conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {sql}")).scalar()
+                scans = _postgres_full_scans(json.loads(raw) if isinstance(raw, str) else raw)
+            results.append((router, description, scans, allowed))
+    return results
+
+async def main() -> int:
+    await init_db()
+    failures = 0
+    for router, description, scans, allowed in await explain_all():
+        if scans and not allowed:
+            failures += 1
+            print(f"FAIL  {router}: {description} -> {'; '.join(scans)}")
+        else:
+            print(f"ok    {router}: {description}" + (" (full scan allowed)" if scans else ""))
+    print(f"\n{failures} hot quer{'y' if failures == 1 else 'ies'} fell back to a full table scan")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
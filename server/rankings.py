@@ -0,0 +1,193 @@
+"""
+Class positions and subject rankings.
+
+Positions are computed by the database with RANK() / DENSE_RANK() window
+functions partitioned by grade (class), so ties share a position and the
+application never loads every GradeEntry to sort it. Results are cached per
+(school, term) and dropped by record_grades when marks in that term change.
+"""
+import os
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from cache import TTLCache, Generations
+from database import get_db
+from models import Exam, GradeEntry, Subject, Student, School
+from auth import get_current_school
+
+router = APIRouter(prefix="/academic", tags=["Exams & Grading"])
+
+RANKINGS_CACHE_TTL = float(os.getenv("RANKINGS_CACHE_TTL", "3600"))
+RANKINGS_CACHE_SIZE = int(os.getenv("RANKINGS_CACHE_SIZE", "1024"))
+
+rankings_cache = TTLCache(maxsize=RANKINGS_CACHE_SIZE, ttl=RANKINGS_CACHE_TTL, name="rankings")
+
+# Bumped per (school_id, term) on invalidation; cache keys start with that pair
+rankings_generations = Generations()
+
+def invalidate_rankings(school_id: int, term: Optional[str]) -> int:
+    """Drop cached rankings for one school and term"""
+    rankings_generations.bump((school_id, term))
+    return rankings_cache.invalidate_where(lambda key: key[0] == school_id and key[1] == term)
+
+def _cache_result(cache_key: tuple, generation: int, result: dict) -> None:
+    """Cache a ranking unless its (school, term) was invalidated while it was computed"""
+    if rankings_generations.current(cache_key[:2]) == generation:
+        rankings_cache.set(cache_key, result)
+
+def subject_averages(school_id: int, term: str, subject_id: Optional[int] = None):
+    """Per (student, subject): mean of the term's exam marks as a percentage of max_score"""
+    percent = GradeEntry.score * 100.0 / func.coalesce(Exam.max_score, 100.0)
+    query = select(
+        GradeEntry.student_id,
+        Exam.subject_id,
+        func.avg(percent).label("percent"),
+        func.count(GradeEntry.id).label("exams"),
+    ).join(Exam, GradeEntry.exam_id == Exam.id).where(Exam.school_id == school_id, Exam.term == term)
+    if subject_id is not None:
+        query = query.where(Exam.subject_id == subject_id)
+    return query.group_by(GradeEntry.student_id, Exam.subject_id)
+
+def _positions(order_by, partition_by):
+    """position (RANK: 1,1,3), dense_position (DENSE_RANK: 1,1,2) and out_of for one partition"""
+    return (
+        func.rank().over(partition_by=partition_by, order_by=order_by.desc()).label("position"),
+        func.dense_rank().over(partition_by=partition_by, order_by=order_by.desc()).label("dense_position"),
+        func.count().over(partition_by=partition_by).label("out_of"),
+    )
+
+def _ranked_row(row, value_key: str) -> dict:
+    return {
+        "student_id": row.student_id,
+        "name": f"{row.first_name} {row.last_name}",
+        "grade": row.grade,
+        value_key: round(row.value, 2),
+        "position": row.position,
+        "dense_position": row.dense_position,
+        "out_of": row.out_of,
+    }
+
+@router.get("/exams/{exam_id}/rankings")
+async def get_exam_rankings(
+    exam_id: int,
+    grade: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+    current_school: School = Depends(get_current_school)
+):
+    """Positions for one exam, ranked within each grade by score"""
+    exam_result = await db.execute(select(Exam).where(Exam.id == exam_id, Exam.school_id == current_school.id))
+    exam = exam_result.scalar_one_or_none()
+    if not exam:
+        raise HTTPException(status_code=404, detail="Exam not found")
+
+    cache_key = (current_school.id, exam.term, "exam", exam_id, grade)
+    cached = rankings_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    generation = rankings_generations.current(cache_key[:2])
+
+    ranked = select(
+        GradeEntry.student_id, Student.first_name, Student.last_name, Student.grade,
+        GradeEntry.score.label("value"),
+        *_positions(GradeEntry.score, [Student.grade])
+    ).join(Student, GradeEntry.student_id == Student.id).where(GradeEntry.exam_id == exam_id)
+    if grade:
+        ranked = ranked.where(Student.grade == grade)
+    ranked = ranked.subquery()
+    rows = (await db.execute(
+        select(ranked).order_by(ranked.c.grade, ranked.c.position, ranked.c.student_id)
+    )).all()
+
+    result = {
+        "success": True,
+        "exam_id": exam.id,
+        "title": exam.title,
+        "term": exam.term,
+        "max_score": exam.max_score,
+        "data": [_ranked_row(row, "score") for row in rows]
+    }
+    _cache_result(cache_key, generation, result)
+    return result
+
+@router.get("/rankings")
+async def get_term_rankings(
+    term: str,
+    grade: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+    current_school: School = Depends(get_current_school)
+):
+    """Overall class positions for a term: the mean of each student's subject averages, ranked within each grade"""
+    cache_key = (current_school.id, term, "overall", grade)
+    cached = rankings_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    generation = rankings_generations.current(cache_key[:2])
+
+    per_subject = subject_averages(current_school.id, term).subquery()
+    overall = select(
+        per_subject.c.student_id,
+        func.avg(per_subject.c.percent).label("average"),
+        func.count(per_subject.c.subject_id).label("subjects"),
+    ).group_by(per_subject.c.student_id).subquery()
+    ranked = select(
+        overall.c.student_id, Student.first_name, Student.last_name, Student.grade,
+        overall.c.average.label("value"), overall.c.subjects,
+        *_positions(overall.c.average, [Student.grade])
+    ).join(Student, overall.c.student_id == Student.id).where(Student.school_id == current_school.id)
+    if grade:
+        ranked = ranked.where(Student.grade == grade)
+    ranked = ranked.subquery()
+    rows = (await db.execute(
+        select(ranked).order_by(ranked.c.grade, ranked.c.position, ranked.c.student_id)
+    )).all()
+
+    result = {
+        "success": True,
+        "term": term,
+        "grade": grade,
+        "data": [{**_ranked_row(row, "average"), "subjects": row.subjects} for row in rows]
+    }
+    _cache_result(cache_key, generation, result)
+    return result
+
+@router.get("/rankings/subjects")
+async def get_subject_rankings(
+    term: str,
+    subject_id: Optional[int] = None,
+    grade: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+    current_school: School = Depends(get_current_school)
+):
+    """Per-subject positions for a term (subject average across the term's exams), ranked within each grade"""
+    cache_key = (current_school.id, term, "subjects", subject_id, grade)
+    cached = rankings_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    generation = rankings_generations.current(cache_key[:2])
+
+    per_subject = subject_averages(current_school.id, term, subject_id).subquery()
+    ranked = select(
+        per_subject.c.student_id, per_subject.c.subject_id, Subject.name.label("subject"),
+        Student.first_name, Student.last_name, Student.grade,
+        per_subject.c.percent.label("value"),
+        *_positions(per_subject.c.percent, [per_subject.c.subject_id, Student.grade])
+    ).join(Student, per_subject.c.student_id == Student.id).join(
+        Subject, per_subject.c.subject_id == Subject.id
+    ).where(Student.school_id == current_school.id)
+    if grade:
+        ranked = ranked.where(Student.grade == grade)
+    ranked = ranked.subquery()
+    rows = (await db.execute(
+        select(ranked).order_by(ranked.c.subject, ranked.c.grade, ranked.c.position, ranked.c.student_id)
+    )).all()
+
+    subjects = {}
+    for row in rows:
+        entry = subjects.setdefault(row.subject_id, {"subject_id": row.subject_id, "subject": row.subject, "data": []})
+        entry["data"].append(_ranked_row(row, "percent"))
+
+    result = {"success": True, "term": term, "grade": grade, "subjects": list(subjects.values())}
+    _cache_result(cache_key, generation, result)
+    return result
@@ -0,0 +1,103 @@
+"""
+Overdue sweeping and aged-receivables reporting for fee invoices.
+
+Both lean on ix_fee_invoices_school_status_due: the sweeper is one UPDATE per
+school over (school_id, status, due_date), and the report is one grouped
+aggregation with CASE buckets, so neither walks invoices in Python.
+"""
+import logging
+from datetime import datetime, timedelta
+from typing import Optional
+from fastapi import APIRouter, Depends
+from sqlalchemy import select, update, func, case
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import get_db, async_session_maker
+from models import FeeInvoice, Student, School
+from auth import get_current_school
+from money import from_cents
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/receivables", tags=["Payments & Fees"])
+
+OPEN_STATUSES = ("unpaid", "partial")
+UNSETTLED_STATUSES = ("unpaid", "partial", "overdue")
+BUCKETS = ("current", "days_1_30", "days_31_60", "days_61_90", "days_over_90")
+
+def overdue_update(school_id: int, now: datetime):
+    return update(FeeInvoice).where(
+        FeeInvoice.school_id == school_id,
+        FeeInvoice.status.in_(OPEN_STATUSES),
+        FeeInvoice.due_date < now
+    ).values(status="overdue")
+
+async def sweep_overdue(db: AsyncSession, school_id: int, now: Optional[datetime] = None) -> int:
+    """Flip the school's past-due open invoices to overdue (caller commits)"""
+    result = await db.execute(overdue_update(school_id, now or datetime.utcnow()))
+    return result.rowcount
+
+async def overdue_sweep_job() -> None:
+    """Periodic job: one short transaction per school"""
+    async with async_session_maker() as db:
+        school_ids = (await db.execute(select(School.id))).scalars().all()
+
+    now = datetime.utcnow()
+    flipped = 0
+    for school_id in school_ids:
+        async with async_session_maker() as db:
+            flipped += await sweep_overdue(db, school_id, now)
+            await db.commit()
+    if flipped:
+        logger.info(f"Marked {flipped} invoices overdue")
+
+def aged_receivables(school_id: int, now: datetime):
+    """Per grade: unsettled invoice count and outstanding cents in each of BUCKETS"""
+    outstanding = FeeInvoice.total_cents - FeeInvoice.paid_cents
+    cutoffs = [now - timedelta(days=days) for days in (30, 60, 90)]
+    bucket = case(
+        (FeeInvoice.due_date.is_(None), 0),
+        (FeeInvoice.due_date >= now, 0),
+        (FeeInvoice.due_date >= cutoffs[0], 1),
+        (FeeInvoice.due_date >= cutoffs[1], 2),
+        (FeeInvoice.due_date >= cutoffs[2], 3),
+        else_=4
+    )
+    return (
+        select(
+            Student.grade,
+            func.count(FeeInvoice.id),
+            *[func.sum(case((bucket == index, outstanding), else_=0)) for index in range(len(BUCKETS))]
+        )
+        .join(Student, FeeInvoice.student_id == Student.id)
+        .where(FeeInvoice.school_id == school_id, FeeInvoice.status.in_(UNSETTLED_STATUSES))
+        .group_by(Student.grade)
+        .order_by(Student.grade)
+    )
+
+@router.get("/aged")
+async def get_aged_receivables(
+    as_of: Optional[datetime] = None,
+    db: AsyncSession = Depends(get_db),
+    current_school: School = Depends(get_current_school)
+):
+    """Unpaid fees per grade, bucketed by days past due (current, 1-30, 31-60, 61-90, 90+)"""
+    now = as_of or datetime.utcnow()
+    result = await db.execute(aged_receivables(current_school.id, now))
+
+    grades = []
+    totals = dict.fromkeys(BUCKETS, 0)
+    for grade, invoices, *amounts in result.all():
+        row = {"grade": grade, "invoices": invoices}
+        for name, cents in zip(BUCKETS, amounts):
+            row[name] = from_cents(cents)
+            totals[name] += cents or 0
+        row["total"] = from_cents(sum(cents or 0 for cents in amounts))
+        grades.append(row)
+
+    return {
+        "success": True,
+        "as_of": now,
+        "data": grades,
+        "totals": {**{name: from_cents(cents) for name, cents in totals.items()}, "total": from_cents(sum(totals.values()))}
+    }
@@ -0,0 +1,259 @@
+"""
+Bank / M-Pesa statement reconciliation import.
+
+The uploaded CSV is parsed line by line and applied in batches of
+RECONCILIATION_BATCH_SIZE, one transaction per batch, so a 50k-line statement
+never sits in memory. Each credit line is matched by its account reference:
+"INV-<id>" names an invoice, anything else is tried as an admission number,
+then the payer's phone is tried against student phone numbers.
+
+Matched lines go through the same path as /payments/pay (Payment row with the
+statement reference as idempotency key, ledger entry, invoice increment), so a
+statement can be re-uploaded safely: lines already posted are skipped.
+"""
+import re
+import csv
+import asyncio
+import codecs
+from typing import Literal, Optional
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import get_db, dialect_insert
+from models import Student, FeeInvoice, Payment, School
+from auth import get_current_school
+from counters import bump_counters
+from ledger import post_entries
+from collection_rollups import add_collections
+from money import to_cents, from_cents
+from payments import apply_to_invoice
+from students import normalize_phone
+
+router = APIRouter(prefix="/reconciliation", tags=["Payments & Fees"])
+
+RECONCILIATION_BATCH_SIZE = 500
+# Unmatched lines listed in the response; the rest are only counted
+UNMATCHED_REPORT_LIMIT = 500
+
+INVOICE_REF = re.compile(r"^INV[-\s#]?(\d+)$", re.IGNORECASE)
+
+# Normalised header -> field. Covers M-Pesa paybill/org statements and common bank exports.
+COLUMN_ALIASES = {
+    "receipt no": "reference", "receipt": "reference", "transaction id": "reference",
+    "reference": "reference", "ref": "reference", "transaction reference": "reference", "trans id": "reference",
+    "paid in": "amount", "credit": "amount", "credit amount": "amount", "amount": "amount", "deposit": "amount",
+    "a/c no": "account", "account": "account", "account no": "account", "account number": "account",
+    "bill reference": "account", "billrefnumber": "account", "narration": "account",
+    "other party info": "phone", "phone": "phone", "msisdn": "phone", "phone number": "phone",
+}
+
+def _header_key(name: str) -> str:
+    return re.sub(r"[.:_]+", " ", name.strip().lower()).strip()
+
+def _parse_amount(raw: Optional[str]) -> int:
+    cleaned = re.sub(r"[^\d.\-]", "", raw or "")
+    try:
+        return to_cents(float(cleaned)) if cleaned else 0
+    except ValueError:
+        return 0
+
+def _parse_phone(raw: Optional[str]) -> Optional[str]:
+    # M-Pesa "Other Party Info" looks like "254712345678 - JANE DOE"
+    match = re.search(r"\+?\d[\d\s]{8,14}", raw or "")
+    return normalize_phone(match.group(0)) if match else None
+
+def _read_lines(upload: UploadFile):
+    """Yield (line_no, {field: value}) from the upload without loading it into memory"""
+    reader = csv.reader(codecs.iterdecode(upload.file, "utf-8-sig", errors="replace"))
+    header = next(reader, None)
+    if header is None:
+        raise HTTPException(status_code=400, detail="Statement is empty")
+    fields = [COLUMN_ALIASES.get(_header_key(name)) for name in header]
+    if "reference" not in fields or "amount" not in fields:
+        raise HTTPException(status_code=400, detail="Statement needs a receipt/reference column and a paid-in/credit column")
+
+    for line_no, row in enumerate(reader, start=2):
+        values = {}
+        for field, value in zip(fields, row):
+            if field and field not in values:
+                values[field] = value.strip()
+        yield line_no, values
+
+class ImportReport:
+    """Running totals for one statement upload"""
+
+    def __init__(self):
+        self.lines = 0
+        self.posted = 0
+        self.posted_cents = 0
+        self.already_posted = 0
+        self.ignored = 0
+        self.unmatched_count = 0
+        self.unmatched = []
+
+    def unmatched_line(self, line_no: int, values: dict, reason: str) -> None:
+        self.unmatched_count += 1
+        if len(self.unmatched) < UNMATCHED_REPORT_LIMIT:
+            self.unmatched.append({
+                "line": line_no,
+                "reference": values.get("reference"),
+                "account": values.get("account"),
+                "amount": values.get("amount"),
+                "reason": reason,
+            })
+
+    def as_dict(self) -> dict:
+        return {
+            "success": True,
+            "lines": self.lines,
+            "posted": self.posted,
+            "posted_amount": from_cents(self.posted_cents),
+            "already_posted": self.already_posted,
+            "ignored": self.ignored,
+            "unmatched_count": self.unmatched_count,
+            "unmatched": self.unmatched,
+            "unmatched_truncated": self.unmatched_count > len(self.unmatched),
+        }
+
+# --- Matching lookups (one IN query per batch each) ---
+
+def posted_references(school_id: int, references):
+    return select(Payment.reference).where(Payment.school_id == school_id, Payment.reference.in_(references))
+
+def invoice_students(school_id: int, invoice_ids):
+    return select(FeeInvoice.id, FeeInvoice.student_id).where(
+        FeeInvoice.school_id == school_id, FeeInvoice.id.in_(invoice_ids)
+    )
+
+def students_by_admission(school_id: int, accounts):
+    return select(Student.admission_number, Student.id).where(
+        Student.school_id == school_id, Student.admission_number.in_(accounts)
+    )
+
+def students_by_phone(school_id: int, phones):
+    return select(Student.phone, Student.id).where(Student.school_id == school_id, Student.phone.in_(phones))
+
+async def _apply_batch(db: AsyncSession, school_id: int, method: str, batch: list, report: ImportReport) -> None:
+    """Match and post one batch of statement lines in a single transaction"""
+    references = {values["reference"] for _, values, _ in batch}
+    posted = set((await db.execute(
+        posted_references(school_id, references)
+    )).scalars().all())
+
+    accounts = {values.get("account") for _, values, _ in batch if values.get("account")}
+    invoice_ids = {int(m.group(1)) for a in accounts if (m := INVOICE_REF.match(a))}
+    invoices = dict((await db.execute(invoice_students(school_id, invoice_ids))).all()) if invoice_ids else {}
+    admissions = dict((await db.execute(students_by_admission(school_id, accounts))).all()) if accounts else {}
+    phones = {_parse_phone(values.get("phone")) for _, values, _ in batch} - {None}
+    phone_owners = {}
+    if phones:
+        for phone, student_id in (await db.execute(students_by_phone(school_id, phones))).all():
+            phone_owners.setdefault(phone, []).append(student_id)
+
+    rows = []
+    for line_no, values, amount_cents in batch:
+        reference, account = values["reference"], values.get("account") or ""
+        if reference in posted:
+            report.already_posted += 1
+            continue
+        posted.add(reference)
+
+        invoice_id = student_id = None
+        invoice_match = INVOICE_REF.match(account)
+        if invoice_match:
+            invoice_id = int(invoice_match.group(1))
+            student_id = invoices.get(invoice_id)
+        if student_id is None and account in admissions:
+            invoice_id, student_id = None, admissions[account]
+        if student_id is None:
+            owners = phone_owners.get(_parse_phone(values.get("phone")), [])
+            if len(owners) > 1:
+                report.unmatched_line(line_no, values, "phone number belongs to several students")
+                continue
+            if owners:
+                invoice_id, student_id = None, owners[0]
+        if student_id is None:
+            report.unmatched_line(line_no, values, "no invoice, admission number or phone matched")
+            continue
+
+        rows.append({
+            "school_id": school_id,
+            "student_id": student_id,
+            "invoice_id": invoice_id,
+            "amount": from_cents(amount_cents),
+            "amount_cents": amount_cents,
+            "payment_method": method,
+            "reference": reference,
+        })
+
+    if not rows:
+        return
+    stmt = dialect_insert(Payment).on_conflict_do_nothing(
+        index_elements=[Payment.school_id, Payment.reference]
+    ).returning(Payment.student_id, Payment.invoice_id, Payment.amount_cents, Payment.reference, Payment.created_at)
+    inserted = (await db.execute(stmt, rows)).all()
+    report.already_posted += len(rows) - len(inserted)
+    if not inserted:
+        return
+
+    await post_entries(db, [{
+        "school_id": school_id,
+        "student_id": student_id,
+        "amount_cents": -amount_cents,
+        "transaction_type": "PAYMENT",
+        "description": f"Payment received via {method} ({reference})",
+    } for student_id, _, amount_cents, reference, _ in inserted])
+
+    grades = dict((await db.execute(
+        select(Student.id, Student.grade).where(Student.id.in_({row[0] for row in inserted}))
+    )).all())
+    await add_collections(db, school_id, [
+        (created_at.date(), method, grades[student_id], 1, amount_cents)
+        for student_id, _, amount_cents, _, created_at in inserted
+    ])
+
+    settled = 0
+    for _, invoice_id, amount_cents, _, _ in inserted:
+        if invoice_id:
+            settled += await apply_to_invoice(db, invoice_id, amount_cents)
+    await bump_counters(db, school_id, outstanding_fees_cents=-settled)
+
+    report.posted += len(inserted)
+    report.posted_cents += sum(row[2] for row in inserted)
+
+def _read_batch(lines, report: ImportReport) -> tuple:
+    """Parse up to RECONCILIATION_BATCH_SIZE payable lines; returns (batch, more lines may follow)"""
+    batch = []
+    for line_no, values in lines:
+        report.lines += 1
+        amount_cents = _parse_amount(values.get("amount"))
+        if not values.get("reference") or amount_cents <= 0:
+            # Withdrawals, charges and blank lines are not fee payments
+            report.ignored += 1
+            continue
+        batch.append((line_no, values, amount_cents))
+        if len(batch) >= RECONCILIATION_BATCH_SIZE:
+            return batch, True
+    return batch, False
+
+@router.post("/statements")
+async def import_statement(
+    file: UploadFile = File(...),
+    source: Literal["MPESA", "BANK"] = Form("MPESA"),
+    db: AsyncSession = Depends(get_db),
+    current_school: School = Depends(get_current_school)
+):
+    """Import an M-Pesa or bank CSV statement and post every line that matches a student"""
+    method = "MPESA" if source == "MPESA" else "Bank Transfer"
+    report = ImportReport()
+    lines = _read_lines(file)
+
+    more = True
+    while more:
+        # Reading and parsing the spooled upload is blocking work; keep it off the event loop
+        batch, more = await asyncio.to_thread(_read_batch, lines, report)
+        if batch:
+            await _apply_batch(db, current_school.id, method, batch, report)
+            await db.commit()
+    return report.as_dict()
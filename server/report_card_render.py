@@ -0,0 +1,65 @@
+"""
+Report card rendering, run inside the report-card process pool.
+
+Kept free of database/app imports so spawned workers start quickly; every
+function takes plain dicts built by report_cards.py and returns bytes.
+"""
+import re
+from html import escape
+
+STYLE = """
+body { font-family: Arial, sans-serif; margin: 32px; color: #222; }
+h1 { margin: 0; font-size: 22px; } h2 { margin: 4px 0 16px; font-size: 16px; color: #555; }
+table { border-collapse: collapse; width: 100%; margin: 12px 0; }
+th, td { border: 1px solid #bbb; padding: 6px 8px; text-align: left; font-size: 13px; }
+th { background: #f0f0f0; } .summary td { font-weight: bold; }
+"""
+
+def _fmt(value, suffix: str = "") -> str:
+    return "-" if value is None else f"{value:.1f}{suffix}"
+
+def render_report_card(card: dict) -> str:
+    """One student's report card as a self-contained, printable HTML page"""
+    rows = []
+    for subject in card["subjects"]:
+        exams = "; ".join(
+            f"{escape(e['title'])}: {e['score']:g}/{e['max_score']:g}" for e in subject["exams"]
+        )
+        remarks = "; ".join(escape(e["remarks"]) for e in subject["exams"] if e.get("remarks"))
+        rows.append(
+            f"<tr><td>{escape(subject['name'])}</td><td>{exams}</td>"
+            f"<td>{_fmt(subject['percent'], '%')}</td><td>{subject['band']}</td><td>{remarks}</td></tr>"
+        )
+
+    attendance = card["attendance"]
+    attendance_cells = "".join(
+        f"<td>{escape(status.title())}: {count}</td>" for status, count in sorted(attendance["by_status"].items())
+    ) or "<td>No attendance recorded</td>"
+    position = f"{card['position']} of {card['class_size']}" if card.get("position") else "-"
+
+    return f"""<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>{escape(card['student_name'])} - {escape(card['term'])}</title>
+<style>{STYLE}</style></head><body>
+<h1>{escape(card['school_name'])}</h1>
+<h2>Report card - {escape(card['term'])}</h2>
+<table>
+<tr><th>Student</th><td>{escape(card['student_name'])}</td><th>Admission no.</th><td>{escape(card.get('admission_number') or '-')}</td></tr>
+<tr><th>Grade</th><td>{escape(card['grade'])}</td><th>Position</th><td>{position}</td></tr>
+</table>
+<table>
+<tr><th>Subject</th><th>Exams</th><th>Average</th><th>Band</th><th>Remarks</th></tr>
+{''.join(rows) or '<tr><td colspan="5">No marks recorded this term</td></tr>'}
+<tr class="summary"><td>Overall</td><td></td><td>{_fmt(card['average'], '%')}</td><td>{card['band'] or '-'}</td><td></td></tr>
+</table>
+<table><tr><th>Attendance</th>{attendance_cells}<td>Rate: {_fmt(attendance['rate'], '%')}</td></tr></table>
+</body></html>
+"""
+
+def report_card_filename(card: dict) -> str:
+    name = re.sub(r"[^A-Za-z0-9]+", "_", card["student_name"]).strip("_") or "student"
+    grade = re.sub(r"[^A-Za-z0-9]+", "_", card["grade"]).strip("_") or "grade"
+    return f"{grade}/{card['student_id']}_{name}.html"
+
+def render_batch(cards: list) -> list:
+    """Render a chunk of report cards; returns [(archive name, utf-8 bytes)]"""
+    return [(report_card_filename(card), render_report_card(card).encode("utf-8")) for card in cards]
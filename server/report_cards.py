@@ -0,0 +1,315 @@
+"""
+End-of-term report cards as a background pipeline.
+
+A job pulls the term's students, exams, marks and attendance (over the job's
+window, which defaults to the academic term's dates) with four bulk queries,
+builds every student's summary (subject averages, bands, class position,
+attendance) in memory, then renders the cards in a process pool in chunks of
+REPORT_CARD_CHUNK. Finished chunks are appended to a zip archive and
+the job's progress counter is committed after each one, so clients can poll
+GET /report-cards/jobs/{id} and download the archive once it completes.
+"""
+import os
+import asyncio
+import logging
+import zipfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import date, datetime
+from typing import Optional
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException
+from fastapi.responses import FileResponse
+from pydantic import BaseModel
+from sqlalchemy import select, update, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import get_db, async_session_maker
+from models import ReportCardJob, Student, Exam, Subject, GradeEntry, Attendance, AcademicTerm, School
+from auth import get_current_school
+from exam_analytics import GRADE_BANDS
+from report_card_render import render_batch
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/report-cards", tags=["Exams & Grading"])
+
+REPORT_CARD_DIR = os.getenv("REPORT_CARD_DIR", "./report_cards")
+REPORT_CARD_WORKERS = int(os.getenv("REPORT_CARD_WORKERS", str(min(4, os.cpu_count() or 1))))
+REPORT_CARD_CHUNK = 100
+
+_render_pool: Optional[ProcessPoolExecutor] = None
+
+def _get_render_pool() -> ProcessPoolExecutor:
+    global _render_pool
+    if _render_pool is None:
+        # spawn: workers must not inherit the event loop, DB connections or driver threads
+        _render_pool = ProcessPoolExecutor(
+            max_workers=REPORT_CARD_WORKERS, mp_context=multiprocessing.get_context("spawn")
+        )
+    return _render_pool
+
+def shutdown_render_pool() -> None:
+    global _render_pool
+    if _render_pool is not None:
+        _render_pool.shutdown(wait=False, cancel_futures=True)
+        _render_pool = None
+
+# --- Schemas ---
+class ReportCardJobCreate(BaseModel):
+    term: str
+    grade: Optional[str] = None # None = whole school
+    attendance_from: Optional[date] = None
+    attendance_to: Optional[date] = None
+
+class ReportCardJobResponse(BaseModel):
+    id: int
+    term: str
+    grade: Optional[str]
+    status: str
+    total: int
+    completed: int
+    error: Optional[str]
+    created_at: datetime
+    finished_at: Optional[datetime]
+    class Config:
+        from_attributes = True
+
+# --- Pipeline ---
+
+def _band(percent: Optional[float]) -> Optional[str]:
+    if percent is None:
+        return None
+    for name, lower_bound in GRADE_BANDS:
+        if percent >= lower_bound:
+            return name
+    return GRADE_BANDS[-1][0]
+
+async def build_report_cards(db: AsyncSession, job: ReportCardJob, school_name: str) -> list:
+    """Per-student report card data for the job's term, from four bulk queries"""
+    students_query = select(
+        Student.id, Student.first_name, Student.last_name, Student.grade, Student.admission_number
+    ).where(Student.school_id == job.school_id)
+    if job.grade:
+        students_query = students_query.where(Student.grade == job.grade)
+    students = (await db.execute(
+        students_query.order_by(Student.grade, Student.last_name, Student.first_name, Student.id)
+    )).all()
+    student_ids = {s.id for s in students}
+
+    exams = {row.id: row for row in (await db.execute(
+        select(Exam.id, Exam.title, Exam.max_score, Exam.subject_id, Subject.name.label("subject"))
+        .join(Subject, Exam.subject_id == Subject.id)
+        .where(Exam.school_id == job.school_id, Exam.term == job.term)
+    )).all()}
+
+    marks = {}
+    if exams:
+        for student_id, exam_id, score, remarks in (await db.execute(
+            select(GradeEntry.student_id, GradeEntry.exam_id, GradeEntry.score, GradeEntry.remarks)
+            .where(GradeEntry.exam_id.in_(list(exams)))
+        )).all():
+            if student_id in student_ids:
+                marks.setdefault(student_id, []).append((exam_id, score, remarks))
+
+    attendance_query = select(Attendance.student_id, Attendance.status, func.count(Attendance.id)).join(
+        Student, Attendance.student_id == Student.id
+    ).where(Attendance.school_id == job.school_id, Student.school_id == job.school_id)
+    if job.grade:
+        attendance_query = attendance_query.where(Student.grade == job.grade)
+    if job.attendance_from:
+        attendance_query = attendance_query.where(Attendance.date >= job.attendance_from)
+    if job.attendance_to:
+        attendance_query = attendance_query.where(Attendance.date <= job.attendance_to)
+    attendance = {}
+    for student_id, status, count in (await db.execute(
+        attendance_query.group_by(Attendance.student_id, Attendance.status)
+    )).all():
+        if student_id in student_ids:
+            by_status = attendance.setdefault(student_id, {})
+            key = (status or "UNKNOWN").upper()
+            by_status[key] = by_status.get(key, 0) + count
+
+    cards = []
+    for student in students:
+        subjects = {}
+        for exam_id, score, remarks in marks.get(student.id, []):
+            exam = exams[exam_id]
+            subject = subjects.setdefault(exam.subject_id, {"name": exam.subject, "exams": [], "percents": []})
+            subject["exams"].append({"title": exam.title, "score": score, "max_score": exam.max_score or 100.0, "remarks": remarks})
+            subject["percents"].append(score * 100.0 / (exam.max_score or 100.0))
+
+        subject_rows = []
+        for subject in sorted(subjects.values(), key=lambda s: s["name"]):
+            percent = sum(subject["percents"]) / len(subject["percents"])
+            subject_rows.append({"name": subject["name"], "exams": subject["exams"], "percent": percent, "band": _band(percent)})
+        average = sum(s["percent"] for s in subject_rows) / len(subject_rows) if subject_rows else None
+
+        by_status = attendance.get(student.id, {})
+        days = sum(by_status.values())
+        attended = by_status.get("PRESENT", 0) + by_status.get("LATE", 0)
+        cards.append({
+            "student_id": student.id,
+            "student_name": f"{student.first_name} {student.last_name}",
+            "admission_number": student.admission_number,
+            "grade": student.grade,
+            "school_name": school_name,
+            "term": job.term,
+            "subjects": subject_rows,
+            "average": average,
+            "band": _band(average),
+            "attendance": {"by_status": by_status, "rate": attended * 100.0 / days if days else None},
+        })
+
+    # Class position within each grade, by overall average (ties share a position)
+    by_grade = {}
+    for card in cards:
+        if card["average"] is not None:
+            by_grade.setdefault(card["grade"], []).append(card)
+    for ranked in by_grade.values():
+        ranked.sort(key=lambda c: c["average"], reverse=True)
+        for index, card in enumerate(ranked):
+            tied_with_previous = index and card["average"] == ranked[index - 1]["average"]
+            card["position"] = ranked[index - 1]["position"] if tied_with_previous else index + 1
+            card["class_size"] = len(ranked)
+    return cards
+
+def _write_chunk(archive_path: str, rendered: list) -> None:
+    with zipfile.ZipFile(archive_path, "a", compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, content in rendered:
+            archive.writestr(name, content)
+
+async def run_report_card_job(job_id: int) -> None:
+    """Background entry point: build, render and archive every card for the job"""
+    async with async_session_maker() as db:
+        job = await db.get(ReportCardJob, job_id)
+        if job is None or job.status != "queued":
+            return
+        pending = []
+        try:
+            school = await db.get(School, job.school_id)
+            job.status = "running"
+            await db.commit()
+
+            cards = await build_report_cards(db, job, school.name if school else "")
+            job.total = len(cards)
+            await db.commit()
+
+            directory = os.path.join(REPORT_CARD_DIR, str(job.school_id))
+            os.makedirs(directory, exist_ok=True)
+            final_path = os.path.join(directory, f"report-cards-{job.id}.zip")
+            partial_path = final_path + ".part"
+            await asyncio.to_thread(_write_chunk, partial_path, [])
+
+            loop = asyncio.get_running_loop()
+            pool = _get_render_pool()
+            pending = [
+                loop.run_in_executor(pool, render_batch, cards[start:start + REPORT_CARD_CHUNK])
+                for start in range(0, len(cards), REPORT_CARD_CHUNK)
+            ]
+            for finished in asyncio.as_completed(pending):
+                rendered = await finished
+                await asyncio.to_thread(_write_chunk, partial_path, rendered)
+                job.completed += len(rendered)
+                await db.commit()
+
+            os.replace(partial_path, final_path)
+            job.archive_path = final_path
+            job.status = "completed"
+            job.finished_at = datetime.utcnow()
+            await db.commit()
+            logger.info(f"Report card job {job.id}: {job.total} cards archived")
+        except Exception as e:
+            logger.error(f"Report card job {job_id} failed: {e}")
+            for future in pending:
+                future.cancel()
+            if isinstance(e, BrokenProcessPool):
+                shutdown_render_pool() # a worker died; start a fresh pool for the next job
+            await db.rollback()
+            await db.execute(
+                update(ReportCardJob).where(ReportCardJob.id == job_id)
+                .values(status="failed", error=str(e)[:1000], finished_at=datetime.utcnow())
+            )
+            await db.commit()
+
+async def fail_interrupted_jobs() -> int:
+    """Jobs left queued/running by a previous process will never finish; mark them failed"""
+    async with async_session_maker() as db:
+        result = await db.execute(
+            update(ReportCardJob)
+            .where(ReportCardJob.status.in_(["queued", "running"]))
+            .values(status="failed", error="Interrupted by a server restart", finished_at=datetime.utcnow())
+        )
+        await db.commit()
+        return result.rowcount
+
+# --- Routes ---
+
+@router.post("/jobs", response_model=ReportCardJobResponse)
+async def create_report_card_job(
+    data: ReportCardJobCreate,
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_db),
+    current_school: School = Depends(get_current_school)
+):
+    """Queue report cards for a term (one grade or the whole school); poll the job for progress"""
+    # Attendance is counted over the given window; missing ends default to the term's dates
+    if data.attendance_from is None or data.attendance_to is None:
+        term = (await db.execute(
+            select(AcademicTerm.start_date, AcademicTerm.end_date).where(
+                AcademicTerm.school_id == current_school.id, AcademicTerm.name == data.term.strip()
+            )
+        )).first()
+        if term is None:
+            raise HTTPException(
+                status_code=400,
+                detail="Give attendance_from and attendance_to, or define the term's dates under /attendance/terms"
+            )
+        data.attendance_from = data.attendance_from or term.start_date
+        data.attendance_to = data.attendance_to or term.end_date
+    if data.attendance_to < data.attendance_from:
+        raise HTTPException(status_code=400, detail="attendance_to must not be before attendance_from")
+
+    job = ReportCardJob(**data.dict(), school_id=current_school.id, status="queued")
+    db.add(job)
+    await db.commit()
+    await db.refresh(job)
+    background_tasks.add_task(run_report_card_job, job.id)
+    return job
+
+@router.get("/jobs", response_model=list[ReportCardJobResponse])
+async def list_report_card_jobs(
+    db: AsyncSession = Depends(get_db),
+    current_school: School = Depends(get_current_school)
+):
+    result = await db.execute(
+        select(ReportCardJob).where(ReportCardJob.school_id == current_school.id)
+        .order_by(ReportCardJob.created_at.desc()).limit(50)
+    )
+    return result.scalars().all()
+
+@router.get("/jobs/{job_id}", response_model=ReportCardJobResponse)
+async def get_report_card_job(
+    job_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_school: School = Depends(get_current_school)
+):
+    job = await db.get(ReportCardJob, job_id)
+    if not job or job.school_id != current_school.id:
+        raise HTTPException(status_code=404, detail="Report card job not found")
+    return job
+
+@router.get("/jobs/{job_id}/download")
+async def download_report_cards(
+    job_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_school: School = Depends(get_current_school)
+):
+    """Download the zip archive of a completed job"""
+    job = await db.get(ReportCardJob, job_id)
+    if not job or job.school_id != current_school.id:
+        raise HTTPException(status_code=404, detail="Report card job not found")
+    if job.status != "completed" or not job.archive_path or not os.path.exists(job.archive_path):
+        raise HTTPException(status_code=409, detail=f"Report cards are not ready (status: {job.status})")
+    filename = f"report-cards-{job.term}{'-' + job.grade if job.grade else ''}.zip".replace(" ", "_")
+    return FileResponse(job.archive_path, media_type="application/zip", filename=filename)
@@ -0,0 +1,92 @@
+"""
+Platform-wide rollups for the super-admin views.
+
+refresh_rollups() computes per-school students, staff and revenue with one
+GROUP BY query per source table (plus a single conditional-aggregate scan of
+schools) and stores the result as a snapshot. Requests read the snapshot, so
+their cost no longer grows with the number of tenants.
+"""
+import logging
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import select, delete, insert, func, case
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import async_session_maker, dialect_insert
+from models import School, User, Student, Payment, school_users, UserRole, SchoolRollup, PlatformRollup
+
+logger = logging.getLogger(__name__)
+
+PLATFORM_ROLLUP_ID = 1
+NON_STAFF_ROLES = (UserRole.STUDENT, UserRole.PARENT)
+
+async def refresh_rollups(db: AsyncSession) -> PlatformRollup:
+    """Rebuild the snapshot in the caller's session (caller commits)"""
+    now = datetime.utcnow()
+
+    school_totals = (await db.execute(
+        select(
+            func.count(School.id),
+            func.sum(case((School.status == 'active', 1), else_=0)),
+            func.sum(case((School.subscription_plan == 'trial', 1), else_=0)),
+            func.sum(case((School.is_manually_blocked == True, 1), else_=0)),
+        )
+    )).one()
+    school_ids = (await db.execute(select(School.id))).scalars().all()
+
+    students = dict((await db.execute(
+        select(Student.school_id, func.count(Student.id)).group_by(Student.school_id)
+    )).all())
+    staff = dict((await db.execute(
+        select(school_users.c.school_id, func.count(school_users.c.user_id))
+        .where(school_users.c.role.notin_(NON_STAFF_ROLES))
+        .group_by(school_users.c.school_id)
+    )).all())
+    revenue = dict((await db.execute(
+        select(Payment.school_id, func.sum(Payment.amount_cents)).group_by(Payment.school_id)
+    )).all())
+    total_users = (await db.execute(select(func.count(User.id)))).scalar() or 0
+
+    rows = [{
+        "school_id": school_id,
+        "students": students.get(school_id, 0),
+        "staff": staff.get(school_id, 0),
+        "revenue_cents": revenue.get(school_id) or 0,
+        "refreshed_at": now,
+    } for school_id in school_ids]
+
+    await db.execute(delete(SchoolRollup))
+    if rows:
+        await db.execute(insert(SchoolRollup), rows)
+
+    platform = {
+        "total_schools": school_totals[0] or 0,
+        "active_schools": school_totals[1] or 0,
+        "trial_schools": school_totals[2] or 0,
+        "blocked_schools": school_totals[3] or 0,
+        "total_users": total_users,
+        "total_students": sum(row["students"] for row in rows),
+        "total_staff": sum(row["staff"] for row in rows),
+        "revenue_cents": sum(row["revenue_cents"] for row in rows),
+        "refreshed_at": now,
+    }
+    stmt = dialect_insert(PlatformRollup).values(id=PLATFORM_ROLLUP_ID, **platform)
+    stmt = stmt.on_conflict_do_update(index_elements=[PlatformRollup.id], set_=platform)
+    await db.execute(stmt)
+    await db.flush()
+    return await db.get(PlatformRollup, PLATFORM_ROLLUP_ID, populate_existing=True)
+
+async def get_platform_rollup(db: AsyncSession, refresh: bool = False) -> PlatformRollup:
+    """Read the snapshot, building it first if it has never been computed (or on request)"""
+    rollup: Optional[PlatformRollup] = None if refresh else await db.get(PlatformRollup, PLATFORM_ROLLUP_ID)
+    if rollup is None:
+        rollup = await refresh_rollups(db)
+        await db.commit()
+    return rollup
+
+async def refresh_rollups_job() -> None:
+    """Periodic job entry point"""
+    async with async_session_maker() as db:
+        rollup = await refresh_rollups(db)
+        await db.commit()
+    logger.info(f"Platform rollups refreshed: {rollup.total_schools} schools")
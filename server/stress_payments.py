@@ -0,0 +1,97 @@
+"""
+Concurrency stress test for record_payment.
+
+Seeds a throwaway database with one school, one student and one invoice, then
+fires N payments at once. Every few payments re-send an earlier reference, the
+way a retried M-Pesa callback would. Exits non-zero unless the ledger, the
+student balance, the invoice and the dashboard counter all agree afterwards:
+
+    python stress_payments.py --payments 500
+    python stress_payments.py --database-url postgresql://user:pw@localhost/eduke_stress
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Fire concurrent payments at record_payment and check the totals")
+    parser.add_argument("--payments", type=int, default=500)
+    parser.add_argument("--replay-every", type=int, default=5, help="every Nth payment repeats an earlier reference")
+    parser.add_argument("--database-url", default=None, help="defaults to a temporary SQLite file")
+    return parser.parse_args()
+
+async def run(payments: int, replay_every: int) -> int:
+    from sqlalchemy import select, func
+    from database import async_session_maker, init_db
+    from models import School, Student, FeeInvoice, Payment, CreditTransaction, SchoolCounters
+    from payments import record_payment, create_invoice, PaymentCreate, FeeInvoiceCreate
+
+    await init_db()
+    async with async_session_maker() as db:
+        school = School(name="Stress School", slug=f"stress-{time.time_ns()}")
+        db.add(school)
+        await db.flush()
+        student = Student(school_id=school.id, first_name="Stress", last_name="Test", grade="Form 1")
+        db.add(student)
+        await db.commit()
+        invoice = await create_invoice(
+            FeeInvoiceCreate(student_id=student.id, title="Term fees", total_amount=payments * 10.0),
+            db=db, current_school=school
+        )
+
+    unique_refs = set()
+    requests = []
+    for i in range(payments):
+        # Every replay_every-th request replays the previous request's reference
+        ref = f"REF{i - 1}" if replay_every and i and i % replay_every == 0 else f"REF{i}"
+        unique_refs.add(ref)
+        requests.append(PaymentCreate(
+            student_id=student.id, invoice_id=invoice.id, amount=12.34, payment_method="MPESA", reference=ref
+        ))
+
+    async def pay(data):
+        async with async_session_maker() as db:
+            return await record_payment(data, db=db, current_school=school)
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*[pay(data) for data in requests], return_exceptions=True)
+    elapsed = time.perf_counter() - started
+    errors = [r for r in results if isinstance(r, Exception)]
+    print(f"{payments} concurrent payments in {elapsed * 1000:.1f} ms, {len(errors)} errors")
+    for error in errors[:5]:
+        print(f"  {type(error).__name__}: {error}")
+
+    expected_paid = len(unique_refs) * 1234
+    async with async_session_maker() as db:
+        stored = (await db.execute(select(func.count(Payment.id)).where(Payment.school_id == school.id))).scalar()
+        ledger = (await db.execute(
+            select(func.sum(CreditTransaction.amount_cents)).where(CreditTransaction.student_id == student.id)
+        )).scalar()
+        balance = (await db.execute(select(Student.balance_cents).where(Student.id == student.id))).scalar()
+        paid = (await db.execute(select(FeeInvoice.paid_cents).where(FeeInvoice.id == invoice.id))).scalar()
+        outstanding = (await db.execute(
+            select(SchoolCounters.outstanding_fees_cents).where(SchoolCounters.school_id == school.id)
+        )).scalar()
+
+    total = payments * 1000
+    checks = [
+        ("no request failed", not errors),
+        (f"one payment per reference ({stored} == {len(unique_refs)})", stored == len(unique_refs)),
+        (f"invoice paid_cents ({paid} == {expected_paid})", paid == expected_paid),
+        (f"ledger sum ({ledger} == {total - expected_paid})", ledger == total - expected_paid),
+        (f"student balance matches ledger ({balance} == {ledger})", balance == ledger),
+        (f"outstanding counter ({outstanding} == {max(total - expected_paid, 0)})",
+         outstanding == max(total - expected_paid, 0)),
+    ]
+    for label, ok in checks:
+        print(f"{'ok  ' if ok else 'FAIL'}  {label}")
+    return 0 if all(ok for _, ok in checks) else 1
+
+if __name__ == "__main__":
+    args = parse_args()
+    # Never fall back to the configured DATABASE_URL: the test writes throwaway tenants
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite+aiosqlite:///{tempfile.mkdtemp()}/stress.db"
+    sys.exit(asyncio.run(run(args.payments, args.replay_every)))
@@ -1,20 +1,41 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from typing import List
-from pydantic import BaseModel
+from typing import List, Optional
+from pydantic import BaseModel, field_validator
+import re
 
-from database import get_db
+from database import get_db, dialect_insert
+from pagination import Page, page_params, keyset, split_page
 from models import Student, School
 from auth import get_current_school  # The dependency we built earlier
+from counters import bump_counters
 
 router = APIRouter(prefix="/students", tags=["Students"])
 
 # --- Schemas ---
+def normalize_phone(phone: Optional[str]) -> Optional[str]:
+    """Canonical 254XXXXXXXXX form for Kenyan numbers (07.., 7.., +254.., 254..)"""
+    if not phone:
+        return None
+    digits = re.sub(r"\D", "", phone)
+    if digits.startswith("0") and len(digits) == 10:
+        digits = "254" + digits[1:]
+    elif len(digits) == 9:
+        digits = "254" + digits
+    return digits or None
+
 class StudentCreate(BaseModel):
     first_name: str
     last_name: str
     grade: str
+    admission_number: Optional[str] = None
+    phone: Optional[str] = None
+
+    @field_validator("phone")
+    @classmethod
+    def _normalize_phone(cls, value):
+        return normalize_phone(value)
 
 class StudentResponse(StudentCreate):
     id: int
@@ -26,16 +47,22 @@ class StudentResponse(StudentCreate):
 
 # --- Routes ---
 
-@router.get("/", response_model=List[StudentResponse])
+def students_page(school_id: int, cursor: Optional[str], limit: int):
+    return keyset(select(Student).where(Student.school_id == school_id), [Student.id], cursor, limit)
+
+@router.get("/", response_model=Page[StudentResponse])
 async def get_students(
+    page: tuple = Depends(page_params),
     db: AsyncSession = Depends(get_db),
     current_school: School = Depends(get_current_school)
 ):
-    """List students only for the logged-in school (Multi-tenant pattern)"""
+    """List students only for the logged-in school (Multi-tenant pattern, keyset-paginated by id)"""
+    cursor, limit = page
     result = await db.execute(
-        select(Student).where(Student.school_id == current_school.id)
+        students_page(current_school.id, cursor, limit)
     )
-    return result.scalars().all()
+    students, next_cursor = split_page(result.scalars().all(), limit, lambda s: [s.id])
+    return {"data": students, "next_cursor": next_cursor}
 
 @router.post("/", response_model=StudentResponse)
 async def create_student(
@@ -44,11 +71,17 @@ async def create_student(
     current_school: School = Depends(get_current_school)
 ):
     """Add a student to the current school"""
-    new_student = Student(
+    # The unique (school_id, admission_number) key rejects a duplicate even under a race
+    stmt = dialect_insert(Student).values(
         **student_data.dict(),
         school_id=current_school.id
-    )
-    db.add(new_student)
+    ).on_conflict_do_nothing(
+        index_elements=[Student.school_id, Student.admission_number]
+    ).returning(Student.id)
+    student_id = (await db.execute(stmt)).scalar_one_or_none()
+    if student_id is None:
+        raise HTTPException(status_code=400, detail="Admission number already in use")
+
+    await bump_counters(db, current_school.id, students=1)
     await db.commit()
-    await db.refresh(new_student)
-    return new_student
+    return await db.get(Student, student_id)
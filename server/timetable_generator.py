@@ -0,0 +1,236 @@
+"""
+Timetable generation by parallel local search.
+
+The problem is encoded as plain integers so it pickles cheaply into worker
+processes: every lesson (grade, subject, teacher, optional fixed room) must get
+a time slot (day * periods + period) and a room. Each worker builds a greedy
+start from its own seed and improves it with simulated annealing until the time
+budget runs out; the caller keeps the best result across workers.
+
+Hard constraints (each violation costs HARD_WEIGHT): a grade, teacher or room
+holds at most one lesson per slot, and teachers/rooms are not used in slots
+already taken by lessons outside the generated grades. Soft constraints are
+the same subject twice in one day for a grade, idle periods inside a grade's
+day and idle periods inside a teacher's day.
+"""
+import math
+import time
+import random
+
+HARD_WEIGHT = 1000
+SOFT_WEIGHTS = {"same_subject_same_day": 3, "grade_gaps": 2, "teacher_gaps": 1}
+CHECK_CLOCK_EVERY = 256
+
+class _Search:
+    def __init__(self, problem: dict, rng: random.Random):
+        self.rng = rng
+        self.days = problem["days"]
+        self.periods = problem["periods"]
+        self.slots = self.days * self.periods
+        self.lessons = problem["lessons"] # [(grade, subject, teacher or -1, fixed room or -1)]
+        n_rooms = problem["rooms"]
+        self.room_options = [
+            [fixed] if fixed >= 0 else (list(range(n_rooms)) if n_rooms else [-1])
+            for _, _, _, fixed in self.lessons
+        ]
+        self.teacher_blocked = set(problem["teacher_blocked"]) # teacher * slots + slot
+        self.room_blocked = set(problem["room_blocked"])
+
+        n_grades = 1 + max((g for g, _, _, _ in self.lessons), default=0)
+        n_teachers = 1 + max((k for _, _, k, _ in self.lessons), default=0)
+        self.grade_occ = [[0] * self.slots for _ in range(n_grades)]
+        self.teacher_occ = [[0] * self.slots for _ in range(n_teachers)]
+        self.room_occ = [[0] * self.slots for _ in range(max(n_rooms, 1))]
+        self.subject_day = [[{} for _ in range(self.days)] for _ in range(n_grades)]
+        self.by_grade = [[] for _ in range(n_grades)]
+        for index, (grade, _, _, _) in enumerate(self.lessons):
+            self.by_grade[grade].append(index)
+        self.slot = [-1] * len(self.lessons)
+        self.room = [-1] * len(self.lessons)
+
+    # --- occupancy ---
+
+    def _place(self, lesson: int, slot: int, room: int) -> None:
+        grade, subject, teacher, _ = self.lessons[lesson]
+        self.slot[lesson], self.room[lesson] = slot, room
+        self.grade_occ[grade][slot] += 1
+        if teacher >= 0:
+            self.teacher_occ[teacher][slot] += 1
+        if room >= 0:
+            self.room_occ[room][slot] += 1
+        counts = self.subject_day[grade][slot // self.periods]
+        counts[subject] = counts.get(subject, 0) + 1
+
+    def _remove(self, lesson: int) -> None:
+        grade, subject, teacher, _ = self.lessons[lesson]
+        slot, room = self.slot[lesson], self.room[lesson]
+        self.grade_occ[grade][slot] -= 1
+        if teacher >= 0:
+            self.teacher_occ[teacher][slot] -= 1
+        if room >= 0:
+            self.room_occ[room][slot] -= 1
+        self.subject_day[grade][slot // self.periods][subject] -= 1
+
+    # --- cost, split into independent components so moves are scored incrementally ---
+
+    def _components(self, lesson: int, slot: int, room: int) -> list:
+        grade, _, teacher, _ = self.lessons[lesson]
+        day = slot // self.periods
+        keys = [("grade", grade, slot), ("grade_day", grade, day)]
+        if teacher >= 0:
+            keys += [("teacher", teacher, slot), ("teacher_day", teacher, day)]
+        if room >= 0:
+            keys.append(("room", room, slot))
+        return keys
+
+    def _gaps(self, occupancy: list, day: int) -> int:
+        used = [p for p in range(self.periods) if occupancy[day * self.periods + p]]
+        return used[-1] - used[0] + 1 - len(used) if used else 0
+
+    def _cost(self, key) -> tuple:
+        """(hard violations, weighted soft score) of one component"""
+        kind, owner, at = key
+        if kind == "grade":
+            return max(0, self.grade_occ[owner][at] - 1), 0
+        if kind == "teacher":
+            count = self.teacher_occ[owner][at]
+            return (count if owner * self.slots + at in self.teacher_blocked else max(0, count - 1)), 0
+        if kind == "room":
+            count = self.room_occ[owner][at]
+            return (count if owner * self.slots + at in self.room_blocked else max(0, count - 1)), 0
+        if kind == "grade_day":
+            repeats = sum(c - 1 for c in self.subject_day[owner][at].values() if c > 1)
+            return 0, (SOFT_WEIGHTS["same_subject_same_day"] * repeats
+                       + SOFT_WEIGHTS["grade_gaps"] * self._gaps(self.grade_occ[owner], at))
+        return 0, SOFT_WEIGHTS["teacher_gaps"] * self._gaps(self.teacher_occ[owner], at)
+
+    def _sum(self, keys) -> tuple:
+        hard = soft = 0
+        for key in keys:
+            h, s = self._cost(key)
+            hard += h
+            soft += s
+        return hard, soft
+
+    def total(self) -> tuple:
+        keys = set()
+        for lesson in range(len(self.lessons)):
+            keys.update(self._components(lesson, self.slot[lesson], self.room[lesson]))
+        return self._sum(keys)
+
+    def breakdown(self) -> dict:
+        repeats = sum(
+            c - 1 for days in self.subject_day for counts in days for c in counts.values() if c > 1
+        )
+        grade_gaps = sum(self._gaps(occ, d) for occ in self.grade_occ for d in range(self.days))
+        teacher_gaps = sum(self._gaps(occ, d) for occ in self.teacher_occ for d in range(self.days))
+        return {"same_subject_same_day": repeats, "grade_gaps": grade_gaps, "teacher_gaps": teacher_gaps}
+
+    # --- search ---
+
+    def greedy(self) -> None:
+        """Most-constrained lessons first, each into the least-conflicting slot and a free room"""
+        load = {}
+        for _, _, teacher, _ in self.lessons:
+            load[teacher] = load.get(teacher, 0) + 1
+        order = sorted(range(len(self.lessons)), key=lambda l: (-load[self.lessons[l][2]], self.rng.random()))
+        for lesson in order:
+            grade, subject, teacher, _ = self.lessons[lesson]
+            best, best_cost = [], None
+            for slot in range(self.slots):
+                cost = 4 * self.grade_occ[grade][slot] + self.subject_day[grade][slot // self.periods].get(subject, 0)
+                if teacher >= 0:
+                    cost += 4 * (self.teacher_occ[teacher][slot] + (teacher * self.slots + slot in self.teacher_blocked))
+                if best_cost is None or cost < best_cost:
+                    best, best_cost = [slot], cost
+                elif cost == best_cost:
+                    best.append(slot)
+            slot = self.rng.choice(best)
+            rooms = self.room_options[lesson]
+            free = [r for r in rooms if r < 0 or (not self.room_occ[r][slot] and r * self.slots + slot not in self.room_blocked)]
+            self._place(lesson, slot, self.rng.choice(free or rooms))
+
+    def _conflicted(self, lesson: int) -> bool:
+        return self._sum(k for k in self._components(lesson, self.slot[lesson], self.room[lesson])
+                         if k[0] in ("grade", "teacher", "room"))[0] > 0
+
+    def anneal(self, deadline: float) -> tuple:
+        hard, soft = self.total()
+        best = (hard, soft, self.slot[:], self.room[:])
+        iterations = 0
+        start = time.monotonic()
+        span = max(deadline - start, 1e-6)
+        temperature = 5.0
+        n = len(self.lessons)
+        rng = self.rng
+        while n:
+            iterations += 1
+            if iterations % CHECK_CLOCK_EVERY == 0:
+                now = time.monotonic()
+                if now >= deadline or (best[0] == 0 and best[1] == 0):
+                    break
+                temperature = 5.0 * (0.01 ** ((now - start) / span)) # 5.0 -> 0.05
+
+            lesson = rng.randrange(n)
+            if hard:
+                for _ in range(4): # bias towards lessons that are part of a clash
+                    if self._conflicted(lesson):
+                        break
+                    lesson = rng.randrange(n)
+
+            if rng.random() < 0.5:
+                # Move one lesson to another slot (and possibly room)
+                moves = [(lesson, rng.randrange(self.slots), rng.choice(self.room_options[lesson]))]
+            else:
+                # Swap slots with another lesson of the same grade
+                other = rng.choice(self.by_grade[self.lessons[lesson][0]])
+                if other == lesson:
+                    continue
+                moves = [(lesson, self.slot[other], self.room[lesson]), (other, self.slot[lesson], self.room[other])]
+
+            keys = set()
+            for moved, slot, room in moves:
+                keys.update(self._components(moved, self.slot[moved], self.room[moved]))
+                keys.update(self._components(moved, slot, room))
+            before = self._sum(keys)
+            undo = [(moved, self.slot[moved], self.room[moved]) for moved, _, _ in moves]
+            for moved, _, _ in moves:
+                self._remove(moved)
+            for moved, slot, room in moves:
+                self._place(moved, slot, room)
+            after = self._sum(keys)
+
+            delta = HARD_WEIGHT * (after[0] - before[0]) + after[1] - before[1]
+            if delta <= 0 or rng.random() < math.exp(-delta / temperature):
+                hard += after[0] - before[0]
+                soft += after[1] - before[1]
+                if HARD_WEIGHT * hard + soft < HARD_WEIGHT * best[0] + best[1]:
+                    best = (hard, soft, self.slot[:], self.room[:])
+            else:
+                for moved, _, _ in moves:
+                    self._remove(moved)
+                for moved, slot, room in undo:
+                    self._place(moved, slot, room)
+        return best, iterations
+
+def solve(problem: dict, seed: int, time_budget: float) -> dict:
+    """One worker's search; returns its best assignment and scores"""
+    deadline = time.monotonic() + time_budget
+    search = _Search(problem, random.Random(seed))
+    search.greedy()
+    (hard, soft, slots, rooms), iterations = search.anneal(deadline)
+
+    # Rebuild the best state to report its soft-constraint breakdown
+    for lesson in range(len(search.lessons)):
+        search._remove(lesson)
+    for lesson, (slot, room) in enumerate(zip(slots, rooms)):
+        search._place(lesson, slot, room)
+    return {
+        "seed": seed,
+        "hard_violations": hard,
+        "soft_score": soft,
+        "breakdown": search.breakdown(),
+        "iterations": iterations,
+        "slots": slots,
+        "rooms": rooms,
+    }
@@ -1,15 +1,52 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import os
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from email.utils import format_datetime, parsedate_to_datetime
+from datetime import timezone
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from fastapi.responses import JSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, insert, delete, func, or_
 from typing import List, Optional
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 from database import get_db
-from models import TimetableSlot, School, Subject, User, school_users, UserRole
+from cache import TTLCache
+from models import TimetableSlot, School, Subject, User, SchoolCounters, school_users, UserRole
 from auth import get_current_school
+from timetable_index import TimetableIndex, DAYS, normalize_day, parse_time, format_time, resource_keys
+from timetable_generator import solve
+from counters import touch_timetable, lock_timetable
 
 router = APIRouter(prefix="/timetables", tags=["Timetables"])
 
+TIMETABLE_GENERATOR_WORKERS = int(os.getenv("TIMETABLE_GENERATOR_WORKERS", str(min(4, os.cpu_count() or 1))))
+TIMETABLE_MAX_BUDGET_SECONDS = float(os.getenv("TIMETABLE_MAX_BUDGET_SECONDS", "60"))
+
+# Keyed by the school's timetable_version, so a timetable write makes old grids unreachable
+grid_cache = TTLCache(maxsize=int(os.getenv("TIMETABLE_GRID_CACHE_SIZE", "1024")), ttl=3600, name="timetable_grids")
+
+# One generation at a time per process: each already uses every generator worker
+_generation_lock = asyncio.Lock()
+_generator_pool: Optional[ProcessPoolExecutor] = None
+
+def _get_generator_pool() -> ProcessPoolExecutor:
+    global _generator_pool
+    if _generator_pool is None:
+        # spawn: workers must not inherit the event loop, DB connections or driver threads
+        _generator_pool = ProcessPoolExecutor(
+            max_workers=TIMETABLE_GENERATOR_WORKERS, mp_context=multiprocessing.get_context("spawn")
+        )
+    return _generator_pool
+
+def shutdown_generator_pool() -> None:
+    global _generator_pool
+    if _generator_pool is not None:
+        _generator_pool.shutdown(wait=False, cancel_futures=True)
+        _generator_pool = None
+
 # --- Schemas ---
 class TimetableSlotCreate(BaseModel):
     subject_id: int
@@ -29,9 +66,133 @@ class TimetableSlotResponse(BaseModel):
     end_time: str
     room: Optional[str]
     grade_level: str
+    day_index: Optional[int] = None
+    start_minute: Optional[int] = None
+    end_minute: Optional[int] = None
     class Config:
         from_attributes = True
 
+class TimetableImport(BaseModel):
+    slots: List[TimetableSlotCreate]
+    replace_existing: bool = False # delete the school's current timetable first
+
+class PeriodSpec(BaseModel):
+    start_time: str
+    end_time: str
+
+class LessonRequirement(BaseModel):
+    grade_level: str
+    subject_id: int
+    teacher_id: Optional[int] = None
+    lessons_per_week: int = Field(..., ge=1)
+    room: Optional[str] = None # fixed room; otherwise any of the listed rooms
+
+class TimetableGenerate(BaseModel):
+    days: List[str] = list(DAYS[:5])
+    periods: List[PeriodSpec] # the same teaching periods every day
+    rooms: List[str] = []
+    requirements: List[LessonRequirement]
+    time_budget_seconds: float = Field(10.0, gt=0)
+    save: bool = False # replace the generated grades' timetables if no hard constraint is broken
+
+# --- Helpers ---
+
+def _parse_slot(data: TimetableSlotCreate) -> tuple:
+    """(day, start minute, end minute) for a submitted slot; raises ValueError"""
+    day = normalize_day(data.day_of_week)
+    start, end = parse_time(data.start_time), parse_time(data.end_time)
+    if end <= start:
+        raise ValueError("end_time must be after start_time")
+    return day, start, end
+
+async def _valid_subjects_and_teachers(db: AsyncSession, school_id: int, subject_ids: set, teacher_ids: set) -> tuple:
+    """The submitted subject ids and teacher ids that belong to the school, in two IN queries"""
+    valid_subjects = set((await db.execute(
+        select(Subject.id).where(Subject.school_id == school_id, Subject.id.in_(subject_ids))
+    )).scalars().all())
+    valid_teachers = set((await db.execute(
+        select(school_users.c.user_id).where(
+            school_users.c.school_id == school_id,
+            school_users.c.user_id.in_(teacher_ids),
+            school_users.c.role == UserRole.TEACHER
+        )
+    )).scalars().all()) if teacher_ids else set()
+    return valid_subjects, valid_teachers
+
+def _slot_columns(day: str, start: int, end: int) -> dict:
+    """Ordinal/minute columns plus their display strings for a parsed slot"""
+    return {
+        "day_of_week": day, "day_index": DAYS.index(day),
+        "start_time": format_time(start), "start_minute": start,
+        "end_time": format_time(end), "end_minute": end,
+    }
+
+def _describe(slot: dict) -> str:
+    return f"{slot['day_of_week']} {slot['start_time']}-{slot['end_time']} ({slot['grade_level']})"
+
+def same_room(room_key: str):
+    """Rooms compare trimmed and case-insensitively (served by the lower(trim(room)) index)"""
+    return func.lower(func.trim(TimetableSlot.room)) == room_key
+
+def saved_lessons(school_id: int, day: Optional[str] = None):
+    query = select(
+        TimetableSlot.id, TimetableSlot.day_index, TimetableSlot.start_minute, TimetableSlot.end_minute,
+        TimetableSlot.teacher_id, TimetableSlot.room, TimetableSlot.grade_level
+    ).where(TimetableSlot.school_id == school_id, TimetableSlot.day_index.is_not(None))
+    if day:
+        query = query.where(TimetableSlot.day_index == DAYS.index(day))
+    return query
+
+async def load_timetable_index(db: AsyncSession, school_id: int, day: Optional[str] = None) -> TimetableIndex:
+    """Index the school's saved lessons (optionally one day) by teacher, room and grade"""
+    index = TimetableIndex()
+    for row in (await db.execute(saved_lessons(school_id, day))).all():
+        slot_day = DAYS[row.day_index]
+        index.add(slot_day, row.start_minute, row.end_minute, row.teacher_id, row.room, row.grade_level, {
+            "slot_id": row.id, "day_of_week": slot_day, "start_time": format_time(row.start_minute),
+            "end_time": format_time(row.end_minute), "grade_level": row.grade_level,
+        })
+    return index
+
+def overlapping_lessons(school_id: int, day: str, start: int, end: int, keys: list):
+    """Saved lessons overlapping [start, end) on `day` that share any of the resource keys"""
+    shared = []
+    for resource, value in keys:
+        if resource == "teacher":
+            shared.append(TimetableSlot.teacher_id == value)
+        elif resource == "room":
+            shared.append(same_room(value))
+        else:
+            shared.append(TimetableSlot.grade_level == value)
+    return select(
+        TimetableSlot.id, TimetableSlot.start_minute, TimetableSlot.end_minute,
+        TimetableSlot.teacher_id, TimetableSlot.room, TimetableSlot.grade_level
+    ).where(
+        TimetableSlot.school_id == school_id,
+        TimetableSlot.day_index == DAYS.index(day),
+        TimetableSlot.start_minute < end,
+        TimetableSlot.end_minute > start,
+        or_(*shared)
+    ).order_by(TimetableSlot.start_minute)
+
+async def _find_clashes(db: AsyncSession, school_id: int, day: str, start: int, end: int,
+                        teacher_id: Optional[int], room: Optional[str], grade_level: Optional[str]) -> list:
+    """[(resource, slot)] for saved lessons overlapping [start, end) on `day` that share a teacher, room or grade"""
+    keys = resource_keys(teacher_id, room, grade_level)
+    if not keys:
+        return []
+    rows = (await db.execute(overlapping_lessons(school_id, day, start, end, keys))).all()
+
+    clashes = []
+    for row in rows:
+        slot = {
+            "slot_id": row.id, "day_of_week": day, "start_time": format_time(row.start_minute),
+            "end_time": format_time(row.end_minute), "grade_level": row.grade_level,
+        }
+        row_keys = resource_keys(row.teacher_id, row.room, row.grade_level)
+        clashes.extend((resource, slot) for resource, value in keys if (resource, value) in row_keys)
+    return clashes
+
 # --- Routes ---
 
 @router.post("/", response_model=TimetableSlotResponse)
@@ -40,7 +201,12 @@ async def create_timetable_slot(
     db: AsyncSession = Depends(get_db),
     current_school: School = Depends(get_current_school)
 ):
-    """Add a lesson to the weekly timetable"""
+    """Add a lesson to the weekly timetable (rejects double-booked teachers, rooms and grades)"""
+    try:
+        day, start, end = _parse_slot(data)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
     # 1. Verify subject belongs to school
     subj_result = await db.execute(select(Subject).where(Subject.id == data.subject_id, Subject.school_id == current_school.id))
     if not subj_result.scalar_one_or_none():
@@ -57,12 +223,250 @@ async def create_timetable_slot(
         if not teacher_result.scalar_one_or_none():
             raise HTTPException(status_code=400, detail="Invalid teacher for this school")
 
-    new_slot = TimetableSlot(**data.dict(), school_id=current_school.id)
+    # 3. Clash check against the day's lessons, holding the school's timetable lock until commit
+    await lock_timetable(db, current_school.id)
+    clashes = await _find_clashes(db, current_school.id, day, start, end, data.teacher_id, data.room, data.grade_level)
+    if clashes:
+        detail = "; ".join(f"{resource.title()} already booked: {_describe(slot)}" for resource, slot in clashes)
+        raise HTTPException(status_code=409, detail=detail)
+
+    new_slot = TimetableSlot(
+        **data.dict(exclude={"day_of_week", "start_time", "end_time"}), school_id=current_school.id,
+        **_slot_columns(day, start, end)
+    )
     db.add(new_slot)
+    await touch_timetable(db, current_school.id)
     await db.commit()
     await db.refresh(new_slot)
     return new_slot
 
+@router.post("/bulk")
+async def import_timetable(
+    data: TimetableImport,
+    dry_run: bool = False,
+    db: AsyncSession = Depends(get_db),
+    current_school: School = Depends(get_current_school)
+):
+    """Validate a whole timetable in one pass and save it only if it has no errors or clashes"""
+    # 1. Subjects and teachers in two IN queries
+    valid_subjects, valid_teachers = await _valid_subjects_and_teachers(
+        db, current_school.id,
+        {slot.subject_id for slot in data.slots},
+        {slot.teacher_id for slot in data.slots if slot.teacher_id}
+    )
+
+    # 2. Each row is checked against the saved timetable and every earlier row of the import;
+    # rows that clash are still indexed so later rows report against them too.
+    if not dry_run:
+        await lock_timetable(db, current_school.id)
+    index = TimetableIndex() if data.replace_existing else await load_timetable_index(db, current_school.id)
+    errors, conflicts, rows = [], [], []
+    for position, slot in enumerate(data.slots):
+        try:
+            day, start, end = _parse_slot(slot)
+        except ValueError as e:
+            errors.append({"row": position, "reason": str(e)})
+            continue
+        if slot.subject_id not in valid_subjects:
+            errors.append({"row": position, "reason": "Subject not found"})
+        if slot.teacher_id and slot.teacher_id not in valid_teachers:
+            errors.append({"row": position, "reason": "Invalid teacher for this school"})
+
+        described = {
+            "row": position, "day_of_week": day, "start_time": format_time(start),
+            "end_time": format_time(end), "grade_level": slot.grade_level,
+        }
+        for resource, other in index.clashes(day, start, end, slot.teacher_id, slot.room, slot.grade_level):
+            conflicts.append({"row": position, "resource": resource, "slot": described, "conflicts_with": other})
+        index.add(day, start, end, slot.teacher_id, slot.room, slot.grade_level, described)
+        rows.append({
+            **slot.dict(exclude={"day_of_week", "start_time", "end_time"}), "school_id": current_school.id,
+            **_slot_columns(day, start, end),
+        })
+
+    if errors or conflicts:
+        raise HTTPException(status_code=409, detail={
+            "message": f"Timetable not saved: {len(errors)} invalid rows, {len(conflicts)} clashes",
+            "errors": errors,
+            "conflicts": conflicts
+        })
+    if dry_run:
+        return {"success": True, "dry_run": True, "inserted": 0, "valid": len(rows)}
+
+    # 3. All-or-nothing write
+    if data.replace_existing:
+        await db.execute(delete(TimetableSlot).where(TimetableSlot.school_id == current_school.id))
+    if rows:
+        await db.execute(insert(TimetableSlot), rows)
+    await touch_timetable(db, current_school.id)
+    await db.commit()
+    return {"success": True, "dry_run": False, "inserted": len(rows), "replaced": data.replace_existing}
+
+@router.post("/generate")
+async def generate_timetable(
+    data: TimetableGenerate,
+    db: AsyncSession = Depends(get_db),
+    current_school: School = Depends(get_current_school)
+):
+    """Generate clash-free timetables for the requested grades by parallel local search within a time budget.
+
+    Lessons already saved for other grades stay fixed: their teachers and rooms
+    are unavailable in those periods. With save=true the generated grades'
+    timetables are replaced in one transaction, only if no hard constraint is broken.
+    """
+    # 1. Validate the grid and the requirements
+    errors = []
+    try:
+        days = [normalize_day(day) for day in data.days]
+        periods = [(parse_time(p.start_time), parse_time(p.end_time)) for p in data.periods]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not days or not periods or len(set(days)) != len(days):
+        raise HTTPException(status_code=400, detail="Give at least one period and distinct days")
+    if not data.requirements:
+        raise HTTPException(status_code=400, detail="Give at least one lesson requirement")
+    if any(end <= start for start, end in periods) or any(
+        periods[i][1] > periods[i + 1][0] for i in range(len(periods) - 1)
+    ):
+        raise HTTPException(status_code=400, detail="Periods must be in order, non-overlapping, and end after they start")
+
+    # One generation per process at a time, taken before any reads so queued calls hold no connection
+    async with _generation_lock:
+        valid_subjects, valid_teachers = await _valid_subjects_and_teachers(
+            db, current_school.id,
+            {r.subject_id for r in data.requirements},
+            {r.teacher_id for r in data.requirements if r.teacher_id}
+        )
+        for position, requirement in enumerate(data.requirements):
+            if requirement.subject_id not in valid_subjects:
+                errors.append({"row": position, "reason": "Subject not found"})
+            if requirement.teacher_id and requirement.teacher_id not in valid_teachers:
+                errors.append({"row": position, "reason": "Invalid teacher for this school"})
+
+        slot_count = len(days) * len(periods)
+        grades = sorted({r.grade_level for r in data.requirements})
+        teachers = sorted({r.teacher_id for r in data.requirements if r.teacher_id})
+        rooms = list(dict.fromkeys(
+            [room.strip() for room in data.rooms if room.strip()]
+            + [r.room.strip() for r in data.requirements if r.room and r.room.strip()]
+        ))
+        grade_index = {grade: i for i, grade in enumerate(grades)}
+        teacher_index = {teacher: i for i, teacher in enumerate(teachers)}
+        room_index = {room: i for i, room in enumerate(rooms)}
+        subject_index = {subject: i for i, subject in enumerate(sorted(valid_subjects))}
+
+        # 2. Periods taken by lessons outside the generated grades
+        existing = await load_timetable_index(db, current_school.id)
+        def blocked(teacher_id=None, room=None) -> list:
+            return [
+                d * len(periods) + p
+                for d, day in enumerate(days) for p, (start, end) in enumerate(periods)
+                if any(slot["grade_level"] not in grade_index for _, slot in existing.clashes(day, start, end, teacher_id, room, None))
+            ]
+        teacher_blocked = [k * slot_count + t for teacher, k in teacher_index.items() for t in blocked(teacher_id=teacher)]
+        room_blocked = [r * slot_count + t for room, r in room_index.items() for t in blocked(room=room)]
+
+        # 3. Capacity checks the search could never satisfy
+        grade_load, teacher_load = {}, {}
+        for r in data.requirements:
+            grade_load[r.grade_level] = grade_load.get(r.grade_level, 0) + r.lessons_per_week
+            if r.teacher_id:
+                teacher_load[r.teacher_id] = teacher_load.get(r.teacher_id, 0) + r.lessons_per_week
+        blocked_per_teacher = {}
+        for cell in teacher_blocked:
+            blocked_per_teacher[cell // slot_count] = blocked_per_teacher.get(cell // slot_count, 0) + 1
+        for grade, load in grade_load.items():
+            if load > slot_count:
+                errors.append({"grade_level": grade, "reason": f"{load} lessons do not fit in {slot_count} periods"})
+        for teacher, load in teacher_load.items():
+            free = slot_count - blocked_per_teacher.get(teacher_index[teacher], 0)
+            if load > free:
+                errors.append({"teacher_id": teacher, "reason": f"{load} lessons but only {free} free periods"})
+        if errors:
+            raise HTTPException(status_code=400, detail={"message": "Timetable cannot be generated", "errors": errors})
+
+        lessons, lesson_requirements = [], []
+        for r in data.requirements:
+            lesson = (
+                grade_index[r.grade_level],
+                subject_index[r.subject_id],
+                teacher_index[r.teacher_id] if r.teacher_id else -1,
+                room_index[r.room.strip()] if r.room and r.room.strip() else -1,
+            )
+            lessons += [lesson] * r.lessons_per_week
+            lesson_requirements += [r] * r.lessons_per_week
+        problem = {
+            "days": len(days), "periods": len(periods), "lessons": lessons, "rooms": len(rooms),
+            "teacher_blocked": teacher_blocked, "room_blocked": room_blocked,
+        }
+
+        # 4. Independent searches (different seeds) on every worker; keep the best.
+        # End the read transaction first so the connection goes back to the pool during the search.
+        await db.rollback()
+        budget = min(data.time_budget_seconds, TIMETABLE_MAX_BUDGET_SECONDS)
+        loop = asyncio.get_running_loop()
+        pool = _get_generator_pool()
+        try:
+            results = await asyncio.gather(*[
+                loop.run_in_executor(pool, solve, problem, seed, budget)
+                for seed in range(TIMETABLE_GENERATOR_WORKERS)
+            ])
+        except BrokenProcessPool:
+            shutdown_generator_pool() # a worker died; start a fresh pool for the next call
+            raise
+        best = min(results, key=lambda r: (r["hard_violations"], r["soft_score"]))
+
+        rows = []
+        for requirement, slot, room in zip(lesson_requirements, best["slots"], best["rooms"]):
+            start, end = periods[slot % len(periods)]
+            rows.append({
+                "school_id": current_school.id,
+                "subject_id": requirement.subject_id,
+                "teacher_id": requirement.teacher_id,
+                "grade_level": requirement.grade_level,
+                "room": rooms[room] if room >= 0 else None,
+                **_slot_columns(days[slot // len(periods)], start, end),
+            })
+        rows.sort(key=lambda row: (row["grade_level"], row["day_index"], row["start_minute"]))
+
+        # 5. Accepted plan replaces the generated grades' timetables in one transaction
+        saved = data.save and best["hard_violations"] == 0
+        if saved:
+            await lock_timetable(db, current_school.id)
+            await db.execute(delete(TimetableSlot).where(
+                TimetableSlot.school_id == current_school.id, TimetableSlot.grade_level.in_(grades)
+            ))
+            # Other grades' lessons may have changed while the search ran; never save over a clash
+            current = await load_timetable_index(db, current_school.id)
+            if any(current.clashes(DAYS[row["day_index"]], row["start_minute"], row["end_minute"],
+                                   row["teacher_id"], row["room"], row["grade_level"]) for row in rows):
+                await db.rollback()
+                raise HTTPException(status_code=409, detail="The timetable changed during generation; generate again")
+            if rows:
+                await db.execute(insert(TimetableSlot), rows)
+            await touch_timetable(db, current_school.id)
+            await db.commit()
+
+    return {
+        "success": best["hard_violations"] == 0,
+        "saved": saved,
+        "hard_violations": best["hard_violations"],
+        "soft_score": best["soft_score"],
+        "soft_constraints": best["breakdown"],
+        "time_budget_seconds": budget,
+        "workers": [
+            {"seed": r["seed"], "hard_violations": r["hard_violations"], "soft_score": r["soft_score"], "iterations": r["iterations"]}
+            for r in results
+        ],
+        "data": [{k: v for k, v in row.items() if k != "school_id"} for row in rows]
+    }
+
+def grade_timetable(school_id: int, grade_level: str):
+    return select(TimetableSlot).where(
+        TimetableSlot.school_id == school_id,
+        TimetableSlot.grade_level == grade_level
+    ).order_by(TimetableSlot.day_index, TimetableSlot.start_minute)
+
 @router.get("/{grade_level}", response_model=List[TimetableSlotResponse])
 async def get_grade_timetable(
     grade_level: str,
@@ -70,10 +474,112 @@ async def get_grade_timetable(
     current_school: School = Depends(get_current_school)
 ):
     """View weekly timetable for a specific class/grade"""
-    result = await db.execute(
-        select(TimetableSlot).where(
-            TimetableSlot.school_id == current_school.id,
-            TimetableSlot.grade_level == grade_level
-        ).order_by(TimetableSlot.day_of_week, TimetableSlot.start_time)
-    )
+    result = await db.execute(grade_timetable(current_school.id, grade_level))
     return result.scalars().all()
+
+# --- Weekly grids (ETag / Last-Modified, 304 on unchanged timetables) ---
+
+def grid_periods(school_id: int):
+    return select(TimetableSlot.start_minute, TimetableSlot.end_minute).where(
+        TimetableSlot.school_id == school_id, TimetableSlot.day_index.is_not(None)
+    ).distinct().order_by(TimetableSlot.start_minute, TimetableSlot.end_minute)
+
+def grid_lessons(school_id: int, condition):
+    return select(
+        TimetableSlot.id, TimetableSlot.day_index, TimetableSlot.start_minute, TimetableSlot.end_minute,
+        TimetableSlot.grade_level, TimetableSlot.room, TimetableSlot.subject_id, Subject.name,
+        TimetableSlot.teacher_id, User.full_name
+    ).join(Subject, TimetableSlot.subject_id == Subject.id).outerjoin(
+        User, TimetableSlot.teacher_id == User.id
+    ).where(TimetableSlot.school_id == school_id, TimetableSlot.day_index.is_not(None), condition)
+
+async def _build_grid(db: AsyncSession, school_id: int, condition) -> dict:
+    """Days x periods matrix of lessons; periods are the school's distinct lesson times so all grids line up"""
+    periods = (await db.execute(grid_periods(school_id))).all()
+    lessons = (await db.execute(grid_lessons(school_id, condition))).all()
+
+    day_indexes = sorted(set(range(5)) | {lesson.day_index for lesson in lessons})
+    row_of = {day: i for i, day in enumerate(day_indexes)}
+    column_of = {(start, end): i for i, (start, end) in enumerate(periods)}
+    cells = [[[] for _ in periods] for _ in day_indexes]
+    for lesson in lessons:
+        cells[row_of[lesson.day_index]][column_of[(lesson.start_minute, lesson.end_minute)]].append({
+            "id": lesson.id,
+            "subject_id": lesson.subject_id,
+            "subject": lesson.name,
+            "teacher_id": lesson.teacher_id,
+            "teacher": lesson.full_name,
+            "grade_level": lesson.grade_level,
+            "room": lesson.room,
+        })
+    return {
+        "days": [DAYS[day] for day in day_indexes],
+        "periods": [{"start_time": format_time(start), "end_time": format_time(end)} for start, end in periods],
+        "cells": cells,
+    }
+
+async def _grid_response(request: Request, db: AsyncSession, school_id: int, kind: str, key, condition) -> Response:
+    state = (await db.execute(
+        select(SchoolCounters.timetable_version, SchoolCounters.timetable_updated_at)
+        .where(SchoolCounters.school_id == school_id)
+    )).first()
+    version, updated_at = (state.timetable_version, state.timetable_updated_at) if state else (0, None)
+
+    etag = f'"timetable-{school_id}-{version}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    last_modified = None
+    if updated_at:
+        last_modified = updated_at.replace(tzinfo=timezone.utc, microsecond=0)
+        headers["Last-Modified"] = format_datetime(last_modified, usegmt=True)
+
+    # If-None-Match wins over If-Modified-Since (RFC 9110)
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")] or if_none_match.strip() == "*":
+            return Response(status_code=304, headers=headers)
+    elif last_modified and request.headers.get("if-modified-since"):
+        try:
+            if last_modified <= parsedate_to_datetime(request.headers["if-modified-since"]):
+                return Response(status_code=304, headers=headers)
+        except (TypeError, ValueError):
+            pass
+
+    cache_key = (school_id, version, kind, key)
+    grid = grid_cache.get(cache_key)
+    if grid is None:
+        grid = {"success": True, kind: key, "version": version, **await _build_grid(db, school_id, condition)}
+        grid_cache.set(cache_key, grid)
+    return JSONResponse(content=grid, headers=headers)
+
+@router.get("/grid/grades/{grade_level}")
+async def get_grade_grid(
+    grade_level: str,
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    current_school: School = Depends(get_current_school)
+):
+    """Weekly grid (days x periods) for one grade; send If-None-Match to get 304 when unchanged"""
+    return await _grid_response(request, db, current_school.id, "grade_level", grade_level,
+                                TimetableSlot.grade_level == grade_level)
+
+@router.get("/grid/teachers/{teacher_id}")
+async def get_teacher_grid(
+    teacher_id: int,
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    current_school: School = Depends(get_current_school)
+):
+    """Weekly grid for one teacher"""
+    return await _grid_response(request, db, current_school.id, "teacher_id", teacher_id,
+                                TimetableSlot.teacher_id == teacher_id)
+
+@router.get("/grid/rooms/{room}")
+async def get_room_grid(
+    room: str,
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    current_school: School = Depends(get_current_school)
+):
+    """Weekly grid for one room"""
+    key = room.strip().lower()
+    return await _grid_response(request, db, current_school.id, "room", key, same_room(key))
@@ -5,8 +5,10 @@ from typing import List, Optional
 from pydantic import BaseModel, EmailStr
 
 from database import get_db
+from pagination import Page, page_params, keyset, split_page
 from models import User, School, school_users, UserRole
-from auth import get_current_school, get_password_hash
+from auth import get_current_school, hash_password, invalidate_principals
+from counters import bump_counters, STAFF_ROLES
 
 router = APIRouter(prefix="/users", tags=["User Management"])
 
@@ -29,23 +31,29 @@ class UserResponse(BaseModel):
 
 # --- Routes ---
 
-@router.get("/", response_model=List[UserResponse])
-async def get_school_users(
-    role: Optional[UserRole] = None,
-    db: AsyncSession = Depends(get_db),
-    current_school: School = Depends(get_current_school)
-):
-    """List users belonging to the current school, optionally filtered by role"""
+def school_users_page(school_id: int, role: Optional[UserRole], cursor: Optional[str], limit: int):
+    """Active members of the school, optionally one role"""
     query = select(User).join(school_users).where(
-        school_users.c.school_id == current_school.id,
+        school_users.c.school_id == school_id,
         school_users.c.is_active == True
     )
-    
     if role:
         query = query.where(school_users.c.role == role)
-        
-    result = await db.execute(query)
-    return result.scalars().all()
+    # Page on the membership's user_id so uq_school_user (school_id, user_id) drives the scan
+    return keyset(query, [school_users.c.user_id], cursor, limit)
+
+@router.get("/", response_model=Page[UserResponse])
+async def get_school_users(
+    role: Optional[UserRole] = None,
+    page: tuple = Depends(page_params),
+    db: AsyncSession = Depends(get_db),
+    current_school: School = Depends(get_current_school)
+):
+    """List users belonging to the current school, optionally filtered by role (keyset-paginated by user id)"""
+    cursor, limit = page
+    result = await db.execute(school_users_page(current_school.id, role, cursor, limit))
+    users, next_cursor = split_page(result.scalars().all(), limit, lambda u: [u.id])
+    return {"data": users, "next_cursor": next_cursor}
 
 @router.post("/", response_model=UserResponse)
 async def create_school_user(
@@ -61,7 +69,7 @@ async def create_school_user(
         raise HTTPException(status_code=400, detail="Username already exists")
 
     # 2. Create the User
-    hashed_password = get_password_hash(data.password)
+    hashed_password = await hash_password(data.password)
     new_user = User(
         username=data.username,
         email=data.email,
@@ -80,17 +88,20 @@ async def create_school_user(
             is_active=True
         )
     )
+    if data.role in STAFF_ROLES:
+        await bump_counters(db, current_school.id, staff=1)
     
     await db.commit()
+    invalidate_principals(username=new_user.username)
     await db.refresh(new_user)
     return new_user
 
-@router.get("/teachers", response_model=List[UserResponse])
-async def get_teachers(db: AsyncSession = Depends(get_db), current_school: School = Depends(get_current_school)):
+@router.get("/teachers", response_model=Page[UserResponse])
+async def get_teachers(page: tuple = Depends(page_params), db: AsyncSession = Depends(get_db), current_school: School = Depends(get_current_school)):
     """Shortcut to get all teachers"""
-    return await get_school_users(role=UserRole.TEACHER, db=db, current_school=current_school)
+    return await get_school_users(role=UserRole.TEACHER, page=page, db=db, current_school=current_school)
 
-@router.get("/parents", response_model=List[UserResponse])
-async def get_parents(db: AsyncSession = Depends(get_db), current_school: School = Depends(get_current_school)):
+@router.get("/parents", response_model=Page[UserResponse])
+async def get_parents(page: tuple = Depends(page_params), db: AsyncSession = Depends(get_db), current_school: School = Depends(get_current_school)):
     """Shortcut to get all parents"""
-    return await get_school_users(role=UserRole.PARENT, db=db, current_school=current_school)
+    return await get_school_users(role=UserRole.PARENT, page=page, db=db, current_school=current_school)
@@ -72,7 +72,7 @@ export default function SuperAdminDashboard() {
       ]);
       
       if (statsRes.ok) setStats(await statsRes.json());
-      if (schoolsRes.ok) setSchools(await schoolsRes.json());
+      if (schoolsRes.ok) setSchools((await schoolsRes.json()).data);
       if (logsRes.ok) setAuditLogs(await logsRes.json());
     } catch (error) {
       console.error("Failed to fetch platform data", error);